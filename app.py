@@ -10,6 +10,8 @@ from flask_login import LoginManager
 from sqlalchemy.orm import DeclarativeBase
 from werkzeug.middleware.proxy_fix import ProxyFix
 
+from helpers import json_codec
+
 # Configure structured logging
 logging.basicConfig(
     level=logging.INFO,
@@ -57,6 +59,9 @@ app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
     "pool_timeout": 30,
     "pool_size": 5,
     "max_overflow": 10,
+    # JSON/JSONB columns go through orjson when it is installed
+    "json_serializer": json_codec.dumps,
+    "json_deserializer": json_codec.loads,
     "connect_args": {
         "connect_timeout": 30,
         "sslmode": "require",
@@ -150,4 +155,8 @@ with app.app_context():
     app.register_blueprint(google_auth)
     app.register_blueprint(mailgun_webhook)
 
-    db.create_all()
\ No newline at end of file
+    # Bring the schema up to date; set RUN_MIGRATIONS_ON_STARTUP=false to run
+    # python migrations.py as a separate release step instead
+    if os.environ.get("RUN_MIGRATIONS_ON_STARTUP", "true").lower() == "true":
+        from migrations import run_migrations
+        run_migrations()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Background worker that drains the Google Calendar sync outbox.
+Run alongside gunicorn: python calendar_sync_worker.py
+
+Each claim takes up to one batch request's worth of due rows for a single
+user, so a user's pending inserts, updates and deletes go out together.
+Failed rows are retried with exponential backoff (honoring Retry-After).
+"""
+
+import logging
+import os
+import signal
+import socket
+import threading
+import uuid
+
+import sentry_sdk
+
+from app import app, db
+from models import User
+from helpers.calendar_sync import claim_due_entries, process_claimed_entries, release_claimed_entries
+
+logger = logging.getLogger(__name__)
+
+CALENDAR_SYNC_WORKER_CONCURRENCY = int(os.environ.get("CALENDAR_SYNC_WORKER_CONCURRENCY", 2))
+CALENDAR_SYNC_WORKER_POLL_SECONDS = float(os.environ.get("CALENDAR_SYNC_WORKER_POLL_SECONDS", 2))
+
+
+def worker_loop(worker_number, stop_event):
+    """Claim and sync outbox rows until stop_event is set"""
+    with app.app_context():
+        logger.info(f"Calendar sync worker thread {worker_number} started")
+        # Hostnames can run to 253 characters; the token has to fit claimed_by's String(64)
+        worker_prefix = f"{socket.gethostname()[:32]}-{os.getpid()}-{worker_number}"
+        while not stop_event.is_set():
+            claim_token = f"{worker_prefix}-{uuid.uuid4().hex[:8]}"
+            try:
+                entries = claim_due_entries(claim_token)
+            except Exception as e:
+                logger.error(f"Calendar sync worker {worker_number} failed to claim rows: {str(e)}")
+                sentry_sdk.capture_exception(e)
+                db.session.rollback()
+                stop_event.wait(CALENDAR_SYNC_WORKER_POLL_SECONDS)
+                continue
+
+            if not entries:
+                stop_event.wait(CALENDAR_SYNC_WORKER_POLL_SECONDS)
+                continue
+
+            try:
+                user = db.session.get(User, entries[0].user_id)
+                synced = process_claimed_entries(user, entries)
+                logger.info(f"Synced {synced}/{len(entries)} outbox row(s) for user {user.id}")
+            except Exception as e:
+                logger.error(f"Calendar sync worker {worker_number} failed to sync claimed rows: {str(e)}")
+                sentry_sdk.capture_exception(e)
+                db.session.rollback()
+                try:
+                    # Don't leave the rows in 'processing' until the visibility timeout
+                    release_claimed_entries(claim_token, str(e))
+                except Exception as release_error:
+                    logger.error(f"Failed to release calendar sync claim {claim_token}: {str(release_error)}")
+                    sentry_sdk.capture_exception(release_error)
+                    db.session.rollback()
+        logger.info(f"Calendar sync worker thread {worker_number} stopped")
+
+
+def run_worker(concurrency=CALENDAR_SYNC_WORKER_CONCURRENCY):
+    """Start worker threads and block until SIGINT/SIGTERM"""
+    stop_event = threading.Event()
+
+    def handle_signal(signum, frame):
+        logger.info(f"Received signal {signum}, finishing in-flight syncs")
+        stop_event.set()
+
+    signal.signal(signal.SIGINT, handle_signal)
+    signal.signal(signal.SIGTERM, handle_signal)
+
+    threads = []
+    for worker_number in range(concurrency):
+        thread = threading.Thread(target=worker_loop, args=(worker_number, stop_event), daemon=True)
+        thread.start()
+        threads.append(thread)
+
+    logger.info(f"Calendar sync worker running with concurrency {concurrency}")
+    while any(thread.is_alive() for thread in threads):
+        for thread in threads:
+            thread.join(timeout=1)
+
+
+if __name__ == "__main__":
+    run_worker()
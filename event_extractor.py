@@ -1,28 +1,57 @@
 import json
 import os
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import re
 
 # the newest OpenAI model is "gpt-4.1".
 # do not change this unless explicitly requested by the user
-from openai import OpenAI
+from openai import OpenAI, APITimeoutError
 import sentry_sdk
 
+from helpers.extraction_cache import make_cache_key, get_cached_extraction, store_extraction
+from helpers.text_processing import split_text_into_chunks, extract_shared_context
+from helpers.offline_extractor import extract_events_offline
+from helpers.openai_guard import guard_openai_call, record_rate_limit_headers, OpenAIUnavailable
+from helpers.openai_hedging import run_hedged, OPENAI_HEDGE_ENABLED
+from helpers.single_flight import single_flight
+from helpers.recurrence import build_recurrence
+from helpers.event_utils import get_timezone
+
 logger = logging.getLogger(__name__)
 
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY", "your-openai-api-key")
 openai = OpenAI(api_key=OPENAI_API_KEY)
 
-# Centralized prompt template - single place to edit the extraction prompt
+# Inputs longer than the threshold are split into chunks that are extracted
+# concurrently, so one long itinerary doesn't become one slow call that
+# risks the 30s timeout
+EXTRACTION_CHUNK_THRESHOLD_CHARS = int(os.environ.get("EXTRACTION_CHUNK_THRESHOLD_CHARS", 12000))
+EXTRACTION_CHUNK_TARGET_CHARS = int(os.environ.get("EXTRACTION_CHUNK_TARGET_CHARS", 6000))
+EXTRACTION_CHUNK_WORKERS = int(os.environ.get("EXTRACTION_CHUNK_WORKERS", 4))
+EXTRACTION_CHUNK_CONTEXT_CHARS = 1000  # Header and traveler lines repeated with every chunk
+
+# Inputs this short ("lunch tomorrow 1pm") are parsed locally when the
+# heuristic extractor finds both a date and a time, instead of paying for an
+# API call
+OFFLINE_EXTRACTION_MAX_CHARS = int(os.environ.get("OFFLINE_EXTRACTION_MAX_CHARS", 80))
+
+_chunk_executor = ThreadPoolExecutor(max_workers=EXTRACTION_CHUNK_WORKERS, thread_name_prefix="extraction-chunk")
+
+# Centralized prompt template - single place to edit the extraction prompt.
+# The system prompt and instructions are fully static so every request shares
+# an identical prefix that the provider can cache; everything that varies per
+# request (timezone, date, text) goes last in EVENT_EXTRACTION_INPUT_TEMPLATE.
 EVENT_EXTRACTION_SYS_PROMPT = """You are an expert at extracting calendar events from text. Always respond with valid JSON format. If text is non-English, retain original language as much as possible.
 
 Sometimes the text is content of an email or forwarded email. If it is, use the body of the email for event extraction."""
 
-EVENT_EXTRACTION_PROMPT = """Given the following text, extract all event information. 
+EVENT_EXTRACTION_PROMPT = """Given the text at the end of this message, extract all event information. The traveler's timezone and the current date are given just before the text.
 
 If text is a flight itinerary, extract each event and carefully convert timezones:
-- Traveler's timezone is {user_timezone}.
+- Use the traveler's timezone given below.
 - The event name. Add traveler's name(s) from the text into the event name. Also generate one relevant emoji for the event name, given the context of the event.
 - The event description that gives context to this calendar event. Include flight duration and other critical travel details like travel agent contact, confirmation number, booking details. If there are multiple travelers, list all of them. Make description easily human readable with new lines and bullet points.
 - Identify the departure and arrival airport codes or cities.
@@ -40,18 +69,105 @@ If text is not a flight itinerary, extract event and identify:
 - The end datetime as a combined date-time value (formatted according to IETF Datatracker RFC3339)
 - The location (if specified).
 
-If events are recurring, extract each instance of the event.
+If an event repeats on a regular schedule (e.g. a weekly class or a monthly meeting), extract it once as the first occurrence and give its schedule in "recurrence" as an RFC 5545 RRULE value without the "RRULE:" prefix (e.g. "FREQ=WEEKLY;BYDAY=TU,TH;UNTIL=20261215"). List the dates (YYYY-MM-DD) of occurrences that are cancelled or skipped in "exception_dates"; if an occurrence is moved, list its original date there and extract the moved occurrence as a separate non-recurring event. Use null for "recurrence" and an empty list for "exception_dates" when the event doesn't repeat. Only extract each occurrence separately when there is no regular schedule.
 
 If same events are repeated in the email or text, extract only one instance of the event and don't include the duplicates in the output.
 
-If a date is relative (e.g., "next Monday," "tomorrow"), first check the email sent date to resolve it. If there's no email sent date, then assume the current date is {current_date} for resolving it.
+If a date is relative (e.g., "next Monday," "tomorrow"), first check the email sent date to resolve it. If there's no email sent date, then resolve it against the current date given below.
+
+Provide the output as a JSON object with a "events" key containing a list, where each object in the list represents an event with keys: "event_name", "event_description", "start", "end", "location", "emoji", "recurrence", "exception_dates". "start" and "end" are RFC3339 date-times with UTC offset, or YYYY-MM-DD for all-day events, of the first occurrence. If the end or location is not found, use null for its value."""
+
+# Strict structured-output schema: the minimal per-event shape. Separate
+# date/time fields are derived locally by expand_event_datetimes instead of
+# being generated token by token.
+EVENT_EXTRACTION_SCHEMA = {
+    "name": "calendar_events",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": {
+            "events": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "event_name": {"type": "string"},
+                        "event_description": {"type": "string"},
+                        "start": {"type": "string"},
+                        "end": {"type": ["string", "null"]},
+                        "location": {"type": ["string", "null"]},
+                        "emoji": {"type": "string"},
+                        "recurrence": {"type": ["string", "null"]},
+                        "exception_dates": {"type": "array", "items": {"type": "string"}}
+                    },
+                    "required": ["event_name", "event_description", "start", "end", "location", "emoji",
+                                 "recurrence", "exception_dates"],
+                    "additionalProperties": False
+                }
+            }
+        },
+        "required": ["events"],
+        "additionalProperties": False
+    }
+}
+
+CHUNK_CONTEXT_TEMPLATE = """[Context from the full message, for resolving dates and names only; don't extract events from it]
+{context}
+[Part of the message to extract events from]
+{chunk}"""
 
-Provide the output as a JSON object with a "events" key containing a list, where each object in the list represents an event with keys: "event_name", "event_description", "start_date", "start_time", "start_datetime", "end_date", "end_time", "end_datetime", "location", "emoji". If a piece of information is not found, use null for its value.
+EVENT_EXTRACTION_INPUT_TEMPLATE = """Traveler's timezone: {user_timezone}
+Current date: {current_date}
 
 Text: '''{text}'''"""
 
 
-def extract_events_from_text(text, current_date=None, user_timezone="UTC"):
+def build_extraction_messages(text, current_date, user_timezone):
+    """
+    Build the chat messages for an extraction request, static prefix first.
+
+    Args:
+        text (str): The input text containing event information
+        current_date (str): Current date in YYYY-MM-DD format
+        user_timezone (str): User's timezone
+
+    Returns:
+        list: Chat completion messages
+    """
+    return [{
+        "role": "system",
+        "content": EVENT_EXTRACTION_SYS_PROMPT
+    }, {
+        "role": "user",
+        "content": EVENT_EXTRACTION_PROMPT + "\n\n" + EVENT_EXTRACTION_INPUT_TEMPLATE.format(
+            user_timezone=user_timezone,
+            current_date=current_date,
+            text=text)
+    }]
+
+
+def get_usage_stats(response, latency_ms):
+    """
+    Pull token usage out of a chat completion response.
+
+    Args:
+        response: OpenAI chat completion response
+        latency_ms (int): Wall-clock time of the API call
+
+    Returns:
+        dict: prompt_tokens, cached_prompt_tokens, completion_tokens and latency_ms
+    """
+    usage = getattr(response, 'usage', None)
+    details = getattr(usage, 'prompt_tokens_details', None)
+    return {
+        'prompt_tokens': getattr(usage, 'prompt_tokens', None),
+        'cached_prompt_tokens': getattr(details, 'cached_tokens', None) or 0,
+        'completion_tokens': getattr(usage, 'completion_tokens', None),
+        'latency_ms': latency_ms,
+    }
+
+
+def extract_events_from_text(text, current_date=None, user_timezone="UTC", use_cache=True):
     """
     Extract events from text using OpenAI API synchronously.
 
@@ -59,79 +175,324 @@ def extract_events_from_text(text, current_date=None, user_timezone="UTC"):
         text (str): The input text containing event information
         current_date (str): Current date in YYYY-MM-DD format for resolving relative dates
         user_timezone (str): User's timezone for proper time handling
+        use_cache (bool): Whether to serve a cached result (fresh results are always cached)
 
     Returns:
-        tuple: (list of extracted events, from_email, is_offline, openai_status, openai_error)
+        tuple: (list of extracted events, from_email, is_offline, openai_status, openai_error, usage)
+            where usage is the get_usage_stats dict (with per-chunk timings under 'chunks'
+            for chunked inputs), or None if no API call was made
     """
     if current_date is None:
         current_date = datetime.now().strftime("%Y-%m-%d")
 
+    cache_key = make_cache_key(text, user_timezone, current_date)
+    if not use_cache:
+        return _extract_uncached(text, current_date, user_timezone, cache_key)
+
+    def lookup_cached():
+        cached = get_cached_extraction(cache_key)
+        if cached is None:
+            return None
+        logger.info(f"Extraction cache hit for key {cache_key[:12]} ({len(cached['events'])} events)")
+        return cached['events'], cached['from_email'], False, "cached", None, None
+
+    cached_result = lookup_cached()
+    if cached_result is not None:
+        return cached_result
+
+    # Identical texts already being extracted (double submits, webhook retries) share that result
+    result, coalesced = single_flight(cache_key,
+                                      lambda: _extract_uncached(text, current_date, user_timezone, cache_key),
+                                      lookup_cached)
+    if coalesced and result[3] != "cached":
+        # The leader already accounted for the tokens
+        events, from_email, is_offline, _, openai_error, _ = result
+        return events, from_email, is_offline, "coalesced", openai_error, None
+    return result
+
+
+def _extract_uncached(text, current_date, user_timezone, cache_key):
+    """Run the extraction for extract_events_from_text and cache a successful result"""
     # Check if text appears to be an email and extract from address
-    from_email = None
-    email_match = re.search(r'From:\s*([^\s<]+@[^\s>]+)', text, re.IGNORECASE)
-    if email_match:
-        from_email = email_match.group(1)
-        logger.info(f"Extracted from email: {from_email}")
+    from_email = find_from_email(text)
 
-    # Build the prompt using the centralized template
-    sys_prompt = EVENT_EXTRACTION_SYS_PROMPT
-    prompt = EVENT_EXTRACTION_PROMPT.format(user_timezone=user_timezone,
-                                            current_date=current_date,
-                                            text=text)
+    if len(text) <= OFFLINE_EXTRACTION_MAX_CHARS:
+        events = extract_events_offline(text, current_date, user_timezone, require_date_and_time=True)
+        if events:
+            return decorate_events(events, from_email), from_email, True, "local", None, None
 
     try:
         logger.info(f"Extracting events from text of length {len(text)}")
-        # Display the prompt for debugging purposes
-        #logger.info(sys_prompt)
-        #logger.info(prompt)
-
-        # Make synchronous OpenAI API call
-        response = openai.chat.completions.create(
-            model="gpt-4.1",
-            messages=[{
-                "role": "system",
-                "content": sys_prompt
-            }, {
-                "role": "user",
-                "content": prompt
-            }],
-            response_format={"type": "json_object"},
-            temperature=0.1,
-            timeout=30.0)
-
-        content = response.choices[0].message.content
-        if not content:
-            raise Exception("Empty response from AI service")
-
-        result = json.loads(content)
-        events = result.get("events", [])
-
-        # If text is from email, append from email to event description
-        if from_email:
-            for event in events:
-                if event.get("event_description"):
-                    event["event_description"] = f"{event['event_description']} \n\n(from {from_email})"
-
-        # Add emojis to event names using OpenAI-generated emoji
-        for event in events:
-            if event.get("event_name"):
-                event["event_name"] = add_emoji_to_event_name(
-                    event["event_name"],
-                    event.get("emoji")
-                )
+
+        if len(text) > EXTRACTION_CHUNK_THRESHOLD_CHARS:
+            events, usage, failed_chunks = extract_events_in_chunks(text, current_date, user_timezone)
+        else:
+            events, usage = request_event_extraction(text, current_date, user_timezone)
+            failed_chunks = []
+
+        events = decorate_events(events, from_email)
 
         logger.info(f"Successfully extracted {len(events)} events via OpenAI API")
-        return events, from_email, False, "success", None
+
+        if failed_chunks:
+            # Keep what the other chunks found, but don't cache an incomplete result
+            return events, from_email, False, "partial", f"Chunks failed: {'; '.join(failed_chunks)}", usage
+
+        # Cache before the caller mutates the event dicts
+        store_extraction(cache_key, events, from_email)
+
+        return events, from_email, False, "success", None, usage
+
+    except OpenAIUnavailable as e:
+        # Breaker open or load shed: answer locally instead of queueing behind a sick API
+        logger.warning(f"Skipping OpenAI call ({e.reason}), using offline extraction")
+        events = extract_events_offline(text, current_date, user_timezone)
+        if events:
+            return decorate_events(events, from_email), from_email, True, e.reason, str(e), None
+        raise Exception(f"Failed to extract events: {str(e)}")
 
     except Exception as e:
         error_msg = str(e)
         logger.error(f"OpenAI API error: {error_msg}")
+
+        if isinstance(e, APITimeoutError) or "timed out" in error_msg.lower():
+            # Degrade to the local heuristic extractor rather than failing outright
+            events = extract_events_offline(text, current_date, user_timezone)
+            if events:
+                logger.warning(f"OpenAI timed out, returning {len(events)} offline events")
+                return decorate_events(events, from_email), from_email, True, "timeout", error_msg, None
+
         sentry_sdk.capture_exception(e)
 
         # Re-raise the exception to be handled by the calling function
         raise Exception(f"Failed to extract events: {error_msg}")
 
 
+def decorate_events(events, from_email):
+    """
+    Append the sender to descriptions and prefix event names with their emoji.
+
+    Args:
+        events (list): Extracted events
+        from_email (str): Sender address, if the text was an email
+
+    Returns:
+        list: The same events, modified in place
+    """
+    # If text is from email, append from email to event description
+    if from_email:
+        for event in events:
+            if event.get("event_description"):
+                event["event_description"] = f"{event['event_description']} \n\n(from {from_email})"
+
+    # Add emojis to event names using OpenAI-generated emoji
+    for event in events:
+        if event.get("event_name"):
+            event["event_name"] = add_emoji_to_event_name(
+                event["event_name"],
+                event.get("emoji")
+            )
+
+    return events
+
+
+def find_from_email(text):
+    """
+    Find the sender address if the text looks like an email.
+
+    Args:
+        text (str): Input text
+
+    Returns:
+        str: Address from the first "From:" header, or None
+    """
+    email_match = re.search(r'From:\s*([^\s<]+@[^\s>]+)', text, re.IGNORECASE)
+    if not email_match:
+        return None
+    logger.info(f"Extracted from email: {email_match.group(1)}")
+    return email_match.group(1)
+
+
+def request_event_extraction(text, current_date, user_timezone):
+    """
+    Make a single OpenAI extraction call.
+
+    Args:
+        text (str): The input text containing event information
+        current_date (str): Current date in YYYY-MM-DD format
+        user_timezone (str): User's timezone
+
+    Returns:
+        tuple: (list of events with date/time fields expanded, usage dict)
+    """
+    # Build the prompt using the centralized template
+    messages = build_extraction_messages(text, current_date, user_timezone)
+
+    def create_completion():
+        # Make synchronous OpenAI API call behind the circuit breaker and concurrency limiter
+        with guard_openai_call():
+            raw_response = openai.chat.completions.with_raw_response.create(
+                model="gpt-4.1",
+                messages=messages,
+                response_format={"type": "json_schema", "json_schema": EVENT_EXTRACTION_SCHEMA},
+                temperature=0.1,
+                timeout=30.0)
+            record_rate_limit_headers(raw_response.headers)
+            return raw_response.parse()
+
+    started = time.monotonic()
+    response = run_hedged(create_completion) if OPENAI_HEDGE_ENABLED else create_completion()
+    usage = get_usage_stats(response, int((time.monotonic() - started) * 1000))
+    logger.info(f"OpenAI usage: {usage['prompt_tokens']} prompt ({usage['cached_prompt_tokens']} cached), "
+                f"{usage['completion_tokens']} completion tokens in {usage['latency_ms']}ms")
+
+    content = response.choices[0].message.content
+    if not content:
+        raise Exception("Empty response from AI service")
+
+    result = json.loads(content)
+    return [expand_event_datetimes(event, user_timezone) for event in result.get("events", [])], usage
+
+
+def extract_events_in_chunks(text, current_date, user_timezone):
+    """
+    Split long text on natural boundaries and extract each chunk concurrently.
+
+    Args:
+        text (str): The input text containing event information
+        current_date (str): Current date in YYYY-MM-DD format
+        user_timezone (str): User's timezone
+
+    Returns:
+        tuple: (merged list of events, summed usage dict with per-chunk timings
+            under 'chunks', list of failure messages for chunks that failed)
+
+    Raises:
+        Exception: The first chunk's error, if every chunk fails
+    """
+    # Every chunk gets the email header (sender, subject, sent date for
+    # relative dates) and traveler names, wherever in the text they were
+    context = extract_shared_context(text, EXTRACTION_CHUNK_CONTEXT_CHARS)
+    chunks = split_text_into_chunks(text, EXTRACTION_CHUNK_TARGET_CHARS - len(context))
+    if context:
+        chunks = [CHUNK_CONTEXT_TEMPLATE.format(context=context, chunk=chunk) for chunk in chunks]
+    logger.info(f"Splitting text of length {len(text)} into {len(chunks)} chunks")
+
+    started = time.monotonic()
+    futures = [_chunk_executor.submit(request_event_extraction, chunk, current_date, user_timezone)
+               for chunk in chunks]
+
+    chunk_events = []
+    chunk_stats = []
+    failed_chunks = []
+    first_error = None
+    usage = {'prompt_tokens': 0, 'cached_prompt_tokens': 0, 'completion_tokens': 0}
+    for index, (chunk, future) in enumerate(zip(chunks, futures)):
+        stats = {'index': index, 'chars': len(chunk)}
+        try:
+            events, chunk_usage = future.result()
+        except Exception as e:
+            logger.warning(f"Chunk {index + 1}/{len(chunks)} extraction failed: {str(e)}")
+            failed_chunks.append(f"chunk {index + 1}: {str(e)}")
+            first_error = first_error or e
+            stats.update({'status': 'error', 'latency_ms': None, 'events': 0})
+        else:
+            chunk_events.append(events)
+            for key in usage:
+                usage[key] += chunk_usage[key] or 0
+            stats.update({'status': 'success', 'latency_ms': chunk_usage['latency_ms'], 'events': len(events)})
+        chunk_stats.append(stats)
+
+    if not chunk_events:
+        raise first_error or Exception("No chunks to extract")
+
+    usage['latency_ms'] = int((time.monotonic() - started) * 1000)
+    usage['chunks'] = chunk_stats
+    events = merge_chunk_events(chunk_events)
+    logger.info(f"Chunked extraction finished in {usage['latency_ms']}ms: "
+                f"{len(events)} events from {len(chunks)} chunks ({len(failed_chunks)} failed)")
+    return events, usage, failed_chunks
+
+
+def merge_chunk_events(chunk_events):
+    """
+    Merge per-chunk event lists, dropping events that more than one chunk
+    extracted (e.g. a summary block and the detailed segment it refers to).
+
+    Args:
+        chunk_events (list): One list of events per chunk, in text order
+
+    Returns:
+        list: Deduplicated events; of two duplicates the more complete one is kept
+    """
+    merged = {}
+    for events in chunk_events:
+        for event in events:
+            name = re.sub(r'\W+', ' ', str(event.get('event_name') or '')).strip().lower()
+            key = (name, event.get('start_date'), event.get('start_time'))
+            existing = merged.get(key)
+            if existing is None:
+                merged[key] = event
+            elif sum(1 for value in event.values() if value) > sum(1 for value in existing.values() if value):
+                merged[key] = event
+
+    return list(merged.values())
+
+
+def expand_event_datetimes(event, user_timezone="UTC"):
+    """
+    Derive the separate date/time fields from the compact "start"/"end" values
+    returned by the model, and fold "exception_dates" into the stored
+    recurrence text.
+
+    The date/time fields are wall-clock values in the user's timezone, which
+    is how they are read back when the event is edited or synced, whatever
+    UTC offset the model wrote the value with.
+
+    Args:
+        event (dict): Event with RFC3339 (or YYYY-MM-DD) "start" and "end"
+        user_timezone (str): User's timezone
+
+    Returns:
+        dict: Event with start_date, start_time, start_datetime, end_date,
+            end_time, end_datetime and recurrence filled in
+    """
+    user_tz = get_timezone(user_timezone)
+    exception_dates = event.pop('exception_dates', None)
+    event['recurrence'] = build_recurrence(event.get('recurrence'), exception_dates)
+
+    for prefix in ('start', 'end'):
+        value = event.pop(prefix, None)
+        event.setdefault(f'{prefix}_date', None)
+        event.setdefault(f'{prefix}_time', None)
+        event.setdefault(f'{prefix}_datetime', None)
+        if not value:
+            continue
+
+        value = str(value).strip()
+        try:
+            if len(value) == 10:
+                # All-day event
+                event[f'{prefix}_date'] = datetime.strptime(value, '%Y-%m-%d').strftime('%Y-%m-%d')
+                continue
+
+            if value.endswith('Z'):
+                value = value[:-1] + '+00:00'
+            parsed = datetime.fromisoformat(value)
+        except ValueError:
+            logger.warning(f"Unparseable {prefix} value from model: '{value}'")
+            continue
+
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone(user_tz)
+        event[f'{prefix}_date'] = parsed.strftime('%Y-%m-%d')
+        event[f'{prefix}_time'] = parsed.strftime('%H:%M')
+        if parsed.tzinfo is not None:
+            event[f'{prefix}_datetime'] = parsed.isoformat()
+
+    return event
+
+
 def validate_and_clean_event(event_data):
     """
     Validate and clean extracted event data.
@@ -160,7 +521,10 @@ def validate_and_clean_event(event_data):
         'start_time': event_data.get('start_time'),
         'end_date': event_data.get('end_date'),
         'end_time': event_data.get('end_time'),
-        'location': safe_strip(event_data.get('location'), '')
+        'start_datetime': event_data.get('start_datetime'),
+        'end_datetime': event_data.get('end_datetime'),
+        'location': safe_strip(event_data.get('location'), ''),
+        'recurrence': event_data.get('recurrence') or None
     }
 
     # Validate dates
@@ -1,13 +1,18 @@
 # Use this Flask blueprint for Google authentication. Do not use flask-dance.
 
 import json
+import logging
 import os
+import re
+import threading
+import time
 
-import requests
+from helpers import http_client
 from app import db
 from flask import Blueprint, redirect, request, url_for, session
 from flask_login import login_required, login_user, logout_user
 from models import User, Event
+from google_calendar import stamp_token_expiry
 from oauthlib.oauth2 import WebApplicationClient
 
 GOOGLE_CLIENT_ID = os.environ.get("GOOGLE_OAUTH_CLIENT_ID",
@@ -16,17 +21,75 @@ GOOGLE_CLIENT_SECRET = os.environ.get("GOOGLE_OAUTH_CLIENT_SECRET",
                                       "your-google-client-secret")
 GOOGLE_DISCOVERY_URL = "https://accounts.google.com/.well-known/openid-configuration"
 
+logger = logging.getLogger(__name__)
+
 # Use relative redirect URL - Flask will handle the domain automatically
 REDIRECT_URL = "/google_login/callback"
 
+# Fallback lifetime for the discovery document when Google sends no max-age
+GOOGLE_DISCOVERY_DEFAULT_TTL = int(os.environ.get("GOOGLE_DISCOVERY_DEFAULT_TTL", 3600))
+
 client = WebApplicationClient(GOOGLE_CLIENT_ID)
 
 google_auth = Blueprint("google_auth", __name__)
 
+_discovery_cache = {'config': None, 'expires_at': 0.0, 'refreshing': False}
+_discovery_lock = threading.Lock()
+
+
+def _fetch_google_provider_cfg():
+    """Fetch the OpenID discovery document and cache it for its Cache-Control max-age"""
+    response = http_client.get(GOOGLE_DISCOVERY_URL, timeout=10)
+    response.raise_for_status()
+    config = response.json()
+
+    ttl = GOOGLE_DISCOVERY_DEFAULT_TTL
+    max_age = re.search(r'max-age=(\d+)', response.headers.get('Cache-Control', ''))
+    if max_age:
+        ttl = int(max_age.group(1))
+
+    with _discovery_lock:
+        _discovery_cache['config'] = config
+        _discovery_cache['expires_at'] = time.time() + ttl
+    return config
+
+
+def _refresh_google_provider_cfg():
+    """Background refresh; on failure the stale document keeps being served"""
+    try:
+        _fetch_google_provider_cfg()
+    except Exception as e:
+        logger.warning(f"Failed to refresh Google discovery document, serving stale copy: {str(e)}")
+    finally:
+        with _discovery_lock:
+            _discovery_cache['refreshing'] = False
+
+
+def get_google_provider_cfg():
+    """
+    Get Google's OpenID discovery document.
+
+    Fetched once and cached in-process. Once expired, the cached copy is still
+    returned while a background thread refreshes it, so only the very first
+    sign-in per process waits on Google.
+
+    Returns:
+        dict: Discovery document
+    """
+    with _discovery_lock:
+        config = _discovery_cache['config']
+        if config is not None:
+            if time.time() >= _discovery_cache['expires_at'] and not _discovery_cache['refreshing']:
+                _discovery_cache['refreshing'] = True
+                threading.Thread(target=_refresh_google_provider_cfg, daemon=True).start()
+            return config
+
+    return _fetch_google_provider_cfg()
+
 
 @google_auth.route("/google_login")
 def login():
-    google_provider_cfg = requests.get(GOOGLE_DISCOVERY_URL).json()
+    google_provider_cfg = get_google_provider_cfg()
     authorization_endpoint = google_provider_cfg["authorization_endpoint"]
 
     # Store timezone in session for later use during user creation
@@ -54,7 +117,7 @@ def login():
 @google_auth.route("/google_login/callback")
 def callback():
     code = request.args.get("code")
-    google_provider_cfg = requests.get(GOOGLE_DISCOVERY_URL).json()
+    google_provider_cfg = get_google_provider_cfg()
     token_endpoint = google_provider_cfg["token_endpoint"]
 
     token_url, headers, body = client.prepare_token_request(
@@ -63,7 +126,7 @@ def callback():
         redirect_url=request.url_root.rstrip('/') + REDIRECT_URL,
         code=code,
     )
-    token_response = requests.post(
+    token_response = http_client.post(
         token_url,
         headers=headers,
         data=body,
@@ -75,9 +138,12 @@ def callback():
 
     client.parse_request_body_response(json.dumps(token_data))
 
+    # Persist an absolute expiry so calendar calls can skip token validation
+    stamp_token_expiry(token_data, token_data.get('expires_in'))
+
     userinfo_endpoint = google_provider_cfg["userinfo_endpoint"]
     uri, headers, body = client.add_token(userinfo_endpoint)
-    userinfo_response = requests.get(uri, headers=headers, data=body)
+    userinfo_response = http_client.get(uri, headers=headers, data=body)
 
     userinfo = userinfo_response.json()
     if userinfo.get("email_verified"):
@@ -116,8 +182,6 @@ def callback():
     # Save refresh token separately for better management
     if token_data.get('refresh_token'):
         user.google_refresh_token = token_data.get('refresh_token')
-        import logging
-        logger = logging.getLogger(__name__)
         logger.info(f"Stored refresh token for user {users_email}")
 
     db.session.commit()
@@ -138,39 +202,20 @@ def callback():
     # Auto-sync events for temp users who just signed up
     if 'is_temp_user_signup' in locals() and is_temp_user_signup:
         try:
-            from google_calendar import get_or_create_textbot_calendar, create_calendar_event
-            from helpers.event_utils import prepare_event_data_for_calendar
-            import logging
-            logger = logging.getLogger(__name__)
+            from helpers.calendar_sync import enqueue_calendar_sync
             
-            logger.info(f"Temp user {users_email} signed up, auto-syncing existing events")
+            logger.info(f"Temp user {users_email} signed up, queueing existing events for sync")
             
             # Get user's unsynced events
-            unsynced_events = user.events.filter_by(is_synced=False).all()
+            unsynced_events = Event.query.filter_by(user_id=user.id, is_synced=False).all()
             
             if unsynced_events:
-                # Get access token and create calendar
-                access_token = json.loads(user.google_token)['access_token']
-                calendar_id = get_or_create_textbot_calendar(user, access_token)
-                
-                synced_count = 0
+                # The calendar sync worker picks these up in batch requests
                 for event in unsynced_events:
-                    try:
-                        event_data = prepare_event_data_for_calendar(event)
-                        google_event_id = create_calendar_event(user, event_data)
-                        
-                        if google_event_id:
-                            event.google_event_id = google_event_id
-                            event.is_synced = True
-                            synced_count += 1
-                            logger.info(f"Auto-synced event '{event.event_name}' for new user")
-                    
-                    except Exception as sync_error:
-                        logger.warning(f"Failed to sync event '{event.event_name}': {str(sync_error)}")
+                    enqueue_calendar_sync(user, 'insert', event)
                 
-                # Commit the sync updates
                 db.session.commit()
-                logger.info(f"Auto-synced {synced_count}/{len(unsynced_events)} events for new user {users_email}")
+                logger.info(f"Queued {len(unsynced_events)} events for sync for new user {users_email}")
         
         except Exception as e:
             logger.error(f"Error auto-syncing events for new user {users_email}: {str(e)}")
@@ -1,14 +1,71 @@
+import hashlib
 import json
 import os
 import logging
+import re
+import time
+import uuid
 from datetime import datetime, timedelta
+from urllib.parse import quote
 import requests
 from flask import current_app
+from helpers import http_client
+from helpers.recurrence import recurrence_for_calendar
 import sentry_sdk
 
 logger = logging.getLogger(__name__)
 
-# Database-stored calendar IDs replace caching for better reliability
+# Database-stored calendar IDs replace caching for better reliability.
+# A validated ID is trusted (without a GET) until it is this old, or until an
+# event operation reports the calendar gone with a 404/410.
+CALENDAR_REVALIDATE_SECONDS = int(os.environ.get("CALENDAR_REVALIDATE_SECONDS", 86400))
+
+# Access tokens are trusted until they are this close to expires_at
+TOKEN_EXPIRY_SAFETY_SECONDS = int(os.environ.get("GOOGLE_TOKEN_EXPIRY_SAFETY_SECONDS", 300))
+
+def get_token_data(user):
+    """
+    Parse the user's stored Google token, reusing the parsed value for as long
+    as the stored JSON is unchanged (i.e. for the rest of the request).
+
+    Args:
+        user: User object with google_token
+
+    Returns:
+        dict: Token data, empty if the user has no token
+
+    Raises:
+        json.JSONDecodeError: If the stored token is not valid JSON
+    """
+    raw_token = user.google_token
+    if not raw_token:
+        return {}
+
+    cached = getattr(user, '_token_data_cache', None)
+    if cached and cached[0] == raw_token:
+        return cached[1]
+
+    token_data = json.loads(raw_token)
+    user._token_data_cache = (raw_token, token_data)
+    return token_data
+
+def save_token_data(user, token_data):
+    """Store token data on the user (caller commits) and keep the parsed copy warm"""
+    user.google_token = json.dumps(token_data)
+    user._token_data_cache = (user.google_token, token_data)
+
+def stamp_token_expiry(token_data, expires_in):
+    """
+    Record an absolute expiry on token data from an OAuth expires_in value.
+
+    Args:
+        token_data (dict): Token data to update in place
+        expires_in: Lifetime in seconds as returned by Google
+    """
+    try:
+        token_data['expires_at'] = int(time.time()) + int(expires_in)
+    except (TypeError, ValueError):
+        token_data.pop('expires_at', None)
 
 def check_user_has_calendar_scope(user):
     """
@@ -26,7 +83,7 @@ def check_user_has_calendar_scope(user):
         return False
 
     try:
-        token_data = json.loads(user.google_token)
+        token_data = get_token_data(user)
         # If user has a stored token, they previously granted calendar access
         # since our OAuth flow in google_auth.py requests calendar scope
         return bool(token_data.get('access_token'))
@@ -38,12 +95,16 @@ def check_user_has_calendar_scope(user):
         logger.error(f"Error checking calendar scope: {str(e)}")
         return False
 
-def refresh_google_token(user):
+def refresh_google_token(user, force_refresh=False):
     """
-    Refresh Google OAuth token if needed.
+    Get a valid Google OAuth access token, refreshing it only if needed.
+
+    Tokens with a stored expires_at are returned without any network call
+    until they are within TOKEN_EXPIRY_SAFETY_SECONDS of expiry.
 
     Args:
         user: User object with google_token
+        force_refresh (bool): Skip the cached token, e.g. after a 401 from Google
 
     Returns:
         str: Valid access token
@@ -53,32 +114,42 @@ def refresh_google_token(user):
 
     try:
         from app import db
-        token_data = json.loads(user.google_token)
+        token_data = get_token_data(user)
         access_token = token_data.get('access_token')
-        refresh_token = token_data.get('refresh_token')
+        refresh_token = token_data.get('refresh_token') or user.google_refresh_token
+
+        if not access_token:
+            raise Exception("Invalid Google authentication. Please sign in again")
+
+        expires_at = token_data.get('expires_at')
+        if not force_refresh and expires_at and expires_at - time.time() > TOKEN_EXPIRY_SAFETY_SECONDS:
+            return access_token
 
         logger.info(f"Token data keys: {list(token_data.keys())}")
         logger.info(f"Has refresh token: {bool(refresh_token)}")
 
-        if not access_token:
-            raise Exception("Invalid Google authentication. Please sign in again")
+        test_response = None
+        if not force_refresh and not expires_at:
+            # Token stored before expiry tracking: validate it once via the tokeninfo
+            # endpoint (works without calendar permissions) and record its expiry
+            test_response = http_client.get(
+                f'https://www.googleapis.com/oauth2/v1/tokeninfo?access_token={access_token}',
+                timeout=10
+            )
 
-        # Test the current token by checking if we can access the calendar service
-        # Using the tokeninfo endpoint to validate the token without requiring calendar permissions
-        test_response = requests.get(
-            f'https://www.googleapis.com/oauth2/v1/tokeninfo?access_token={access_token}',
-            timeout=10
-        )
-
-        if test_response.status_code == 200:
-            # Token is still valid, check if it has the right scope
-            token_info = test_response.json()
-            if 'scope' in token_info and 'calendar' in token_info['scope']:
-                return access_token
-            else:
-                logger.warning("Token doesn't have required calendar scope, attempting refresh")
+            if test_response.status_code == 200:
+                # Token is still valid, check if it has the right scope
+                token_info = test_response.json()
+                if 'scope' in token_info and 'calendar' in token_info['scope']:
+                    if token_info.get('expires_in'):
+                        stamp_token_expiry(token_data, token_info['expires_in'])
+                        save_token_data(user, token_data)
+                        db.session.commit()
+                    return access_token
+                else:
+                    logger.warning("Token doesn't have required calendar scope, attempting refresh")
 
-        # If token is invalid or doesn't have proper scope, attempt refresh
+        # If token is expiring, was rejected, or doesn't have proper scope, attempt refresh
         if refresh_token:
             # Token expired, try to refresh it
             logger.info("Access token expired, attempting to refresh")
@@ -91,7 +162,7 @@ def refresh_google_token(user):
                 'client_secret': os.environ.get('GOOGLE_OAUTH_CLIENT_SECRET'),
             }
 
-            refresh_response = requests.post(
+            refresh_response = http_client.post(
                 'https://oauth2.googleapis.com/token',
                 data=refresh_data,
                 timeout=10
@@ -108,9 +179,10 @@ def refresh_google_token(user):
                 token_data['access_token'] = new_token_data['access_token']
                 if 'refresh_token' in new_token_data:
                     token_data['refresh_token'] = new_token_data['refresh_token']
+                stamp_token_expiry(token_data, new_token_data.get('expires_in'))
 
                 # Save updated token to database
-                user.google_token = json.dumps(token_data)
+                save_token_data(user, token_data)
                 db.session.commit()
 
                 logger.info("Successfully refreshed Google access token")
@@ -119,16 +191,14 @@ def refresh_google_token(user):
                 logger.error(f"Failed to refresh token: {refresh_response.status_code}")
                 raise Exception("Google authentication has expired. Please sign in again")
         else:
-            # No refresh token or other error
-            if test_response.status_code == 401 or test_response.status_code == 400:
-                if not refresh_token:
-                    logger.warning("No refresh token available, user needs to re-authenticate")
-                    logger.warning("This usually happens when user granted permissions without offline access")
-                    raise Exception("Google Calendar access expired. Please use 'Refresh Google Access' to restore calendar sync")
-                else:
-                    logger.error("Token refresh failed or other auth issue")
-                    logger.error(f"Refresh token present but failed: {refresh_token[:10] if refresh_token else 'None'}...")
-                    raise Exception("Google authentication has expired. Please use 'Refresh Google Access' to sign in again")
+            # No refresh token: keep using the access token until it actually expires
+            if not force_refresh and expires_at and expires_at > time.time():
+                return access_token
+
+            if test_response is None or test_response.status_code == 401 or test_response.status_code == 400:
+                logger.warning("No refresh token available, user needs to re-authenticate")
+                logger.warning("This usually happens when user granted permissions without offline access")
+                raise Exception("Google Calendar access expired. Please use 'Refresh Google Access' to restore calendar sync")
             else:
                 logger.error(f"Calendar API error: {test_response.status_code} - {test_response.text}")
                 raise Exception("Unable to access Google Calendar. Please check your permissions")
@@ -144,10 +214,58 @@ def refresh_google_token(user):
             logger.error(f"Unexpected error in token refresh: {str(e)}")
             raise Exception("Google authentication issue. Please sign in again")
 
+def send_with_token_retry(user, access_token, send):
+    """
+    Send a Google API request, retrying once with a fresh token on a 401.
+
+    Args:
+        user: User object with google_token
+        access_token: Token to try first
+        send: Callable taking an access token and returning a requests.Response
+
+    Returns:
+        requests.Response: Response from the last attempt
+    """
+    response = send(access_token)
+    if response.status_code != 401:
+        return response
+
+    # The token may already have been refreshed earlier in this request
+    stored_token = get_token_data(user).get('access_token')
+    if stored_token and stored_token != access_token:
+        access_token = stored_token
+    else:
+        logger.info("Google rejected cached access token, forcing refresh")
+        access_token = refresh_google_token(user, force_refresh=True)
+
+    return send(access_token)
+
+def invalidate_textbot_calendar(user):
+    """
+    Force the stored calendar ID to be revalidated on the next calendar operation.
+    Called when Google answers an event operation with 404/410.
+
+    Args:
+        user: User object with textbot_calendar_id
+    """
+    from app import db
+
+    if user.textbot_calendar_validated_at is None:
+        return
+
+    logger.warning(f"Calendar {user.textbot_calendar_id} may be gone, scheduling revalidation")
+    user.textbot_calendar_validated_at = None
+    try:
+        db.session.commit()
+    except Exception as e:
+        logger.error(f"Failed to invalidate calendar validation: {str(e)}")
+        db.session.rollback()
+
 def get_or_create_textbot_calendar(user, access_token):
     """
     Get stored Textbot calendar ID or create a new one if needed.
-    Validates existing calendar ID and creates new one if invalid.
+    A recently validated ID is returned without a network call; older IDs
+    are revalidated, and a new calendar is created if the ID is invalid.
 
     Args:
         user: User object with textbot_calendar_id
@@ -158,10 +276,17 @@ def get_or_create_textbot_calendar(user, access_token):
     """
     from app import db
 
-    headers = {
-        'Authorization': f'Bearer {access_token}',
-        'Content-Type': 'application/json'
-    }
+    def auth_headers(token):
+        return {
+            'Authorization': f'Bearer {token}',
+            'Content-Type': 'application/json'
+        }
+
+    # Skip validation while the stored ID was validated recently
+    validated_at = user.textbot_calendar_validated_at
+    if (user.textbot_calendar_id and validated_at and
+            datetime.utcnow() - validated_at < timedelta(seconds=CALENDAR_REVALIDATE_SECONDS)):
+        return user.textbot_calendar_id
 
     # Check if user already has a stored calendar ID and validate it
     if user.textbot_calendar_id:
@@ -169,22 +294,29 @@ def get_or_create_textbot_calendar(user, access_token):
 
         try:
             # Test if the stored calendar ID is still valid
-            test_response = requests.get(
+            test_response = send_with_token_retry(user, access_token, lambda token: http_client.get(
                 f'https://www.googleapis.com/calendar/v3/calendars/{user.textbot_calendar_id}',
-                headers=headers,
+                headers=auth_headers(token),
                 timeout=10
-            )
+            ))
 
             if test_response.status_code == 200:
                 logger.info("Stored calendar ID is valid, using it")
+                user.textbot_calendar_validated_at = datetime.utcnow()
+                db.session.commit()
                 return user.textbot_calendar_id
+            elif test_response.status_code == 401:
+                # Never drop a good calendar ID just because our token was rejected
+                raise Exception("Google Calendar authentication failed. Please sign in again.")
             else:
                 logger.warning(f"Stored calendar ID is invalid (status {test_response.status_code}), will create new calendar")
                 user.textbot_calendar_id = None  # Clear invalid ID
+                user.textbot_calendar_validated_at = None
 
-        except Exception as e:
+        except requests.exceptions.RequestException as e:
             logger.warning(f"Error validating stored calendar ID: {str(e)}, will create new calendar")
             user.textbot_calendar_id = None  # Clear invalid ID
+            user.textbot_calendar_validated_at = None
 
     try:
         # Create new Calendar Autobot calendar since user doesn't have one stored or it's invalid
@@ -195,12 +327,12 @@ def get_or_create_textbot_calendar(user, access_token):
             'timeZone': user.timezone
         }
 
-        response = requests.post(
+        response = send_with_token_retry(user, access_token, lambda token: http_client.post(
             'https://www.googleapis.com/calendar/v3/calendars',
-            headers=headers,
+            headers=auth_headers(token),
             data=json.dumps(calendar_data),
             timeout=30
-        )
+        ))
 
         if response.status_code == 200:
             result = response.json()
@@ -208,6 +340,7 @@ def get_or_create_textbot_calendar(user, access_token):
 
             # Store the calendar ID in the user's record
             user.textbot_calendar_id = calendar_id
+            user.textbot_calendar_validated_at = datetime.utcnow()
             db.session.commit()
 
             logger.info(f"Successfully created and stored Calendar Autobot calendar with ID: {calendar_id}")
@@ -223,13 +356,92 @@ def get_or_create_textbot_calendar(user, access_token):
         logger.error(f"Error creating Calendar Autobot calendar: {str(e)}")
         raise Exception("Failed to create calendar. Please try again.")
 
-def create_calendar_event(user, event_data):
+def calendar_event_id_for(user, event_id):
+    """
+    Deterministic Google Calendar event ID for a local event, so an insert that
+    is sent again after an ambiguous failure hits 409 instead of creating a duplicate.
+
+    Args:
+        user: User object that owns the event
+        event_id (int): Local Event ID
+
+    Returns:
+        str: Event ID in Google's allowed alphabet (lowercase hex is a subset of base32hex)
+    """
+    return hashlib.sha256(f"calendar-autobot:{user.id}:{event_id}".encode('utf-8')).hexdigest()[:32]
+
+def build_calendar_event_body(user, event_data, use_datetime_fields=True):
+    """
+    Build the Google Calendar API event resource for event data.
+
+    Args:
+        user: User object (for timezone)
+        event_data: Dictionary with event details
+        use_datetime_fields (bool): Prefer the RFC3339 start/end datetime fields when present
+
+    Returns:
+        dict: Event resource for insert/update requests
+    """
+    # Use combined datetime fields if available, otherwise fall back to separate date/time
+    if use_datetime_fields and event_data.get('start_datetime') and event_data.get('end_datetime'):
+        start_datetime = event_data['start_datetime']
+        end_datetime = event_data['end_datetime']
+        logger.info(f"Using combined datetime fields: start={start_datetime}, end={end_datetime}")
+    else:
+        # Fallback to separate date/time fields for backward compatibility
+        start_datetime = event_data['start_date']
+        end_datetime = event_data.get('end_date', event_data['start_date'])
+
+        # Add time if specified
+        if event_data.get('start_time'):
+            start_datetime += f"T{event_data['start_time']}:00"
+        else:
+            start_datetime += "T09:00:00"  # Default to 9 AM
+
+        if event_data.get('end_time'):
+            end_datetime += f"T{event_data['end_time']}:00"
+        else:
+            # Default to 1 hour duration if no end time specified
+            if event_data.get('start_time'):
+                start_time = datetime.strptime(event_data['start_time'], '%H:%M')
+                end_time = start_time + timedelta(hours=1)
+                end_datetime += f"T{end_time.strftime('%H:%M')}:00"
+            else:
+                end_datetime += "T10:00:00"  # Default to 10 AM
+        logger.info(f"Using separate date/time fields: start={start_datetime}, end={end_datetime}")
+
+    calendar_event = {
+        "summary": event_data['event_name'],
+        "description": event_data.get('event_description', ''),
+        "start": {
+            "dateTime": start_datetime,
+            "timeZone": user.timezone
+        },
+        "end": {
+            "dateTime": end_datetime,
+            "timeZone": user.timezone
+        }
+    }
+
+    # Add location if specified
+    if event_data.get('location'):
+        calendar_event["location"] = event_data['location']
+
+    # One series instead of one insert per occurrence
+    recurrence = recurrence_for_calendar(event_data.get('recurrence'), event_data.get('start_time'), user.timezone)
+    if recurrence:
+        calendar_event["recurrence"] = recurrence
+
+    return calendar_event
+
+def create_calendar_event(user, event_data, event_id=None):
     """
     Create an event in Google Calendar.
 
     Args:
         user: User object with Google token
         event_data: Dictionary with event details
+        event_id (int): Local Event ID; when given the insert is idempotent
 
     Returns:
         str: Google event ID if successful
@@ -241,73 +453,40 @@ def create_calendar_event(user, event_data):
         # Get or create the Calendar Autobot calendar
         calendar_id = get_or_create_textbot_calendar(user, access_token)
 
-
-
-        # Use combined datetime fields if available, otherwise fall back to separate date/time
-        if event_data.get('start_datetime') and event_data.get('end_datetime'):
-            start_datetime = event_data['start_datetime']
-            end_datetime = event_data['end_datetime']
-            logger.info(f"Using combined datetime fields: start={start_datetime}, end={end_datetime}")
-        else:
-            # Fallback to separate date/time fields for backward compatibility
-            start_datetime = event_data['start_date']
-            end_datetime = event_data.get('end_date', event_data['start_date'])
-
-            # Add time if specified
-            if event_data.get('start_time'):
-                start_datetime += f"T{event_data['start_time']}:00"
-            else:
-                start_datetime += "T09:00:00"  # Default to 9 AM
-
-            if event_data.get('end_time'):
-                end_datetime += f"T{event_data['end_time']}:00"
-            else:
-                # Default to 1 hour duration if no end time specified
-                if event_data.get('start_time'):
-                    start_time = datetime.strptime(event_data['start_time'], '%H:%M')
-                    end_time = start_time + timedelta(hours=1)
-                    end_datetime += f"T{end_time.strftime('%H:%M')}:00"
-                else:
-                    end_datetime += "T10:00:00"  # Default to 10 AM
-            logger.info(f"Using separate date/time fields: start={start_datetime}, end={end_datetime}")
-
-        # Create the calendar event
-        calendar_event = {
-            "summary": event_data['event_name'],
-            "description": event_data.get('event_description', ''),
-            "start": {
-                "dateTime": start_datetime,
-                "timeZone": user.timezone
-            },
-            "end": {
-                "dateTime": end_datetime,
-                "timeZone": user.timezone
-            }
-        }
-
-        # Add location if specified
-        if event_data.get('location'):
-            calendar_event["location"] = event_data['location']
+        calendar_event = build_calendar_event_body(user, event_data)
+        if event_id is not None:
+            calendar_event["id"] = calendar_event_id_for(user, event_id)
 
         # Make API request to Google Calendar
-        headers = {
-            'Authorization': f'Bearer {access_token}',
-            'Content-Type': 'application/json'
-        }
+        def insert_event(calendar_id):
+            return send_with_token_retry(user, access_token, lambda token: http_client.post(
+                f'https://www.googleapis.com/calendar/v3/calendars/{calendar_id}/events',
+                headers={
+                    'Authorization': f'Bearer {token}',
+                    'Content-Type': 'application/json'
+                },
+                data=json.dumps(calendar_event),
+                timeout=30
+            ))
 
         logger.info("Making request to Google Calendar API")
-        response = requests.post(
-            f'https://www.googleapis.com/calendar/v3/calendars/{calendar_id}/events',
-            headers=headers,
-            data=json.dumps(calendar_event),
-            timeout=30
-        )
+        response = insert_event(calendar_id)
+
+        if response.status_code in (404, 410):
+            # The cached calendar was deleted; revalidate (recreating it if needed) and retry once
+            invalidate_textbot_calendar(user)
+            calendar_id = get_or_create_textbot_calendar(user, access_token)
+            response = insert_event(calendar_id)
 
         if response.status_code == 200:
             result = response.json()
             event_id = result.get('id')
             logger.info(f"Successfully created calendar event with ID: {event_id}")
             return event_id
+        elif response.status_code == 409 and calendar_event.get("id"):
+            # An earlier attempt already created it
+            logger.info(f"Calendar event {calendar_event['id']} already exists")
+            return calendar_event["id"]
         elif response.status_code == 401:
             logger.error("Google Calendar authentication failed")
             sentry_sdk.capture_message("Google Calendar authentication failed", level="error")
@@ -356,52 +535,21 @@ def update_calendar_event(user, google_event_id, event_data):
         # Get the Calendar Autobot calendar ID
         calendar_id = get_or_create_textbot_calendar(user, access_token)
 
-        # Similar logic as create_calendar_event but for updating
-        start_datetime = event_data['start_date']
-        end_datetime = event_data.get('end_date', event_data['start_date'])
-
-        if event_data.get('start_time'):
-            start_datetime += f"T{event_data['start_time']}:00"
-        else:
-            start_datetime += "T09:00:00"
-
-        if event_data.get('end_time'):
-            end_datetime += f"T{event_data['end_time']}:00"
-        else:
-            if event_data.get('start_time'):
-                start_time = datetime.strptime(event_data['start_time'], '%H:%M')
-                end_time = start_time + timedelta(hours=1)
-                end_datetime += f"T{end_time.strftime('%H:%M')}:00"
-            else:
-                end_datetime += "T10:00:00"
-
-        calendar_event = {
-            "summary": event_data['event_name'],
-            "description": event_data.get('event_description', ''),
-            "start": {
-                "dateTime": start_datetime,
-                "timeZone": user.timezone
-            },
-            "end": {
-                "dateTime": end_datetime,
-                "timeZone": user.timezone
-            }
-        }
-
-        if event_data.get('location'):
-            calendar_event["location"] = event_data['location']
-
-        headers = {
-            'Authorization': f'Bearer {access_token}',
-            'Content-Type': 'application/json'
-        }
+        # Edits only change the separate date/time fields, so ignore the RFC3339 ones
+        calendar_event = build_calendar_event_body(user, event_data, use_datetime_fields=False)
 
-        response = requests.put(
+        response = send_with_token_retry(user, access_token, lambda token: http_client.put(
             f'https://www.googleapis.com/calendar/v3/calendars/{calendar_id}/events/{google_event_id}',
-            headers=headers,
+            headers={
+                'Authorization': f'Bearer {token}',
+                'Content-Type': 'application/json'
+            },
             data=json.dumps(calendar_event),
             timeout=30
-        )
+        ))
+
+        if response.status_code in (404, 410):
+            invalidate_textbot_calendar(user)
 
         return response.status_code == 200
 
@@ -426,18 +574,250 @@ def delete_calendar_event(user, google_event_id):
         # Get the Calendar Autobot calendar ID
         calendar_id = get_or_create_textbot_calendar(user, access_token)
 
-        headers = {
-            'Authorization': f'Bearer {access_token}'
-        }
-
-        response = requests.delete(
+        response = send_with_token_retry(user, access_token, lambda token: http_client.delete(
             f'https://www.googleapis.com/calendar/v3/calendars/{calendar_id}/events/{google_event_id}',
-            headers=headers,
+            headers={
+                'Authorization': f'Bearer {token}'
+            },
             timeout=30
-        )
+        ))
+
+        if response.status_code in (404, 410):
+            invalidate_textbot_calendar(user)
 
         return response.status_code == 204
 
     except Exception as e:
         current_app.logger.error(f"Error deleting calendar event: {str(e)}")
-        return False
\ No newline at end of file
+        return False
+
+GOOGLE_BATCH_URL = 'https://www.googleapis.com/batch/calendar/v3'
+GOOGLE_BATCH_MAX_PARTS = 50  # Google's documented per-request limit for Calendar batches
+GOOGLE_BATCH_MAX_RETRIES = int(os.environ.get("GOOGLE_BATCH_MAX_RETRIES", 2))
+RETRYABLE_BATCH_STATUSES = {401, 403, 404, 410, 429, 500, 502, 503, 504}
+
+def _build_batch_body(calendar_id, parts, boundary):
+    """
+    Build a multipart/mixed Google batch request body.
+
+    Args:
+        calendar_id: Calendar the operations target
+        parts: List of (content_id, operation, event_id, calendar_event) tuples
+        boundary: Multipart boundary string
+
+    Returns:
+        str: Request body
+    """
+    calendar_path = f"/calendar/v3/calendars/{quote(calendar_id, safe='')}/events"
+    lines = []
+    for content_id, operation, event_id, calendar_event in parts:
+        lines.append(f"--{boundary}")
+        lines.append("Content-Type: application/http")
+        lines.append(f"Content-ID: <item-{content_id}>")
+        lines.append("")
+        if operation == 'insert':
+            lines.append(f"POST {calendar_path} HTTP/1.1")
+        elif operation == 'update':
+            lines.append(f"PUT {calendar_path}/{quote(event_id, safe='')} HTTP/1.1")
+        else:
+            lines.append(f"DELETE {calendar_path}/{quote(event_id, safe='')} HTTP/1.1")
+        if calendar_event is not None:
+            lines.append("Content-Type: application/json")
+            lines.append("")
+            lines.append(json.dumps(calendar_event))
+        else:
+            lines.append("")
+        lines.append("")
+    lines.append(f"--{boundary}--")
+    return "\r\n".join(lines)
+
+def _parse_batch_response(response):
+    """
+    Parse a multipart/mixed Google batch response.
+
+    Args:
+        response: requests.Response from the batch endpoint
+
+    Returns:
+        dict: content_id -> (status_code, parsed JSON body or None, Retry-After seconds or None)
+    """
+    match = re.search(r'boundary="?([^";]+)"?', response.headers.get('Content-Type', ''))
+    if not match:
+        raise Exception("Malformed Google Calendar batch response")
+    boundary = match.group(1)
+
+    results = {}
+    for part in response.text.split(f"--{boundary}"):
+        part = part.strip()
+        if not part or part == "--":
+            continue
+
+        # Each part is: MIME headers, blank line, then an embedded HTTP response
+        sections = re.split(r'\r?\n\r?\n', part, maxsplit=2)
+        if len(sections) < 2:
+            continue
+        mime_headers = sections[0]
+        http_head = sections[1]
+        http_body = sections[2] if len(sections) > 2 else ""
+
+        id_match = re.search(r'Content-ID:\s*<response-item-(\d+)>', mime_headers, re.IGNORECASE)
+        status_match = re.match(r'HTTP/[\d.]+\s+(\d{3})', http_head)
+        if not id_match or not status_match:
+            continue
+
+        body = None
+        if http_body.strip():
+            try:
+                body = json.loads(http_body)
+            except ValueError:
+                body = None
+        retry_after = re.search(r'^Retry-After:\s*(\d+)', http_head, re.IGNORECASE | re.MULTILINE)
+        results[int(id_match.group(1))] = (int(status_match.group(1)), body,
+                                           int(retry_after.group(1)) if retry_after else None)
+
+    return results
+
+def sync_events_batch(user, operations, max_retries=GOOGLE_BATCH_MAX_RETRIES):
+    """
+    Sync many events to Google Calendar using the batch endpoint, packing up to
+    GOOGLE_BATCH_MAX_PARTS operations into each multipart/mixed request. Only
+    parts that fail with a retryable status are sent again.
+
+    Event objects are updated in place; the caller commits.
+
+    Args:
+        user: User object with Google token
+        operations: List of (operation, event) pairs, operation is 'insert', 'update' or 'delete'
+        max_retries (int): Rounds of retries for failed parts before giving up
+
+    Returns:
+        dict: {'succeeded': int, 'failed': int, 'errors': {event id: error message},
+               'retryable': set of event ids that failed transiently,
+               'retry_after': largest Retry-After seen in seconds, or None}
+    """
+    from helpers.event_utils import prepare_event_data_for_calendar
+
+    access_token = refresh_google_token(user)
+    calendar_id = get_or_create_textbot_calendar(user, access_token)
+
+    prepared = {}
+    errors = {}
+    for content_id, (operation, event) in enumerate(operations):
+        try:
+            if operation == 'insert':
+                calendar_event = build_calendar_event_body(user, prepare_event_data_for_calendar(event))
+                # Re-sent inserts get 409 instead of creating a duplicate
+                calendar_event["id"] = calendar_event_id_for(user, event.id)
+            elif operation == 'update':
+                calendar_event = build_calendar_event_body(
+                    user, prepare_event_data_for_calendar(event), use_datetime_fields=False)
+            elif operation == 'delete':
+                calendar_event = None
+            else:
+                raise ValueError(f"Unknown calendar operation: {operation}")
+            prepared[content_id] = (operation, event, calendar_event)
+        except Exception as e:
+            logger.error(f"Could not prepare event '{event.event_name}' for batch sync: {str(e)}")
+            errors[event.id] = str(e)
+
+    succeeded = 0
+    retry_after = None
+    pending = sorted(prepared)
+    for attempt in range(max_retries + 1):
+        retry = []
+        calendar_missing = False
+
+        for start in range(0, len(pending), GOOGLE_BATCH_MAX_PARTS):
+            chunk = pending[start:start + GOOGLE_BATCH_MAX_PARTS]
+            boundary = f"batch_{uuid.uuid4().hex}"
+            parts = [(content_id, prepared[content_id][0], prepared[content_id][1].google_event_id,
+                      prepared[content_id][2]) for content_id in chunk]
+            body = _build_batch_body(calendar_id, parts, boundary)
+
+            logger.info(f"Sending Google Calendar batch of {len(chunk)} operation(s), attempt {attempt + 1}")
+            try:
+                response = send_with_token_retry(user, access_token, lambda token: http_client.post(
+                    GOOGLE_BATCH_URL,
+                    headers={
+                        'Authorization': f'Bearer {token}',
+                        'Content-Type': f'multipart/mixed; boundary={boundary}'
+                    },
+                    data=body.encode('utf-8'),
+                    timeout=60
+                ))
+                access_token = get_token_data(user).get('access_token', access_token)
+            except requests.exceptions.RequestException as e:
+                logger.warning(f"Google Calendar batch request failed: {str(e)}")
+                retry.extend(chunk)
+                continue
+
+            if response.status_code != 200:
+                logger.warning(f"Google Calendar batch rejected with {response.status_code}: {response.text[:200]}")
+                if str(response.headers.get('Retry-After', '')).isdigit():
+                    retry_after = max(retry_after or 0, int(response.headers['Retry-After']))
+                if response.status_code in RETRYABLE_BATCH_STATUSES:
+                    retry.extend(chunk)
+                else:
+                    for content_id in chunk:
+                        errors[prepared[content_id][1].id] = f"Google Calendar API error: {response.status_code}"
+                continue
+
+            results = _parse_batch_response(response)
+            for content_id in chunk:
+                operation, event, _ = prepared[content_id]
+                status_code, result, part_retry_after = results.get(content_id, (None, None, None))
+                if part_retry_after is not None:
+                    retry_after = max(retry_after or 0, part_retry_after)
+
+                if status_code in (404, 410):
+                    # Could be the event or the whole calendar; revalidating is cheap
+                    calendar_missing = True
+
+                if operation == 'insert' and status_code == 200:
+                    event.google_event_id = result.get('id') if result else None
+                    event.is_synced = bool(event.google_event_id)
+                elif operation == 'insert' and status_code == 409:
+                    # An earlier ambiguous attempt already created it
+                    event.google_event_id = prepared[content_id][2]["id"]
+                    event.is_synced = True
+                elif operation == 'update' and status_code == 200:
+                    event.is_synced = True
+                elif operation == 'delete' and status_code in (204, 404, 410):
+                    # Already gone counts as deleted
+                    event.google_event_id = None
+                    event.is_synced = False
+                elif status_code is None or status_code in RETRYABLE_BATCH_STATUSES:
+                    retry.append(content_id)
+                    continue
+                else:
+                    message = result.get('error', {}).get('message') if isinstance(result, dict) else None
+                    errors[event.id] = message or f"Google Calendar API error: {status_code}"
+                    continue
+
+                errors.pop(event.id, None)
+                succeeded += 1
+
+        pending = retry
+        if calendar_missing:
+            # Clear the validation even when not retrying here, so the next
+            # attempt (possibly a later outbox run) recreates the calendar
+            invalidate_textbot_calendar(user)
+        if not pending or attempt == max_retries:
+            break
+
+        if calendar_missing:
+            calendar_id = get_or_create_textbot_calendar(user, access_token)
+
+        logger.info(f"Retrying {len(pending)} failed batch part(s)")
+        # Exponential backoff, stretched to honor Retry-After within reason
+        time.sleep(min(max(2 ** attempt, retry_after or 0), 30))
+
+    retryable = set()
+    for content_id in pending:
+        event = prepared[content_id][1]
+        errors[event.id] = "Google Calendar is temporarily busy. Please try again in a moment."
+        retryable.add(event.id)
+
+    logger.info(f"Batch sync finished: {succeeded} succeeded, {len(errors)} failed")
+    return {'succeeded': succeeded, 'failed': len(errors), 'errors': errors,
+            'retryable': retryable, 'retry_after': retry_after}
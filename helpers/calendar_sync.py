@@ -0,0 +1,249 @@
+import logging
+import os
+import types
+from datetime import datetime, timedelta
+
+import sentry_sdk
+
+from app import db
+from models import Event, CalendarSyncOutbox
+from google_calendar import sync_events_batch, GOOGLE_BATCH_MAX_PARTS
+
+logger = logging.getLogger(__name__)
+
+# Google Calendar writes go through the calendar_sync_outbox table. Rows are
+# added in the same transaction as the Event change and drained by
+# calendar_sync_worker.py (or inline, right after commit, by callers that are
+# already off the request path).
+CALENDAR_SYNC_MAX_ATTEMPTS = int(os.environ.get("CALENDAR_SYNC_MAX_ATTEMPTS", 8))
+CALENDAR_SYNC_BASE_BACKOFF_SECONDS = int(os.environ.get("CALENDAR_SYNC_BASE_BACKOFF_SECONDS", 30))
+CALENDAR_SYNC_MAX_BACKOFF_SECONDS = int(os.environ.get("CALENDAR_SYNC_MAX_BACKOFF_SECONDS", 3600))
+CALENDAR_SYNC_PER_USER_CONCURRENCY = int(os.environ.get("CALENDAR_SYNC_PER_USER_CONCURRENCY", 1))
+# Rows left in 'processing' longer than this belong to a crashed worker and are reclaimed
+CALENDAR_SYNC_VISIBILITY_TIMEOUT = int(os.environ.get("CALENDAR_SYNC_VISIBILITY_TIMEOUT", 300))
+
+
+def enqueue_calendar_sync(user, operation, event=None, google_event_id=None, claim_token=None):
+    """
+    Add a calendar sync operation to the outbox. The row is only added to the
+    session, so it commits (or rolls back) together with the caller's Event changes.
+
+    Args:
+        user (User): Owner of the event
+        operation (str): 'insert', 'update' or 'delete'
+        event (Event): Event to sync; must already have an id (flush first)
+        google_event_id (str): Google event to delete, if different from event.google_event_id
+        claim_token (str): Claim the row for the caller, who will process it right after commit
+
+    Returns:
+        CalendarSyncOutbox: The new outbox row
+    """
+    entry = CalendarSyncOutbox()
+    entry.user_id = user.id
+    entry.event_id = event.id if event is not None else None
+    entry.google_event_id = google_event_id or (event.google_event_id if event is not None else None)
+    entry.operation = operation
+    entry.next_attempt_at = datetime.utcnow()
+
+    if claim_token:
+        entry.status = 'processing'
+        entry.claimed_by = claim_token
+        entry.attempts = 1
+    else:
+        entry.status = 'pending'
+        entry.attempts = 0
+
+    db.session.add(entry)
+    return entry
+
+
+def claim_due_entries(claim_token):
+    """
+    Claim a batch of due outbox rows belonging to a single user.
+
+    Users already being synced by CALENDAR_SYNC_PER_USER_CONCURRENCY workers
+    are skipped, and rows are locked with FOR UPDATE SKIP LOCKED so concurrent
+    workers never claim the same row. Claims for the same user are serialized
+    with a transaction-level advisory lock on Postgres, so the busy check and
+    the claim commit together and two workers can't both claim that user's
+    last free slot.
+
+    Args:
+        claim_token (str): Unique token identifying this claim
+
+    Returns:
+        list: Claimed CalendarSyncOutbox rows, empty if nothing is due
+    """
+    now = datetime.utcnow()
+    stale_before = now - timedelta(seconds=CALENDAR_SYNC_VISIBILITY_TIMEOUT)
+
+    busy_users = (db.select(CalendarSyncOutbox.user_id)
+                  .where(CalendarSyncOutbox.status == 'processing')
+                  .where(CalendarSyncOutbox.updated_at >= stale_before)
+                  .group_by(CalendarSyncOutbox.user_id)
+                  .having(db.func.count(db.distinct(CalendarSyncOutbox.claimed_by)) >= CALENDAR_SYNC_PER_USER_CONCURRENCY))
+
+    claimable = db.or_(
+        db.and_(CalendarSyncOutbox.status == 'pending', CalendarSyncOutbox.next_attempt_at <= now),
+        db.and_(CalendarSyncOutbox.status == 'processing', CalendarSyncOutbox.updated_at < stale_before)
+    )
+
+    first = (CalendarSyncOutbox.query
+             .filter(claimable)
+             .filter(CalendarSyncOutbox.user_id.not_in(busy_users))
+             .order_by(CalendarSyncOutbox.next_attempt_at)
+             .with_for_update(skip_locked=True)
+             .first())
+
+    if first is None:
+        db.session.commit()  # Release the transaction
+        return []
+
+    user_id = first.user_id
+    if db.engine.dialect.name == 'postgresql':
+        # Held until the commit below; SQLite already serializes writers
+        db.session.execute(db.text("SELECT pg_advisory_xact_lock(hashtext('calendar_sync_outbox'), :user_id)"),
+                           {'user_id': user_id})
+    active_claims = db.session.execute(
+        db.select(db.func.count(db.distinct(CalendarSyncOutbox.claimed_by)))
+        .where(CalendarSyncOutbox.user_id == user_id)
+        .where(CalendarSyncOutbox.status == 'processing')
+        .where(CalendarSyncOutbox.updated_at >= stale_before)).scalar()
+    if active_claims >= CALENDAR_SYNC_PER_USER_CONCURRENCY:
+        # Another worker claimed this user while we waited for the lock
+        db.session.commit()
+        return []
+
+    entries = (CalendarSyncOutbox.query
+               .filter(claimable)
+               .filter(CalendarSyncOutbox.user_id == user_id)
+               .order_by(CalendarSyncOutbox.id)
+               .limit(GOOGLE_BATCH_MAX_PARTS)
+               .with_for_update(skip_locked=True)
+               .all())
+
+    for entry in entries:
+        entry.status = 'processing'
+        entry.claimed_by = claim_token
+        entry.attempts = (entry.attempts or 0) + 1
+
+    db.session.commit()
+    return entries
+
+
+def release_claimed_entries(claim_token, error):
+    """
+    Put rows claimed by a worker that failed before recording their outcome
+    back in the queue, with the usual retry backoff.
+
+    Args:
+        claim_token (str): Token the rows were claimed with
+        error (str): Error to record on the rows
+
+    Returns:
+        int: Number of rows released
+    """
+    entries = (CalendarSyncOutbox.query
+               .filter(CalendarSyncOutbox.claimed_by == claim_token)
+               .filter(CalendarSyncOutbox.status == 'processing')
+               .all())
+    for entry in entries:
+        _fail_entry(entry, error, retryable=True)
+    db.session.commit()
+    return len(entries)
+
+
+def _complete_entry(entry, note=None):
+    entry.status = 'completed'
+    entry.claimed_by = None
+    entry.last_error = note
+    entry.completed_at = datetime.utcnow()
+
+
+def _fail_entry(entry, error, retryable, retry_after=None):
+    entry.claimed_by = None
+    entry.last_error = error
+
+    if not retryable or entry.attempts >= CALENDAR_SYNC_MAX_ATTEMPTS:
+        entry.status = 'failed'
+        entry.completed_at = datetime.utcnow()
+        logger.warning(f"Calendar sync outbox {entry.id} ({entry.operation}) failed permanently: {error}")
+        return
+
+    delay = min(CALENDAR_SYNC_BASE_BACKOFF_SECONDS * 2 ** max(entry.attempts - 1, 0),
+                CALENDAR_SYNC_MAX_BACKOFF_SECONDS)
+    if retry_after:
+        delay = max(delay, retry_after)
+    entry.status = 'pending'
+    entry.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+    logger.info(f"Calendar sync outbox {entry.id} ({entry.operation}) will retry in {delay}s: {error}")
+
+
+def process_claimed_entries(user, entries):
+    """
+    Send claimed outbox rows for one user to Google Calendar in batch requests
+    and record each row's outcome.
+
+    Args:
+        user (User): Owner of the entries
+        entries (list): CalendarSyncOutbox rows claimed by the caller
+
+    Returns:
+        int: Number of entries that synced successfully
+    """
+    event_ids = [entry.event_id for entry in entries if entry.operation != 'delete' and entry.event_id]
+    events = {event.id: event for event in Event.query.filter(Event.id.in_(event_ids)).all()} if event_ids else {}
+
+    pairs = []
+    for entry in entries:
+        if entry.operation == 'delete':
+            if not entry.google_event_id:
+                _complete_entry(entry, "Event was never synced")
+                continue
+            # The Event row is already gone; a stand-in carries what the batch needs
+            target = types.SimpleNamespace(id=f"outbox-{entry.id}", event_name=f"deleted event {entry.event_id}",
+                                           google_event_id=entry.google_event_id, is_synced=True)
+        else:
+            target = events.get(entry.event_id)
+            if target is None:
+                _complete_entry(entry, "Event no longer exists")
+                continue
+            if entry.operation == 'insert' and target.is_synced and target.google_event_id:
+                _complete_entry(entry, "Event already synced")
+                continue
+            if entry.operation == 'update' and not target.google_event_id:
+                # A pending insert will carry the latest event data
+                _complete_entry(entry, "Event not synced yet")
+                continue
+        pairs.append((entry, target))
+
+    synced = 0
+    if pairs:
+        try:
+            result = sync_events_batch(user, [(entry.operation, target) for entry, target in pairs], max_retries=0)
+        except Exception as e:
+            error_msg = str(e)
+            logger.warning(f"Calendar sync for user {user.id} failed: {error_msg}")
+            # Authentication problems won't fix themselves until the user signs in again
+            retryable = "sign in" not in error_msg.lower() and "expired" not in error_msg.lower()
+            if retryable:
+                sentry_sdk.capture_exception(e)
+            for entry, _ in pairs:
+                _fail_entry(entry, error_msg, retryable)
+        else:
+            for entry, target in pairs:
+                if target.id in result['errors']:
+                    _fail_entry(entry, result['errors'][target.id],
+                                target.id in result['retryable'], result['retry_after'])
+                else:
+                    _complete_entry(entry)
+                    synced += 1
+
+    try:
+        db.session.commit()
+    except Exception as commit_error:
+        logger.error(f"Failed to record calendar sync outcome for user {user.id}: {str(commit_error)}")
+        sentry_sdk.capture_exception(commit_error)
+        db.session.rollback()
+
+    return synced
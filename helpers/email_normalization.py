@@ -0,0 +1,185 @@
+import html
+import logging
+import re
+from html.parser import HTMLParser
+
+logger = logging.getLogger(__name__)
+
+# Rough OpenAI tokenizer ratio for English text, used for reporting only
+CHARS_PER_TOKEN = 4
+# URLs longer than this lose their query string (mostly tracking parameters)
+MAX_URL_LENGTH = 80
+# Quoted reply history is only dropped when the new part of the message has
+# at least this much text; otherwise the quote is probably the content
+MIN_UNQUOTED_CHARS = 200
+# A "-- " block longer than this is content that happens to follow the
+# delimiter, not a signature
+MAX_SIGNATURE_LINES = 8
+
+HTML_TAG_PATTERN = re.compile(r'<(?:html|body|div|p|br|table|tr|td|span|a|font|b|strong)\b[^>]*>', re.IGNORECASE)
+URL_PATTERN = re.compile(r'https?://[^\s<>"\')\]]+')
+# Meeting links are often the event location, so they are never shortened
+MEETING_LINK_HOSTS = ('zoom.us', 'meet.google.com', 'teams.microsoft.com', 'webex.com')
+
+FORWARD_MARKER_PATTERN = re.compile(
+    r'^\s*(?:-{2,}\s*Forwarded message\s*-{2,}|Begin forwarded message:)', re.IGNORECASE | re.MULTILINE)
+REPLY_HEADER_PATTERN = re.compile(r'^\s*On .{5,200}wrote:\s*$', re.IGNORECASE | re.MULTILINE)
+SIGNATURE_DELIMITER_PATTERN = re.compile(r'^-- $', re.MULTILINE)  # RFC 3676; a bare "--" is a separator
+MOBILE_SIGNATURE_PATTERN = re.compile(r'^\s*Sent from my [\w\s]{2,30}$', re.IGNORECASE | re.MULTILINE)
+# Paragraphs starting with these are legal footers and mailing list boilerplate
+BOILERPLATE_PATTERN = re.compile(
+    r'^\s*(?:This (?:e-?mail|message)(?: and any attachments?)? (?:is|are|may contain) confidential'
+    r'|CONFIDENTIALITY NOTICE'
+    r'|To unsubscribe'
+    r'|Unsubscribe'
+    r'|View (?:this email )?in (?:your )?browser'
+    r'|You are receiving this'
+    r'|You received this'
+    r'|Please consider the environment'
+    r'|Privacy Policy'
+    r'|©|Copyright ©|Copyright \d{4})',
+    re.IGNORECASE)
+
+
+class _HTMLTextExtractor(HTMLParser):
+    """Collects visible text, turning block elements into line breaks"""
+
+    BLOCK_TAGS = {'p', 'div', 'br', 'tr', 'li', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'table', 'blockquote', 'hr'}
+    SKIP_TAGS = {'script', 'style', 'head', 'title'}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self.skip_depth += 1
+        elif tag in self.BLOCK_TAGS:
+            self.parts.append("\n")
+        elif tag == 'td':
+            self.parts.append("\t")
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS:
+            self.skip_depth = max(self.skip_depth - 1, 0)
+        elif tag in self.BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        if not self.skip_depth:
+            self.parts.append(data)
+
+
+def html_to_text(markup):
+    """
+    Convert an HTML email body to plain text.
+
+    Args:
+        markup (str): HTML source
+
+    Returns:
+        str: Visible text with block elements on their own lines
+    """
+    parser = _HTMLTextExtractor()
+    try:
+        parser.feed(markup)
+        parser.close()
+    except Exception as e:
+        logger.warning(f"HTML parsing failed, stripping tags instead: {str(e)}")
+        return html.unescape(re.sub(r'<[^>]+>', ' ', markup))
+    return "".join(parser.parts)
+
+
+def _shorten_url(match):
+    url = match.group(0)
+    if len(url) <= MAX_URL_LENGTH or any(host in url for host in MEETING_LINK_HOSTS):
+        return url
+    url = url.split('?', 1)[0].split('#', 1)[0]
+    if len(url) <= MAX_URL_LENGTH:
+        return url
+    return '/'.join(url.split('/', 3)[:3])
+
+
+def _strip_reply_history(text):
+    # Forwarded content is what the user wants extracted, so only the part
+    # before the first forward marker is examined for reply history
+    marker = FORWARD_MARKER_PATTERN.search(text)
+    head, tail = (text[:marker.start()], text[marker.start():]) if marker else (text, "")
+
+    reply_header = REPLY_HEADER_PATTERN.search(head)
+    new_text = head[:reply_header.start()] if reply_header else head
+    new_text = "\n".join(line for line in new_text.splitlines() if not line.lstrip().startswith('>'))
+
+    if len(new_text.strip()) < MIN_UNQUOTED_CHARS and not tail:
+        # A short note on top of a quoted itinerary: keep the quote, minus the markers
+        return re.sub(r'^\s*(?:>\s?)+', '', head, flags=re.MULTILINE) + tail
+    return new_text + ("\n" + tail if tail else "")
+
+
+def _strip_signatures(text):
+    text = MOBILE_SIGNATURE_PATTERN.sub('', text)
+
+    # Only the sender's own signature is dropped: the last "-- " block of the
+    # message before any forwarded content, and only if it is short
+    marker = FORWARD_MARKER_PATTERN.search(text)
+    head, tail = (text[:marker.start()], text[marker.start():]) if marker else (text, "")
+    delimiters = list(SIGNATURE_DELIMITER_PATTERN.finditer(head))
+    if not delimiters:
+        return text
+    delimiter = delimiters[-1]
+    signature = head[delimiter.end():].strip('\n')
+    if len(signature.splitlines()) > MAX_SIGNATURE_LINES:
+        return text
+    return head[:delimiter.start()] + ("\n" + tail if tail else "")
+
+
+def _strip_boilerplate(text):
+    paragraphs = re.split(r'\n\s*\n', text)
+    return "\n\n".join(paragraph for paragraph in paragraphs if not BOILERPLATE_PATTERN.match(paragraph))
+
+
+def normalize_email_text(text):
+    """
+    Shrink an email (or pasted text) before it is sent to the LLM: convert
+    HTML to text, drop reply history, signatures and boilerplate, shorten
+    tracking URLs and collapse whitespace. Forwarded messages are kept.
+
+    Args:
+        text (str): Raw text or HTML
+
+    Returns:
+        tuple: (normalized text, stats dict with original_chars, normalized_chars,
+            chars_saved and estimated_tokens_saved)
+    """
+    original_chars = len(text)
+    normalized = text
+
+    if len(HTML_TAG_PATTERN.findall(normalized)) >= 2:
+        normalized = html_to_text(normalized)
+
+    normalized = normalized.replace('\r\n', '\n').replace('\r', '\n')
+    normalized = re.sub('[\u200b-\u200d\u2060\ufeff\u00ad]', '', normalized)  # Zero-width and soft hyphen
+    normalized = normalized.replace('\u00a0', ' ')
+
+    normalized = _strip_reply_history(normalized)
+    normalized = _strip_signatures(normalized)
+    normalized = _strip_boilerplate(normalized)
+    normalized = URL_PATTERN.sub(_shorten_url, normalized)
+
+    normalized = re.sub(r'[ \t]+', ' ', normalized)
+    normalized = re.sub(r' *\n *', '\n', normalized)
+    normalized = re.sub(r'\n{3,}', '\n\n', normalized).strip()
+
+    if not normalized:
+        # Never hand the LLM an empty prompt because a rule was too eager
+        normalized = text.strip()
+
+    chars_saved = original_chars - len(normalized)
+    stats = {
+        'original_chars': original_chars,
+        'normalized_chars': len(normalized),
+        'chars_saved': chars_saved,
+        'estimated_tokens_saved': max(chars_saved, 0) // CHARS_PER_TOKEN,
+    }
+    return normalized, stats
@@ -0,0 +1,62 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+from datetime import datetime
+
+# Keyset pagination cursors: the (created_at, id) of the last event on a
+# page, as URL-safe base64 JSON plus an HMAC so a client can't hand back a
+# position it wasn't given. Kept free of app imports so it can be unit tested.
+CURSOR_SECRET = os.environ.get("SESSION_SECRET", "dev-secret-key-change-in-production").encode('utf-8')
+CURSOR_SIGNATURE_BYTES = 12
+
+
+def _b64encode(raw):
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def _b64decode(value):
+    return base64.urlsafe_b64decode((value + '=' * (-len(value) % 4)).encode('ascii'))
+
+
+def _sign(payload):
+    return hmac.new(CURSOR_SECRET, payload, hashlib.sha256).digest()[:CURSOR_SIGNATURE_BYTES]
+
+
+def encode_event_cursor(event):
+    """
+    Build the opaque cursor that resumes a listing after an event.
+
+    Args:
+        event (Event): Last event of the current page
+
+    Returns:
+        str: URL-safe cursor
+    """
+    payload = json.dumps([event.created_at.isoformat(), event.id]).encode('utf-8')
+    return f"{_b64encode(payload)}.{_b64encode(_sign(payload))}"
+
+
+def decode_event_cursor(cursor):
+    """
+    Parse a cursor from encode_event_cursor.
+
+    Args:
+        cursor (str): Cursor from a previous page
+
+    Returns:
+        tuple: (created_at datetime, event id)
+
+    Raises:
+        ValueError: If the cursor is malformed or its signature doesn't match
+    """
+    try:
+        encoded_payload, encoded_signature = cursor.split('.')
+        payload = _b64decode(encoded_payload)
+        if not hmac.compare_digest(_sign(payload), _b64decode(encoded_signature)):
+            raise ValueError("Bad signature")
+        created_at, event_id = json.loads(payload)
+        return datetime.fromisoformat(created_at), int(event_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
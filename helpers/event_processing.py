@@ -1,17 +1,23 @@
 
 import logging
 import time
+import uuid
 from datetime import datetime
 from app import db
 from models import User, Event, TextInput
-from event_extractor import extract_events_from_text, validate_and_clean_event
-from google_calendar import create_calendar_event
+from event_extractor import extract_events_from_text, validate_and_clean_event, find_from_email, decorate_events
+from helpers.calendar_sync import enqueue_calendar_sync, process_claimed_entries
+from helpers.email_normalization import normalize_email_text
+from helpers.ics_import import parse_ics_events
+from helpers.structured_data import extract_structured_events
 from helpers.text_processing import sanitize_text_for_db
+from helpers.event_utils import set_event_bounds
 import sentry_sdk
 
 logger = logging.getLogger(__name__)
 
-def process_text_to_events(text, user, source_type="manual", auto_sync=True):
+def process_text_to_events(text, user, source_type="manual", auto_sync=True, use_cache=True, defer_sync=True,
+                           normalize=True, calendar_parts=None, html_body=None, before_commit=None):
     """
     Core function to process text and extract events.
     Can be called from web routes, API endpoints, or webhooks.
@@ -21,6 +27,16 @@ def process_text_to_events(text, user, source_type="manual", auto_sync=True):
         user (User): User object
         source_type (str): Source of the text (manual, api, webhook, email)
         auto_sync (bool): Whether to auto-sync to Google Calendar
+        use_cache (bool): Whether a cached extraction of identical text may be reused
+        defer_sync (bool): Leave auto-sync to the calendar sync worker instead of syncing
+            before returning; failed inline syncs are retried by the worker either way
+        normalize (bool): Strip HTML, reply history, signatures and boilerplate before extraction
+        calendar_parts (list): iCalendar documents attached to the text; when they contain
+            events those are imported directly and the LLM is not called
+        html_body (str): HTML version of the text; schema.org reservation markup in it is
+            mapped directly when it covers every reservation, skipping the LLM
+        before_commit (callable): Called with (text_input, events) inside the transaction
+            that saves them, once ids are assigned, so callers can record progress atomically
 
     Returns:
         dict: Processing results with events, text_input, and sync status
@@ -34,8 +50,38 @@ def process_text_to_events(text, user, source_type="manual", auto_sync=True):
     # Extract events using AI first - use original unsanitized text
     user_timezone = user.timezone if user.timezone else "UTC"
 
-    # Call the extraction function synchronously
-    extracted_events, from_email, is_offline, openai_status, openai_error = extract_events_from_text(text, user_timezone=user_timezone)
+    # Already-structured sources skip the LLM round trip entirely
+    extracted_events = []
+    openai_status = None
+    if calendar_parts:
+        extracted_events = import_calendar_parts(calendar_parts, user_timezone)
+        openai_status = "ics"
+    if not extracted_events and html_body:
+        structured_events, complete = extract_structured_events(html_body, user_timezone)
+        if complete and structured_events:
+            extracted_events = structured_events
+            openai_status = "schema_org"
+        elif structured_events:
+            logger.info(f"Found {len(structured_events)} schema.org reservations but coverage is incomplete")
+
+    normalization = None
+    if extracted_events:
+        from_email = find_from_email(text)
+        extracted_events = decorate_events(extracted_events, from_email)
+        is_offline, openai_error, usage = False, None, None
+        logger.info(f"Imported {len(extracted_events)} events from {openai_status} without calling the LLM")
+    else:
+        # Only the LLM sees the normalized text; the original is what gets stored
+        extraction_text = text
+        if normalize:
+            extraction_text, normalization = normalize_email_text(text)
+            logger.info(f"Normalized text from {normalization['original_chars']} to "
+                        f"{normalization['normalized_chars']} chars "
+                        f"(~{normalization['estimated_tokens_saved']} tokens saved)")
+
+        # Call the extraction function synchronously
+        extracted_events, from_email, is_offline, openai_status, openai_error, usage = extract_events_from_text(
+            extraction_text, user_timezone=user_timezone, use_cache=use_cache)
 
     # Prepare all database objects
     extraction_time = datetime.utcnow()
@@ -54,6 +100,11 @@ def process_text_to_events(text, user, source_type="manual", auto_sync=True):
     text_input.processing_status = "completed"
     text_input.openai_status = openai_status if openai_status else ("offline" if is_offline else "success")
     text_input.openai_error_message = openai_error
+    if usage:
+        text_input.prompt_tokens = usage['prompt_tokens']
+        text_input.cached_prompt_tokens = usage['cached_prompt_tokens']
+        text_input.completion_tokens = usage['completion_tokens']
+        text_input.openai_latency_ms = usage['latency_ms']
 
     # Create Event records
     created_events = []
@@ -90,6 +141,8 @@ def process_text_to_events(text, user, source_type="manual", auto_sync=True):
             event.start_datetime = cleaned_event.get('start_datetime')
             event.end_datetime = cleaned_event.get('end_datetime')
             event.location = sanitize_text_for_db(cleaned_event['location'])
+            event.recurrence = cleaned_event.get('recurrence')
+            set_event_bounds(event, user_timezone)
 
             created_events.append(event)
 
@@ -99,7 +152,11 @@ def process_text_to_events(text, user, source_type="manual", auto_sync=True):
             sentry_sdk.capture_exception(e)
             continue
 
+    # Inline syncs claim their outbox rows up front so the worker leaves them alone
+    claim_token = None if defer_sync else f"inline-{uuid.uuid4().hex}"
+
     # Save everything to database atomically
+    outbox_entries = []
     for attempt in range(3):
         try:
             db.session.add(text_input)
@@ -110,6 +167,16 @@ def process_text_to_events(text, user, source_type="manual", auto_sync=True):
                 event.text_input_id = text_input.id
                 db.session.add(event)
 
+            # Queue calendar sync in the same transaction as the events
+            if auto_sync and created_events:
+                db.session.flush()  # Get the event ids
+                outbox_entries = [enqueue_calendar_sync(user, 'insert', event, claim_token=claim_token)
+                                  for event in created_events]
+
+            if before_commit:
+                db.session.flush()  # Get the event ids
+                before_commit(text_input, created_events)
+
             db.session.commit()
             break
 
@@ -131,71 +198,54 @@ def process_text_to_events(text, user, source_type="manual", auto_sync=True):
 
     logger.info(f"Successfully saved {len(created_events)} events")
 
-    # Auto-sync to Google Calendar if requested
+    # Sync now if requested; anything that fails stays in the outbox for the worker
     synced_count = 0
-    if auto_sync and created_events:
-        for event in created_events:
-            try:
-                # Skip if already synced (in case of duplicate processing)
-                if event.is_synced and event.google_event_id:
-                    logger.info(f"Event '{event.event_name}' already synced, skipping")
-                    synced_count += 1
-                    continue
-
-                # Prepare event data for Google Calendar
-                event_data = {
-                    'event_name': event.event_name,
-                    'event_description': event.event_description,
-                    'location': event.location
-                }
-
-                # Use datetime fields if available, otherwise fall back to separate date/time
-                if event.start_datetime and event.end_datetime:
-                    event_data['start_datetime'] = event.start_datetime
-                    event_data['end_datetime'] = event.end_datetime
-                else:
-                    # Fallback to separate date/time fields
-                    if event.start_date:
-                        event_data['start_date'] = event.start_date.strftime('%Y-%m-%d')
-                    if event.start_time:
-                        event_data['start_time'] = event.start_time.strftime('%H:%M')
-                    if event.end_date:
-                        event_data['end_date'] = event.end_date.strftime('%Y-%m-%d')
-                    if event.end_time:
-                        event_data['end_time'] = event.end_time.strftime('%H:%M')
-
-                # Create event in Google Calendar (includes duplicate prevention)
-                google_event_id = create_calendar_event(user, event_data)
-                if google_event_id:
-                    event.google_event_id = google_event_id
-                    event.is_synced = True
-                    synced_count += 1
-                    logger.info(f"Auto-synced event '{event.event_name}' to Google Calendar")
-
-            except Exception as sync_error:
-                error_msg = str(sync_error)
-                logger.warning(f"Failed to auto-sync event '{event.event_name}': {error_msg}")
-
-                # If it's an authentication error, stop trying other events
-                if "sign in" in error_msg.lower() or "authentication" in error_msg.lower():
-                    break
-                continue
-
-        # Commit sync status updates
+    if outbox_entries and not defer_sync:
         try:
-            db.session.commit()
-        except Exception as commit_error:
-            logger.error(f"Failed to update sync status: {str(commit_error)}")
+            synced_count = process_claimed_entries(user, outbox_entries)
+            logger.info(f"Auto-synced {synced_count}/{len(outbox_entries)} events to Google Calendar")
+        except Exception as sync_error:
+            logger.warning(f"Failed to auto-sync events: {str(sync_error)}")
             db.session.rollback()
+    sync_queued_count = sum(1 for entry in outbox_entries if entry.status in ('pending', 'processing'))
 
     result_dict = {
         'text_input': text_input,
         'events': created_events,
         'synced_count': synced_count,
+        'sync_queued_count': sync_queued_count,
         'from_email': from_email
     }
 
     if is_offline:
         result_dict['offline_extraction'] = True
+        result_dict['offline_reason'] = openai_status
+
+    if normalization:
+        result_dict['normalization'] = normalization
+
+    if usage and usage.get('chunks'):
+        result_dict['chunks'] = usage['chunks']
 
     return result_dict
+
+
+def import_calendar_parts(calendar_parts, user_timezone):
+    """
+    Parse events out of iCalendar attachments.
+
+    Args:
+        calendar_parts (list): iCalendar documents
+        user_timezone (str): User's timezone
+
+    Returns:
+        list: Event dicts from every part; empty if none could be parsed
+    """
+    events = []
+    for ics_text in calendar_parts:
+        try:
+            events.extend(parse_ics_events(ics_text, user_timezone))
+        except Exception as e:
+            logger.warning(f"Failed to parse calendar attachment: {str(e)}")
+            sentry_sdk.capture_exception(e)
+    return events
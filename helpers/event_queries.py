@@ -0,0 +1,188 @@
+import logging
+import os
+from datetime import datetime, date, time, timedelta, timezone
+
+from app import db
+from models import Event
+from helpers.event_utils import get_timezone, as_utc
+from helpers.event_cursors import encode_event_cursor, decode_event_cursor
+from helpers.recurrence import expand_recurrence
+
+logger = logging.getLogger(__name__)
+
+# Keyset pagination of a user's events, newest first. The cursor (see
+# helpers/event_cursors.py) is the (created_at, id) of the last event on the
+# previous page, so every page is one index range scan on
+# (user_id, created_at, id) however much history the user has.
+EVENTS_PAGE_SIZE = int(os.environ.get("EVENTS_PAGE_SIZE", 20))
+EVENTS_PAGE_MAX_SIZE = 100
+EVENT_COUNT_CAP = 1000  # The dashboard shows "1000+" rather than counting every row
+
+# Date-range queries scan (user_id, starts_at) from EVENT_RANGE_LOOKBACK_DAYS
+# before the window, so events that began earlier but are still running show
+# up without scanning the user's whole history. Longer events are missed;
+# recurring series are the exception: every series still running in the
+# window (by series_ends_at) is loaded however long ago it started.
+EVENT_RANGE_LOOKBACK_DAYS = int(os.environ.get("EVENT_RANGE_LOOKBACK_DAYS", 31))
+EVENT_RANGE_MAX_DAYS = 92
+EVENT_RANGE_MAX_EVENTS = 500
+
+
+def get_events_page(user_id, limit=None, cursor=None):
+    """
+    Get one page of a user's events, newest first.
+
+    Args:
+        user_id (int): Owner of the events
+        limit (int): Page size, capped at EVENTS_PAGE_MAX_SIZE
+        cursor (str): Cursor returned with the previous page, or None for the first
+
+    Returns:
+        tuple: (list of Event, next cursor or None when this is the last page)
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    limit = max(1, min(limit or EVENTS_PAGE_SIZE, EVENTS_PAGE_MAX_SIZE))
+    query = Event.query.filter(Event.user_id == user_id)
+
+    if cursor:
+        created_at, event_id = decode_event_cursor(cursor)
+        # The plain <= bound is what the index range scan uses; the OR only breaks ties
+        query = query.filter(Event.created_at <= created_at,
+                             db.or_(Event.created_at < created_at, Event.id < event_id))
+
+    events = query.order_by(Event.created_at.desc(), Event.id.desc()).limit(limit + 1).all()
+    if len(events) > limit:
+        events = events[:limit]
+        return events, encode_event_cursor(events[-1])
+    return events, None
+
+
+def count_user_events(user_id):
+    """
+    Count a user's events, stopping at EVENT_COUNT_CAP.
+
+    Args:
+        user_id (int): Owner of the events
+
+    Returns:
+        tuple: (count, capped) where capped is True if there are at least EVENT_COUNT_CAP
+    """
+    subquery = db.select(Event.id).where(Event.user_id == user_id).limit(EVENT_COUNT_CAP).subquery()
+    count = db.session.execute(db.select(db.func.count()).select_from(subquery)).scalar()
+    return count, count >= EVENT_COUNT_CAP
+
+
+def parse_range_bound(value, user_timezone="UTC"):
+    """
+    Parse a from/to query parameter.
+
+    Args:
+        value (str): YYYY-MM-DD (local midnight) or ISO 8601 datetime; naive
+            datetimes are read in the user's timezone
+        user_timezone (str): User's timezone
+
+    Returns:
+        datetime: Aware UTC datetime
+
+    Raises:
+        ValueError: If the value is missing or can't be parsed
+    """
+    value = (value or '').strip()
+    if not value:
+        raise ValueError("Both 'from' and 'to' are required")
+    tz = get_timezone(user_timezone)
+    try:
+        if len(value) == 10:
+            parsed = datetime.combine(date.fromisoformat(value), time(0), tzinfo=tz)
+        else:
+            parsed = datetime.fromisoformat(value[:-1] + '+00:00' if value.endswith('Z') else value)
+            if parsed.tzinfo is None:
+                parsed = parsed.replace(tzinfo=tz)
+    except ValueError:
+        raise ValueError(f"Invalid date or datetime: '{value}'")
+    return parsed.astimezone(timezone.utc)
+
+
+def get_events_in_range(user_id, range_start, range_end, user_timezone="UTC", limit=EVENT_RANGE_MAX_EVENTS):
+    """
+    Get the occurrences of a user's events that overlap [range_start, range_end),
+    in start order.
+
+    A recurring series is stored as one row at its first occurrence, so every
+    series that started before range_end and hasn't ended by range_start is
+    loaded and expanded within the window in the user's timezone; one row can
+    yield several occurrences. The limit applies to the expanded occurrences.
+
+    Args:
+        user_id (int): Owner of the events
+        range_start (datetime): Aware window start
+        range_end (datetime): Aware window end (exclusive)
+        user_timezone (str): Timezone recurring series are expanded in
+        limit (int): Maximum number of occurrences
+
+    Returns:
+        list: (Event, starts_at, ends_at) tuples with aware UTC bounds
+
+    Raises:
+        ValueError: If the window is empty or longer than EVENT_RANGE_MAX_DAYS
+    """
+    if range_end <= range_start:
+        raise ValueError("'to' must be after 'from'")
+    if range_end - range_start > timedelta(days=EVENT_RANGE_MAX_DAYS):
+        raise ValueError(f"Date range can span at most {EVENT_RANGE_MAX_DAYS} days")
+
+    lookback = range_start - timedelta(days=EVENT_RANGE_LOOKBACK_DAYS)
+    single_events = (Event.query
+                     .filter(Event.user_id == user_id,
+                             Event.recurrence.is_(None),
+                             Event.starts_at >= lookback,
+                             Event.starts_at < range_end,
+                             Event.ends_at > range_start)
+                     .order_by(Event.starts_at, Event.id)
+                     .limit(limit)
+                     .all())
+    # Not limited: a series that started long ago can still have the window's
+    # earliest occurrences, so the limit is only applied after expansion
+    series = (Event.query
+              .filter(Event.user_id == user_id,
+                      Event.recurrence.isnot(None),
+                      db.or_(Event.series_ends_at.is_(None), Event.series_ends_at > range_start),
+                      Event.starts_at < range_end)
+              .all())
+
+    occurrences = [(event, as_utc(event.starts_at), as_utc(event.ends_at)) for event in single_events]
+    for event in series:
+        for starts_at, ends_at in expand_recurrence(event.recurrence, as_utc(event.starts_at), as_utc(event.ends_at),
+                                                    range_start, range_end, user_timezone):
+            occurrences.append((event, starts_at, ends_at))
+    occurrences.sort(key=lambda occurrence: (occurrence[1], occurrence[0].id))
+    return occurrences[:limit]
+
+
+def group_events_by_day(occurrences, first_day, last_day, user_timezone="UTC"):
+    """
+    Place events on each local day they overlap, for the calendar grid.
+
+    Args:
+        occurrences (list): (event, starts_at, ends_at) from get_events_in_range
+        first_day (date): First day of the grid
+        last_day (date): Last day of the grid (inclusive)
+        user_timezone (str): User's timezone
+
+    Returns:
+        dict: date -> list of (event, local start datetime) in start order
+    """
+    tz = get_timezone(user_timezone)
+    days = {first_day + timedelta(days=offset): [] for offset in range((last_day - first_day).days + 1)}
+    for event, starts_at, ends_at in occurrences:
+        local_start = starts_at.astimezone(tz)
+        # ends_at is exclusive; a zero-length event still shows on its start day
+        local_end = max(ends_at - timedelta(microseconds=1), starts_at).astimezone(tz)
+        day = max(local_start.date(), first_day)
+        while day <= min(local_end.date(), last_day):
+            days[day].append((event, local_start))
+            day += timedelta(days=1)
+    return days
+
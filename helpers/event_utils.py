@@ -1,6 +1,11 @@
 
-from datetime import datetime
+from datetime import datetime, date, time, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 from helpers.text_processing import sanitize_text_for_db
+from helpers.recurrence import series_end
+
+# Assumed length of a timed event with no end, matching the Google Calendar default
+DEFAULT_EVENT_DURATION = timedelta(hours=1)
 
 def prepare_event_data_for_calendar(event):
     """
@@ -18,20 +23,22 @@ def prepare_event_data_for_calendar(event):
         'location': event.location
     }
 
-    # Use datetime fields if available, otherwise fall back to separate date/time
+    # Prefer datetime fields when available; separate date/time fields are
+    # always included for callers that build the body from them
     if event.start_datetime and event.end_datetime:
         event_data['start_datetime'] = event.start_datetime
         event_data['end_datetime'] = event.end_datetime
-    else:
-        # Fallback to separate date/time fields
-        if event.start_date:
-            event_data['start_date'] = event.start_date.strftime('%Y-%m-%d')
-        if event.start_time:
-            event_data['start_time'] = event.start_time.strftime('%H:%M')
-        if event.end_date:
-            event_data['end_date'] = event.end_date.strftime('%Y-%m-%d')
-        if event.end_time:
-            event_data['end_time'] = event.end_time.strftime('%H:%M')
+
+    if event.start_date:
+        event_data['start_date'] = event.start_date.strftime('%Y-%m-%d')
+    if event.start_time:
+        event_data['start_time'] = event.start_time.strftime('%H:%M')
+    if event.end_date:
+        event_data['end_date'] = event.end_date.strftime('%Y-%m-%d')
+    if event.end_time:
+        event_data['end_time'] = event.end_time.strftime('%H:%M')
+    if event.recurrence:
+        event_data['recurrence'] = event.recurrence
 
     return event_data
 
@@ -75,6 +82,11 @@ def update_event_from_form(event, form_data):
     else:
         event.end_time = None
 
+    # The edited date/time fields supersede the extracted RFC3339 values
+    event.start_datetime = None
+    event.end_datetime = None
+    set_event_bounds(event, event.user.timezone)
+
     event.updated_at = datetime.utcnow()
 
 def format_event_for_api(event):
@@ -97,7 +109,129 @@ def format_event_for_api(event):
         'end_time': event.end_time.strftime('%H:%M') if event.end_time else None,
         'start_datetime': event.start_datetime,
         'end_datetime': event.end_datetime,
+        'starts_at': as_utc(event.starts_at).isoformat() if event.starts_at else None,
+        'ends_at': as_utc(event.ends_at).isoformat() if event.ends_at else None,
         'location': event.location,
+        'recurrence': event.recurrence,
         'is_synced': event.is_synced,
         'google_event_id': event.google_event_id
     }
+
+
+def get_timezone(timezone_name):
+    """
+    Resolve an IANA timezone name, falling back to UTC.
+
+    Args:
+        timezone_name (str): e.g. 'America/Los_Angeles'
+
+    Returns:
+        ZoneInfo: The timezone
+    """
+    try:
+        return ZoneInfo(timezone_name or "UTC")
+    except (ZoneInfoNotFoundError, ValueError):
+        return ZoneInfo("UTC")
+
+
+def as_utc(value):
+    """
+    Attach UTC to naive datetimes read back from databases without timezone
+    support (SQLite); aware values are converted to UTC.
+
+    Args:
+        value (datetime): Stored timestamp
+
+    Returns:
+        datetime: Aware UTC datetime
+    """
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def _as_date(value):
+    if value is None or isinstance(value, date):
+        return value
+    return datetime.strptime(str(value)[:10], '%Y-%m-%d').date()
+
+
+def _as_time(value):
+    if value is None or isinstance(value, time):
+        return value
+    return datetime.strptime(str(value)[:5], '%H:%M').time()
+
+
+def _parse_rfc3339(value):
+    if not value:
+        return None
+    value = str(value).strip()
+    try:
+        parsed = datetime.fromisoformat(value[:-1] + '+00:00' if value.endswith('Z') else value)
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo is not None else None
+
+
+def compute_event_bounds(start_date, start_time=None, start_datetime=None, end_date=None, end_time=None,
+                         end_datetime=None, user_timezone="UTC"):
+    """
+    Compute the UTC instants an event occupies from its stored date/time fields.
+
+    RFC3339 datetimes win when present; otherwise dates and times are read in
+    the user's timezone. Untimed events cover their whole local days, and
+    timed events without an end last DEFAULT_EVENT_DURATION.
+
+    Args:
+        start_date (date or str): Start date
+        start_time (time or str): Start time, if any
+        start_datetime (str): RFC3339 start, if any
+        end_date (date or str): End date, if any
+        end_time (time or str): End time, if any
+        end_datetime (str): RFC3339 end, if any
+        user_timezone (str): Timezone the separate fields are in
+
+    Returns:
+        tuple: (starts_at, ends_at) as aware UTC datetimes, or (None, None)
+            without a start date; ends_at is exclusive
+    """
+    tz = get_timezone(user_timezone)
+    start_date, end_date = _as_date(start_date), _as_date(end_date)
+    start_time, end_time = _as_time(start_time), _as_time(end_time)
+
+    starts_at = _parse_rfc3339(start_datetime)
+    if starts_at is None:
+        if start_date is None:
+            return None, None
+        starts_at = datetime.combine(start_date, start_time or time(0), tzinfo=tz)
+    timed = start_time is not None or start_datetime is not None
+
+    ends_at = _parse_rfc3339(end_datetime)
+    if ends_at is None:
+        last_day = end_date or start_date or starts_at.astimezone(tz).date()
+        if end_time is not None:
+            ends_at = datetime.combine(last_day, end_time, tzinfo=tz)
+        elif timed and (not end_date or end_date == start_date):
+            ends_at = starts_at + DEFAULT_EVENT_DURATION
+        else:
+            ends_at = datetime.combine(last_day + timedelta(days=1), time(0), tzinfo=tz)
+
+    if ends_at < starts_at:
+        ends_at = starts_at
+    return starts_at.astimezone(timezone.utc), ends_at.astimezone(timezone.utc)
+
+
+def set_event_bounds(event, user_timezone):
+    """
+    Refresh an event's starts_at/ends_at (and series_ends_at for recurring
+    events) from its date/time fields.
+
+    Args:
+        event (Event): Event to update
+        user_timezone (str): Owner's timezone
+    """
+    event.starts_at, event.ends_at = compute_event_bounds(
+        event.start_date, event.start_time, event.start_datetime,
+        event.end_date, event.end_time, event.end_datetime, user_timezone)
+    event.series_ends_at = series_end(event.recurrence, event.starts_at, event.ends_at, user_timezone)
+
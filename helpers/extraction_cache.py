@@ -0,0 +1,222 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from models import ExtractionCache
+
+logger = logging.getLogger(__name__)
+
+# Two-tier cache for extraction results: a per-process LRU in front of a
+# database table shared by every gunicorn worker.
+EXTRACTION_CACHE_TTL_SECONDS = int(os.environ.get("EXTRACTION_CACHE_TTL_SECONDS", 86400))
+EXTRACTION_CACHE_MAX_ENTRIES = int(os.environ.get("EXTRACTION_CACHE_MAX_ENTRIES", 256))
+EXTRACTION_CACHE_PURGE_INTERVAL = 100  # Purge expired DB rows every N stores
+
+_memory_cache = OrderedDict()  # cache_key -> (expires_at, result_json)
+_lock = threading.Lock()
+_stats = {
+    'memory_hits': 0,
+    'db_hits': 0,
+    'misses': 0,
+    'stores': 0,
+    'evictions': 0,
+    'errors': 0,
+}
+
+
+def _increment(counter):
+    with _lock:
+        _stats[counter] += 1
+
+
+def normalize_text_for_cache(text):
+    """
+    Normalize text so trivially different copies of the same input share a key.
+
+    Args:
+        text (str): Raw input text
+
+    Returns:
+        str: Text with whitespace runs collapsed and line endings unified
+    """
+    if not text:
+        return ""
+    text = text.replace('\r\n', '\n').replace('\r', '\n')
+    text = re.sub(r'[ \t]+', ' ', text)
+    text = re.sub(r'\n\s*\n+', '\n\n', text)
+    return text.strip()
+
+
+def make_cache_key(text, user_timezone, current_date):
+    """
+    Build the content-addressed cache key for an extraction request.
+
+    Args:
+        text (str): Input text
+        user_timezone (str): Timezone used for time conversion
+        current_date (str): Date used for resolving relative dates
+
+    Returns:
+        str: SHA-256 hex digest
+    """
+    material = json.dumps([normalize_text_for_cache(text), user_timezone or "UTC", current_date])
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+def _remember_in_memory(cache_key, expires_at, result_json):
+    with _lock:
+        _memory_cache[cache_key] = (expires_at, result_json)
+        _memory_cache.move_to_end(cache_key)
+        while len(_memory_cache) > EXTRACTION_CACHE_MAX_ENTRIES:
+            _memory_cache.popitem(last=False)
+            _stats['evictions'] += 1
+
+
+def get_cached_extraction(cache_key):
+    """
+    Look up a cached extraction result, checking memory first and then the database.
+
+    Args:
+        cache_key (str): Key from make_cache_key
+
+    Returns:
+        dict: {'events': [...], 'from_email': str} or None on a miss
+    """
+    now = datetime.utcnow()
+
+    with _lock:
+        entry = _memory_cache.get(cache_key)
+        if entry:
+            expires_at, result_json = entry
+            if expires_at > now:
+                _memory_cache.move_to_end(cache_key)
+                _stats['memory_hits'] += 1
+                # Decode on every hit so callers never share mutable state
+                return json.loads(result_json)
+            del _memory_cache[cache_key]
+
+    try:
+        table = ExtractionCache.__table__
+        # Use a dedicated connection so cache I/O never commits or rolls back
+        # the caller's ORM session
+        with db.engine.begin() as conn:
+            row = conn.execute(
+                db.select(table.c.result_json, table.c.expires_at)
+                .where(table.c.cache_key == cache_key)
+                .where(table.c.expires_at > now)
+            ).first()
+            if row:
+                conn.execute(
+                    db.update(table)
+                    .where(table.c.cache_key == cache_key)
+                    .values(hit_count=table.c.hit_count + 1)
+                )
+    except Exception as e:
+        logger.warning(f"Extraction cache lookup failed: {str(e)}")
+        _increment('errors')
+        row = None
+
+    if row:
+        _remember_in_memory(cache_key, row.expires_at, row.result_json)
+        _increment('db_hits')
+        return json.loads(row.result_json)
+
+    _increment('misses')
+    return None
+
+
+def store_extraction(cache_key, events, from_email):
+    """
+    Store a successful extraction result in both cache tiers.
+
+    Args:
+        cache_key (str): Key from make_cache_key
+        events (list): Extracted events as returned by the extractor
+        from_email (str): Sender email detected in the text, if any
+    """
+    now = datetime.utcnow()
+    expires_at = now + timedelta(seconds=EXTRACTION_CACHE_TTL_SECONDS)
+    result_json = json.dumps({'events': events, 'from_email': from_email})
+
+    _remember_in_memory(cache_key, expires_at, result_json)
+
+    try:
+        table = ExtractionCache.__table__
+        with db.engine.begin() as conn:
+            updated = conn.execute(
+                db.update(table)
+                .where(table.c.cache_key == cache_key)
+                .values(result_json=result_json, created_at=now, expires_at=expires_at)
+            ).rowcount
+            if not updated:
+                conn.execute(
+                    db.insert(table).values(
+                        cache_key=cache_key,
+                        result_json=result_json,
+                        hit_count=0,
+                        created_at=now,
+                        expires_at=expires_at,
+                    )
+                )
+    except IntegrityError:
+        # Another worker stored the same key concurrently; its row is as good as ours
+        logger.info(f"Extraction cache key {cache_key[:12]} already stored by another worker")
+    except Exception as e:
+        logger.warning(f"Extraction cache store failed: {str(e)}")
+        _increment('errors')
+        return
+
+    with _lock:
+        _stats['stores'] += 1
+        should_purge = _stats['stores'] % EXTRACTION_CACHE_PURGE_INTERVAL == 0
+
+    if should_purge:
+        purge_expired_extractions()
+
+
+def purge_expired_extractions():
+    """
+    Delete expired rows from the database cache tier.
+
+    Returns:
+        int: Number of rows deleted
+    """
+    try:
+        table = ExtractionCache.__table__
+        with db.engine.begin() as conn:
+            deleted = conn.execute(
+                db.delete(table).where(table.c.expires_at <= datetime.utcnow())
+            ).rowcount
+        if deleted:
+            logger.info(f"Purged {deleted} expired extraction cache rows")
+        return deleted
+    except Exception as e:
+        logger.warning(f"Extraction cache purge failed: {str(e)}")
+        _increment('errors')
+        return 0
+
+
+def get_extraction_cache_stats():
+    """
+    Get hit/miss counters for this process's view of the cache.
+
+    Returns:
+        dict: Counters plus current memory tier size and hit rate
+    """
+    with _lock:
+        stats = dict(_stats)
+        stats['memory_entries'] = len(_memory_cache)
+
+    lookups = stats['memory_hits'] + stats['db_hits'] + stats['misses']
+    stats['hit_rate'] = round((stats['memory_hits'] + stats['db_hits']) / lookups, 4) if lookups else 0.0
+    stats['max_entries'] = EXTRACTION_CACHE_MAX_ENTRIES
+    stats['ttl_seconds'] = EXTRACTION_CACHE_TTL_SECONDS
+    return stats
@@ -0,0 +1,283 @@
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import sentry_sdk
+
+from app import app, db
+from models import User, ExtractionJob
+from helpers.event_processing import process_text_to_events
+from helpers.event_utils import format_event_for_api
+
+logger = logging.getLogger(__name__)
+
+# Bounded executor for asynchronous /api/extract_events submissions so the
+# LLM and calendar-sync latency runs outside the gunicorn request cycle
+EXTRACTION_JOB_WORKERS = int(os.environ.get("EXTRACTION_JOB_WORKERS", 4))
+EXTRACTION_JOB_MAX_PENDING = int(os.environ.get("EXTRACTION_JOB_MAX_PENDING", 32))
+EXTRACTION_JOB_MAX_TEXTS = int(os.environ.get("EXTRACTION_JOB_MAX_TEXTS", 20))
+
+# Jobs only live in the executor of the process that accepted them, so a
+# worker recycled by --max-requests or scaled away leaves them 'queued' or
+# 'running'. Every web worker sweeps for jobs that have been in either state
+# longer than EXTRACTION_JOB_STALE_SECONDS and runs them again, resuming
+# after the texts that already have results; jobs older than
+# EXTRACTION_JOB_MAX_AGE_SECONDS are failed instead.
+EXTRACTION_JOB_STALE_SECONDS = int(os.environ.get("EXTRACTION_JOB_STALE_SECONDS", 1800))
+EXTRACTION_JOB_MAX_AGE_SECONDS = int(os.environ.get("EXTRACTION_JOB_MAX_AGE_SECONDS", 6 * 3600))
+EXTRACTION_JOB_SWEEP_SECONDS = int(os.environ.get("EXTRACTION_JOB_SWEEP_SECONDS", 300))
+
+_executor = ThreadPoolExecutor(max_workers=EXTRACTION_JOB_WORKERS, thread_name_prefix="extraction-job")
+_pending_slots = threading.BoundedSemaphore(EXTRACTION_JOB_MAX_PENDING)
+_sweeper_started = threading.Event()
+
+
+def submit_extraction_job(user, texts, source_type="api", auto_sync=True, use_cache=True):
+    """
+    Persist an extraction job and schedule it on the background executor.
+
+    Args:
+        user (User): User submitting the job
+        texts (list): Non-empty texts to extract events from
+        source_type (str): Source of the texts
+        auto_sync (bool): Whether to auto-sync to Google Calendar
+        use_cache (bool): Whether a cached extraction of identical text may be reused
+
+    Returns:
+        ExtractionJob: The queued job, or None if the executor is at capacity
+    """
+    if not _pending_slots.acquire(blocking=False):
+        logger.warning(f"Extraction job queue full, rejecting submission from user {user.id}")
+        return None
+
+    try:
+        job = ExtractionJob()
+        job.user_id = user.id
+        job.texts_json = json.dumps(texts)
+        job.source_type = source_type
+        job.auto_sync = auto_sync
+        job.use_cache = use_cache
+        job.status = 'queued'
+        db.session.add(job)
+        db.session.commit()
+
+        _schedule_job(job.id)
+    except Exception:
+        _pending_slots.release()
+        raise
+
+    logger.info(f"Queued extraction job {job.id} with {len(texts)} text(s) for user {user.id}")
+    return job
+
+
+def _schedule_job(job_id):
+    """Run a job on the executor; the caller holds a _pending_slots slot"""
+    future = _executor.submit(_run_extraction_job, job_id)
+    future.add_done_callback(lambda _: _pending_slots.release())
+
+
+def recover_stale_jobs():
+    """
+    Reschedule jobs orphaned by a worker that stopped before finishing them.
+
+    Each job is taken over with a conditional UPDATE, so when several
+    workers sweep at once only one of them runs it.
+
+    Returns:
+        int: Number of jobs rescheduled on this worker
+    """
+    now = datetime.utcnow()
+    stale_before = now - timedelta(seconds=EXTRACTION_JOB_STALE_SECONDS)
+    stale = db.or_(
+        db.and_(ExtractionJob.status == 'queued', ExtractionJob.created_at < stale_before),
+        db.and_(ExtractionJob.status == 'running', ExtractionJob.started_at < stale_before)
+    )
+
+    expired = (ExtractionJob.query
+               .filter(stale)
+               .filter(ExtractionJob.created_at < now - timedelta(seconds=EXTRACTION_JOB_MAX_AGE_SECONDS))
+               .all())
+    for job in expired:
+        job.status = 'failed'
+        job.error_message = "Job was interrupted. Please submit it again."
+        job.completed_at = now
+    db.session.commit()
+    if expired:
+        logger.warning(f"Failed {len(expired)} interrupted extraction job(s) that were too old to resume")
+
+    job_ids = db.session.execute(db.select(ExtractionJob.id).where(stale).order_by(ExtractionJob.id)).scalars().all()
+    recovered = 0
+    for job_id in job_ids:
+        if not _pending_slots.acquire(blocking=False):
+            break  # The next sweep picks up the rest
+        claimed = db.session.execute(db.update(ExtractionJob)
+                                     .where(ExtractionJob.id == job_id)
+                                     .where(stale)
+                                     .values(status='running', started_at=now)).rowcount
+        db.session.commit()
+        if not claimed:
+            _pending_slots.release()  # Another worker took it
+            continue
+        _schedule_job(job_id)
+        recovered += 1
+
+    if recovered:
+        logger.warning(f"Rescheduled {recovered} interrupted extraction job(s)")
+    return recovered
+
+
+def _sweep_stale_jobs():
+    with app.app_context():
+        while True:
+            try:
+                recover_stale_jobs()
+            except Exception as e:
+                logger.error(f"Extraction job sweep failed: {str(e)}")
+                sentry_sdk.capture_exception(e)
+                db.session.rollback()
+            time.sleep(EXTRACTION_JOB_SWEEP_SECONDS)
+
+
+def start_stale_job_sweeper():
+    """Start this process's background sweep for orphaned jobs (once)"""
+    if _sweeper_started.is_set():
+        return
+    _sweeper_started.set()
+    threading.Thread(target=_sweep_stale_jobs, name="extraction-job-sweeper", daemon=True).start()
+
+
+def _record_saved_text(job_id, results, index, auto_sync):
+    """
+    Build a before_commit callback that marks a text as done in the same
+    transaction as its events, so a resumed job never extracts it twice.
+
+    Args:
+        job_id (int): Job being processed
+        results (list): Results of the texts before this one
+        index (int): Position of the text in the job
+        auto_sync (bool): Whether the events were queued for calendar sync
+
+    Returns:
+        callable: Callback taking (text_input, events)
+    """
+    def record(text_input, events):
+        job = db.session.get(ExtractionJob, job_id)
+        job.result_json = json.dumps(results + [{
+            'index': index,
+            'status': 'completed',
+            'text_input_id': text_input.id,
+            'events_count': len(events),
+            'synced_count': 0,
+            'sync_queued_count': len(events) if auto_sync else 0,
+            'events': [format_event_for_api(event) for event in events]
+        }])
+    return record
+
+
+def _run_extraction_job(job_id):
+    """Process every text in a job, persisting per-text results as they finish"""
+    with app.app_context():
+        try:
+            job = db.session.get(ExtractionJob, job_id)
+            user = db.session.get(User, job.user_id)
+            texts = json.loads(job.texts_json)
+
+            job.status = 'running'
+            job.started_at = datetime.utcnow()
+            db.session.commit()
+            job_started = time.monotonic()
+
+            # A rescheduled job keeps the results of texts finished before the
+            # interruption, including one whose events were saved just before it
+            results = json.loads(job.result_json) if job.result_json else []
+            for index, text in enumerate(texts):
+                if index < len(results):
+                    continue
+                item_started = time.monotonic()
+                try:
+                    # Already off the request path, so sync inline for an accurate synced_count
+                    result = process_text_to_events(text, user, source_type=job.source_type,
+                                                    auto_sync=job.auto_sync, use_cache=job.use_cache,
+                                                    defer_sync=False,
+                                                    before_commit=_record_saved_text(job_id, results, index,
+                                                                                     job.auto_sync))
+                    item = {
+                        'index': index,
+                        'status': 'completed',
+                        'text_input_id': result['text_input'].id,
+                        'events_count': len(result['events']),
+                        'synced_count': result['synced_count'],
+                        'sync_queued_count': result['sync_queued_count'],
+                        'from_email': result['from_email'],
+                        'events': [format_event_for_api(event) for event in result['events']]
+                    }
+                    if result.get('offline_extraction'):
+                        item['offline_extraction'] = True
+                        item['offline_reason'] = result['offline_reason']
+                    if result.get('chunks'):
+                        item['chunks'] = result['chunks']
+                except Exception as e:
+                    logger.error(f"Extraction job {job_id} failed on text {index}: {str(e)}")
+                    sentry_sdk.capture_exception(e)
+                    db.session.rollback()
+                    item = {'index': index, 'status': 'failed', 'error': str(e)}
+
+                item['duration_ms'] = int((time.monotonic() - item_started) * 1000)
+                results.append(item)
+
+                # Persist progress so pollers see partial results
+                job = db.session.get(ExtractionJob, job_id)
+                job.result_json = json.dumps(results)
+                db.session.commit()
+
+            failed_count = sum(1 for item in results if item['status'] == 'failed')
+            if failed_count == 0:
+                job.status = 'completed'
+            elif failed_count == len(results):
+                job.status = 'failed'
+                job.error_message = "Failed to process text. Please try again."
+            else:
+                job.status = 'partial'
+            job.completed_at = datetime.utcnow()
+            job.duration_ms = int((time.monotonic() - job_started) * 1000)
+            db.session.commit()
+
+            logger.info(f"Extraction job {job_id} finished with status {job.status} in {job.duration_ms}ms")
+
+        except Exception as e:
+            logger.error(f"Extraction job {job_id} crashed: {str(e)}")
+            sentry_sdk.capture_exception(e)
+            db.session.rollback()
+            job = db.session.get(ExtractionJob, job_id)
+            if job:
+                job.status = 'failed'
+                job.error_message = str(e)
+                job.completed_at = datetime.utcnow()
+                db.session.commit()
+
+
+def format_job_for_api(job):
+    """
+    Format extraction job for API response.
+
+    Args:
+        job (ExtractionJob): Job from database
+
+    Returns:
+        dict: Job status, timing and per-text results
+    """
+    return {
+        'job_id': job.id,
+        'status': job.status,
+        'texts_count': len(json.loads(job.texts_json)),
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'completed_at': job.completed_at.isoformat() if job.completed_at else None,
+        'duration_ms': job.duration_ms,
+        'error': job.error_message,
+        'results': json.loads(job.result_json) if job.result_json else []
+    }
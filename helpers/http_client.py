@@ -0,0 +1,190 @@
+import logging
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+# Shared outbound HTTP client for Google, OAuth and Mailgun calls. A single
+# pooled session keeps TLS connections warm per host, so back-to-back
+# calendar operations don't pay a fresh handshake each time.
+HTTP_CONNECT_TIMEOUT = float(os.environ.get("HTTP_CONNECT_TIMEOUT", 5))
+HTTP_READ_TIMEOUT = float(os.environ.get("HTTP_READ_TIMEOUT", 30))
+HTTP_POOL_CONNECTIONS = int(os.environ.get("HTTP_POOL_CONNECTIONS", 10))  # Number of hosts to keep pools for
+HTTP_POOL_MAXSIZE = int(os.environ.get("HTTP_POOL_MAXSIZE", 20))  # Connections kept per host
+HTTP_MAX_RETRIES = int(os.environ.get("HTTP_MAX_RETRIES", 2))
+HTTP_BACKOFF_FACTOR = 0.5
+
+# Worst case for one call, every retry and backoff included. Timeouts are
+# per attempt, so they are shrunk to fit: with (5, 30) and two retries a
+# GET could otherwise block for ~100s, well past gunicorn's 60s --timeout.
+HTTP_CALL_BUDGET_SECONDS = float(os.environ.get("HTTP_CALL_BUDGET_SECONDS", 40))
+
+DEFAULT_TIMEOUT = (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+RETRIED_METHODS = frozenset(['GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS'])
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_host_stats = {}
+
+
+def _build_session():
+    # Only idempotent verbs are retried; POSTs (event inserts, token exchanges,
+    # Mailgun sends) could otherwise be applied twice. Retry-After isn't
+    # honored here because a long one would blow HTTP_CALL_BUDGET_SECONDS;
+    # callers that care (the calendar batch sync) read it themselves.
+    retry = Retry(
+        total=HTTP_MAX_RETRIES,
+        connect=HTTP_MAX_RETRIES,
+        read=HTTP_MAX_RETRIES,
+        status=HTTP_MAX_RETRIES,
+        backoff_factor=HTTP_BACKOFF_FACTOR,
+        status_forcelist=(500, 502, 503, 504),
+        allowed_methods=RETRIED_METHODS,
+        respect_retry_after_header=False,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=HTTP_POOL_CONNECTIONS,
+        pool_maxsize=HTTP_POOL_MAXSIZE,
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_session():
+    """
+    Get the process-wide pooled session, rebuilding it after a fork so
+    gunicorn workers never share sockets with their parent.
+
+    Returns:
+        requests.Session: Shared session
+    """
+    global _session, _session_pid
+    pid = os.getpid()
+    if _session is None or _session_pid != pid:
+        with _session_lock:
+            if _session is None or _session_pid != pid:
+                _session = _build_session()
+                _session_pid = pid
+    return _session
+
+
+def _record(host, elapsed_ms, status_code=None, error=None):
+    with _stats_lock:
+        stats = _host_stats.setdefault(host, {
+            'requests': 0,
+            'errors': 0,
+            'server_errors': 0,
+            'total_ms': 0.0,
+            'max_ms': 0.0,
+            'last_error': None,
+        })
+        stats['requests'] += 1
+        stats['total_ms'] += elapsed_ms
+        stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+        if error is not None:
+            stats['errors'] += 1
+            stats['last_error'] = error
+        elif status_code is not None and status_code >= 500:
+            stats['server_errors'] += 1
+
+
+def _attempt_timeout(method, timeout):
+    """
+    Shrink a (connect, read) timeout so every attempt of one call, plus the
+    backoff between them, fits in HTTP_CALL_BUDGET_SECONDS.
+
+    Connection failures are retried for every verb; read failures and 5xx
+    answers only for RETRIED_METHODS.
+
+    Args:
+        method (str): HTTP verb
+        timeout: Seconds or (connect, read) tuple
+
+    Returns:
+        tuple: (connect, read) timeout for each attempt
+    """
+    connect, read = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+    attempts = HTTP_MAX_RETRIES + 1
+    read_attempts = attempts if method.upper() in RETRIED_METHODS else 1
+    # urllib3 2.x doesn't sleep before the first retry, then doubles from the factor
+    backoff = sum(HTTP_BACKOFF_FACTOR * 2 ** (retry - 1) for retry in range(2, attempts))
+
+    connect = min(connect, HTTP_CALL_BUDGET_SECONDS / (2 * attempts))
+    read = min(read, (HTTP_CALL_BUDGET_SECONDS - backoff - attempts * connect) / read_attempts)
+    return connect, max(read, 1.0)
+
+
+def request(method, url, timeout=None, **kwargs):
+    """
+    Send an HTTP request through the shared session.
+
+    Args:
+        method (str): HTTP verb
+        url (str): Absolute URL
+        timeout: Seconds or (connect, read) tuple; defaults to DEFAULT_TIMEOUT and is
+            shrunk to keep the whole call within HTTP_CALL_BUDGET_SECONDS
+        **kwargs: Passed through to requests.Session.request
+
+    Returns:
+        requests.Response: The response
+
+    Raises:
+        requests.exceptions.RequestException: On network errors and timeouts
+    """
+    host = urlsplit(url).netloc
+    started = time.monotonic()
+    try:
+        response = get_session().request(method, url, timeout=_attempt_timeout(method, timeout or DEFAULT_TIMEOUT),
+                                         **kwargs)
+    except requests.exceptions.RequestException as e:
+        _record(host, (time.monotonic() - started) * 1000, error=type(e).__name__)
+        logger.warning(f"{method} {host} failed after {(time.monotonic() - started) * 1000:.0f}ms: {str(e)}")
+        raise
+
+    _record(host, (time.monotonic() - started) * 1000, status_code=response.status_code)
+    return response
+
+
+def get(url, **kwargs):
+    return request('GET', url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request('POST', url, **kwargs)
+
+
+def put(url, **kwargs):
+    return request('PUT', url, **kwargs)
+
+
+def delete(url, **kwargs):
+    return request('DELETE', url, **kwargs)
+
+
+def get_http_client_stats():
+    """
+    Get per-host latency and error counters for this process.
+
+    Returns:
+        dict: host -> counters including average latency in milliseconds
+    """
+    with _stats_lock:
+        snapshot = {host: dict(stats) for host, stats in _host_stats.items()}
+
+    for stats in snapshot.values():
+        stats['avg_ms'] = round(stats['total_ms'] / stats['requests'], 1) if stats['requests'] else 0.0
+        stats['total_ms'] = round(stats['total_ms'], 1)
+        stats['max_ms'] = round(stats['max_ms'], 1)
+    return snapshot
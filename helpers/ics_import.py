@@ -0,0 +1,357 @@
+import logging
+import re
+from datetime import datetime, date, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from helpers.recurrence import build_recurrence
+
+logger = logging.getLogger(__name__)
+
+# Calendar attachments larger than this are ignored rather than parsed
+ICS_MAX_BYTES = 512 * 1024
+
+ICS_CONTENT_TYPES = ('text/calendar', 'application/ics', 'text/x-vcalendar')
+
+WEEKDAYS = {'MO': 0, 'TU': 1, 'WE': 2, 'TH': 3, 'FR': 4, 'SA': 5, 'SU': 6}
+DURATION_PATTERN = re.compile(r'^([+-])?P(?:(\d+)W)?(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?$')
+
+
+def is_calendar_attachment(filename, content_type):
+    """
+    Check whether an email attachment is an iCalendar part.
+
+    Args:
+        filename (str): Attachment filename
+        content_type (str): Attachment MIME type
+
+    Returns:
+        bool: True for .ics files and text/calendar parts
+    """
+    content_type = (content_type or '').split(';', 1)[0].strip().lower()
+    return content_type in ICS_CONTENT_TYPES or (filename or '').lower().endswith(('.ics', '.ical', '.ifb'))
+
+
+def _unfold_lines(ics_text):
+    # RFC 5545 3.1: a line starting with a space or tab continues the previous one
+    return re.sub(r'\r?\n[ \t]', '', ics_text).splitlines()
+
+
+def _parse_content_line(line):
+    """Split 'NAME;PARAM=VALUE:content' into (name, params, value)"""
+    in_quotes = False
+    for index, char in enumerate(line):
+        if char == '"':
+            in_quotes = not in_quotes
+        elif char == ':' and not in_quotes:
+            head, value = line[:index], line[index + 1:]
+            break
+    else:
+        return None, {}, None
+
+    parts = head.split(';')
+    params = {}
+    for param in parts[1:]:
+        if '=' in param:
+            key, param_value = param.split('=', 1)
+            params[key.upper()] = param_value.strip('"')
+    return parts[0].upper(), params, value
+
+
+def _unescape_text(value):
+    return (value.replace('\\n', '\n').replace('\\N', '\n')
+            .replace('\\,', ',').replace('\\;', ';').replace('\\\\', '\\'))
+
+
+def _parse_components(ics_text):
+    """
+    Parse iCalendar text into nested components.
+
+    Returns:
+        list: Top-level components as dicts with 'name', 'props' (name -> list of
+            (params, value)) and 'children'
+    """
+    root = {'name': 'ROOT', 'props': {}, 'children': []}
+    stack = [root]
+    for line in _unfold_lines(ics_text):
+        name, params, value = _parse_content_line(line)
+        if name is None:
+            continue
+        if name == 'BEGIN':
+            component = {'name': value.strip().upper(), 'props': {}, 'children': []}
+            stack[-1]['children'].append(component)
+            stack.append(component)
+        elif name == 'END':
+            if len(stack) > 1:
+                stack.pop()
+        else:
+            stack[-1]['props'].setdefault(name, []).append((params, value))
+    return root['children']
+
+
+def _first(component, name):
+    values = component['props'].get(name)
+    return values[0] if values else (None, None)
+
+
+def _parse_rrule(value):
+    return dict(part.split('=', 1) for part in value.upper().split(';') if '=' in part)
+
+
+def _local_dates(values, vtimezones, user_tz):
+    """Dates, in the user's timezone, of (params, value) pairs whose values may be comma-separated lists"""
+    dates = []
+    for params, value in values:
+        for part in (value or '').split(','):
+            if not part.strip():
+                continue
+            try:
+                parsed, _ = _parse_ics_datetime(params, part, vtimezones, user_tz)
+            except ValueError:
+                logger.warning(f"Skipping unparseable date value '{part}'")
+                continue
+            dates.append(parsed if not isinstance(parsed, datetime) else parsed.date())
+    return dates
+
+
+def _nth_weekday(year, month, weekday_spec):
+    """Resolve a BYDAY value like '2SU' or '-1SU' within a month"""
+    match = re.match(r'^([+-]?\d+)?([A-Z]{2})$', weekday_spec)
+    if not match:
+        return None
+    ordinal = int(match.group(1) or 1)
+    weekday = WEEKDAYS[match.group(2)]
+
+    if ordinal > 0:
+        first = date(year, month, 1)
+        day = first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (ordinal - 1))
+    else:
+        next_month = date(year + month // 12, month % 12 + 1, 1)
+        last = next_month - timedelta(days=1)
+        day = last - timedelta(days=(last.weekday() - weekday) % 7 + 7 * (-ordinal - 1))
+    return day if day.month == month else None
+
+
+def _parse_offset(value):
+    match = re.match(r'^([+-])(\d{2})(\d{2})(\d{2})?$', (value or '').strip())
+    if not match:
+        return None
+    sign = -1 if match.group(1) == '-' else 1
+    return timezone(sign * timedelta(hours=int(match.group(2)), minutes=int(match.group(3)),
+                                     seconds=int(match.group(4) or 0)))
+
+
+class _VTimezone:
+    """Offset lookup for a VTIMEZONE whose TZID isn't an IANA name"""
+
+    def __init__(self, component):
+        self.transitions = []
+        for child in component['children']:
+            if child['name'] not in ('STANDARD', 'DAYLIGHT'):
+                continue
+            offset = _parse_offset(_first(child, 'TZOFFSETTO')[1])
+            onset_value = _first(child, 'DTSTART')[1]
+            if offset is None or not onset_value:
+                continue
+            try:
+                onset = datetime.strptime(onset_value.strip()[:15], '%Y%m%dT%H%M%S')
+            except ValueError:
+                continue
+            rrule_value = _first(child, 'RRULE')[1]
+            self.transitions.append((onset, _parse_rrule(rrule_value) if rrule_value else None, offset))
+
+    def _onset_in_year(self, onset, rule, year):
+        if rule is None:
+            return onset if onset.year == year else None
+        if rule.get('FREQ') != 'YEARLY' or 'BYMONTH' not in rule or 'BYDAY' not in rule:
+            return None
+        day = _nth_weekday(year, int(rule['BYMONTH'].split(',')[0]), rule['BYDAY'].split(',')[0])
+        if day is None or year < onset.year:
+            return None
+        return datetime.combine(day, onset.time())
+
+    def utcoffset_for(self, local_dt):
+        latest = None
+        for onset, rule, offset in self.transitions:
+            for year in (local_dt.year, local_dt.year - 1):
+                start = self._onset_in_year(onset, rule, year)
+                if start is not None and start <= local_dt and (latest is None or start > latest[0]):
+                    latest = (start, offset)
+        if latest:
+            return latest[1]
+        return self.transitions[0][2] if self.transitions else None
+
+
+def _resolve_timezone(tzid, vtimezones):
+    if not tzid:
+        return None
+    try:
+        return ZoneInfo(tzid)
+    except (ZoneInfoNotFoundError, ValueError):
+        pass
+    # Outlook style "/citadel.org/.../America/New_York" or similar prefixes
+    for candidate in (tzid.split('/', 1)[-1], '/'.join(tzid.split('/')[-2:])):
+        try:
+            return ZoneInfo(candidate)
+        except (ZoneInfoNotFoundError, ValueError):
+            continue
+    return vtimezones.get(tzid)
+
+
+def _parse_ics_datetime(params, value, vtimezones, user_tz):
+    """
+    Parse a DTSTART/DTEND value.
+
+    Returns:
+        tuple: (datetime in the user's timezone, or date for all-day values; is_all_day)
+    """
+    value = value.strip()
+    if params.get('VALUE') == 'DATE' or re.match(r'^\d{8}$', value):
+        return datetime.strptime(value[:8], '%Y%m%d').date(), True
+
+    naive = datetime.strptime(value[:15], '%Y%m%dT%H%M%S')
+    if value.endswith('Z'):
+        aware = naive.replace(tzinfo=timezone.utc)
+    else:
+        tz = _resolve_timezone(params.get('TZID'), vtimezones)
+        if isinstance(tz, _VTimezone):
+            offset = tz.utcoffset_for(naive)
+            aware = naive.replace(tzinfo=offset or user_tz)
+        else:
+            # Floating times are read in the user's own timezone
+            aware = naive.replace(tzinfo=tz or user_tz)
+    return aware.astimezone(user_tz), False
+
+
+def _parse_duration(value):
+    match = DURATION_PATTERN.match((value or '').strip().upper())
+    if not match:
+        return None
+    sign, weeks, days, hours, minutes, seconds = match.groups()
+    duration = timedelta(weeks=int(weeks or 0), days=int(days or 0), hours=int(hours or 0),
+                         minutes=int(minutes or 0), seconds=int(seconds or 0))
+    return -duration if sign == '-' else duration
+
+
+def parse_ics_events(ics_text, user_timezone="UTC"):
+    """
+    Parse the VEVENTs in an iCalendar document into the event dict shape
+    returned by extract_events_from_text.
+
+    Times are converted to the user's timezone using the event's TZID (IANA
+    names directly, otherwise the document's VTIMEZONE definitions). Recurring
+    events become one event whose 'recurrence' holds the RRULE plus EXDATEs;
+    RECURRENCE-ID overrides are excluded from their series and, unless
+    cancelled, returned as standalone events. Cancelled events and
+    METHOD:CANCEL documents are skipped.
+
+    Args:
+        ics_text (str): iCalendar document
+        user_timezone (str): User's timezone
+
+    Returns:
+        list: Event dicts; empty if the document has no usable VEVENT
+    """
+    try:
+        user_tz = ZoneInfo(user_timezone or "UTC")
+    except (ZoneInfoNotFoundError, ValueError):
+        user_tz = ZoneInfo("UTC")
+
+    events = []
+    for calendar in _parse_components(ics_text):
+        if calendar['name'] != 'VCALENDAR':
+            continue
+        if (_first(calendar, 'METHOD')[1] or '').strip().upper() == 'CANCEL':
+            logger.info("Skipping METHOD:CANCEL calendar attachment")
+            continue
+
+        vtimezones = {}
+        for child in calendar['children']:
+            if child['name'] == 'VTIMEZONE':
+                tzid = (_first(child, 'TZID')[1] or '').strip()
+                if tzid:
+                    vtimezones[tzid] = _VTimezone(child)
+
+        vevents = [child for child in calendar['children'] if child['name'] == 'VEVENT']
+        series_uids = {_uid(vevent) for vevent in vevents
+                       if _first(vevent, 'RRULE')[1] and not _first(vevent, 'RECURRENCE-ID')[1]}
+
+        # Occurrences overridden by a RECURRENCE-ID component are excluded from
+        # their series; moved ones come back below as standalone events
+        overridden = {}
+        for vevent in vevents:
+            params, value = _first(vevent, 'RECURRENCE-ID')
+            if value and _uid(vevent) in series_uids:
+                overridden.setdefault(_uid(vevent), []).extend(_local_dates([(params, value)], vtimezones, user_tz))
+
+        for child in vevents:
+            if _first(child, 'RECURRENCE-ID')[1] and _uid(child) not in series_uids:
+                # An update to one occurrence of a series this document doesn't contain
+                continue
+            try:
+                event = _vevent_to_event(child, vtimezones, user_tz, overridden.get(_uid(child)))
+            except Exception as e:
+                logger.warning(f"Skipping unparseable VEVENT: {str(e)}")
+                continue
+            if event:
+                events.append(event)
+
+    return events
+
+
+def _uid(vevent):
+    return (_first(vevent, 'UID')[1] or '').strip()
+
+
+def _vevent_to_event(vevent, vtimezones, user_tz, overridden_dates=None):
+    if (_first(vevent, 'STATUS')[1] or '').strip().upper() == 'CANCELLED':
+        return None
+
+    start_params, start_value = _first(vevent, 'DTSTART')
+    if not start_value:
+        return None
+    start, all_day = _parse_ics_datetime(start_params, start_value, vtimezones, user_tz)
+
+    end_params, end_value = _first(vevent, 'DTEND')
+    if end_value:
+        end, _ = _parse_ics_datetime(end_params, end_value, vtimezones, user_tz)
+    else:
+        duration = _parse_duration(_first(vevent, 'DURATION')[1])
+        end = start + duration if duration else None
+
+    if all_day and isinstance(end, date) and not isinstance(end, datetime):
+        # DTEND is exclusive for all-day events
+        end = end - timedelta(days=1) if end > start else start
+
+    summary = _unescape_text((_first(vevent, 'SUMMARY')[1] or '').strip()) or "Untitled Event"
+    description = _unescape_text((_first(vevent, 'DESCRIPTION')[1] or '').strip())
+    location = _unescape_text((_first(vevent, 'LOCATION')[1] or '').strip()) or None
+
+    recurrence = None
+    rrule_value = (_first(vevent, 'RRULE')[1] or '').strip()
+    if rrule_value and not _first(vevent, 'RECURRENCE-ID')[1]:
+        exception_dates = _local_dates(vevent['props'].get('EXDATE', []), vtimezones, user_tz) + list(overridden_dates or [])
+        recurrence = build_recurrence(rrule_value, exception_dates)
+
+    event = {
+        'event_name': summary,
+        'event_description': description,
+        'location': location,
+        'emoji': None,
+        'recurrence': recurrence,
+    }
+
+    if all_day:
+        event.update({
+            'start_date': start.strftime('%Y-%m-%d'), 'start_time': None, 'start_datetime': None,
+            'end_date': end.strftime('%Y-%m-%d') if end else None, 'end_time': None, 'end_datetime': None,
+        })
+    else:
+        event.update({
+            'start_date': start.strftime('%Y-%m-%d'),
+            'start_time': start.strftime('%H:%M'),
+            'start_datetime': start.isoformat(),
+            'end_date': end.strftime('%Y-%m-%d') if end else None,
+            'end_time': end.strftime('%H:%M') if end else None,
+            'end_datetime': end.isoformat() if end else None,
+        })
+    return event
@@ -0,0 +1,57 @@
+import json
+
+# JSON codec for the database's JSON/JSONB columns (wired into the engine in
+# app.py). Postgres jsonb rejects the \u0000 escape, so NUL characters are
+# stripped on the way in.
+
+
+def strip_nul(value):
+    """
+    Remove NUL characters from every string in a decoded JSON value.
+
+    Args:
+        value: JSON-compatible value
+
+    Returns:
+        The value with NUL characters removed from keys and strings
+    """
+    if isinstance(value, str):
+        return value.replace('\x00', '')
+    if isinstance(value, list):
+        return [strip_nul(item) for item in value]
+    if isinstance(value, dict):
+        return {strip_nul(key): strip_nul(item) for key, item in value.items()}
+    return value
+
+
+def dumps(value):
+    """
+    Serialize a value to a JSON string that jsonb accepts.
+
+    Args:
+        value: JSON-compatible value
+
+    Returns:
+        str: JSON text
+    """
+    text = json.dumps(value, ensure_ascii=False)
+    # json always escapes NUL, so this only rescans the rare values that contain one
+    if '\\u0000' in text:
+        text = json.dumps(strip_nul(value), ensure_ascii=False)
+    return text
+
+
+def loads(text):
+    """
+    Parse JSON text.
+
+    Args:
+        text (str or bytes): JSON text
+
+    Returns:
+        The decoded value
+
+    Raises:
+        ValueError: If the text isn't valid JSON
+    """
+    return json.loads(text)
@@ -0,0 +1,353 @@
+import logging
+import re
+from datetime import datetime, date, time, timedelta
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+logger = logging.getLogger(__name__)
+
+# Month names and abbreviations for the languages users most often forward
+# emails in; all map to month numbers
+MONTH_NAMES = {
+    1: ['january', 'jan', 'enero', 'ene', 'janvier', 'janv', 'januar', 'jän', 'janeiro', 'gennaio', 'gen'],
+    2: ['february', 'feb', 'febrero', 'février', 'fevrier', 'févr', 'februar', 'fevereiro', 'fev', 'febbraio'],
+    3: ['march', 'mar', 'marzo', 'mars', 'märz', 'marz', 'março', 'marco'],
+    4: ['april', 'apr', 'abril', 'abr', 'avril', 'avr', 'aprile'],
+    5: ['may', 'mayo', 'mai', 'maio', 'maggio', 'mag'],
+    6: ['june', 'jun', 'junio', 'juin', 'juni', 'junho', 'giugno', 'giu'],
+    7: ['july', 'jul', 'julio', 'juillet', 'juil', 'juli', 'julho', 'luglio', 'lug'],
+    8: ['august', 'aug', 'agosto', 'ago', 'août', 'aout'],
+    9: ['september', 'sep', 'sept', 'septiembre', 'septembre', 'setembro', 'set', 'settembre'],
+    10: ['october', 'oct', 'octubre', 'octobre', 'oktober', 'okt', 'outubro', 'out', 'ottobre', 'ott'],
+    11: ['november', 'nov', 'noviembre', 'novembre', 'novembro'],
+    12: ['december', 'dec', 'diciembre', 'dic', 'décembre', 'decembre', 'déc', 'dezember', 'dez', 'dezembro', 'dicembre'],
+}
+MONTH_LOOKUP = {name: number for number, names in MONTH_NAMES.items() for name in names}
+MONTH_ALTERNATION = '|'.join(sorted((re.escape(name) for name in MONTH_LOOKUP), key=len, reverse=True))
+
+WEEKDAY_NAMES = {
+    0: ['monday', 'mon', 'lunes', 'lundi', 'montag', 'lunedì'],
+    1: ['tuesday', 'tue', 'tues', 'martes', 'mardi', 'dienstag', 'martedì'],
+    2: ['wednesday', 'wed', 'miércoles', 'miercoles', 'mercredi', 'mittwoch', 'mercoledì'],
+    3: ['thursday', 'thu', 'thur', 'thurs', 'jueves', 'jeudi', 'donnerstag', 'giovedì'],
+    4: ['friday', 'fri', 'viernes', 'vendredi', 'freitag', 'venerdì'],
+    5: ['saturday', 'sat', 'sábado', 'sabado', 'samedi', 'samstag', 'sabato'],
+    6: ['sunday', 'sun', 'domingo', 'dimanche', 'sonntag', 'domenica'],
+}
+WEEKDAY_LOOKUP = {name: number for number, names in WEEKDAY_NAMES.items() for name in names}
+WEEKDAY_ALTERNATION = '|'.join(sorted((re.escape(name) for name in WEEKDAY_LOOKUP), key=len, reverse=True))
+
+ISO_DATE_PATTERN = re.compile(r'\b(\d{4})-(\d{1,2})-(\d{1,2})\b')
+MONTH_FIRST_PATTERN = re.compile(
+    rf'\b({MONTH_ALTERNATION})\.?\s+(\d{{1,2}})(?:st|nd|rd|th)?\b(?:,?\s+(\d{{4}}))?', re.IGNORECASE)
+DAY_FIRST_PATTERN = re.compile(
+    rf'\b(\d{{1,2}})(?:st|nd|rd|th|er|\.)?\s+(?:de\s+)?({MONTH_ALTERNATION})\.?\b(?:,?\s+(?:de\s+)?(\d{{4}}))?',
+    re.IGNORECASE)
+NUMERIC_DATE_PATTERN = re.compile(r'\b(\d{1,2})[/.](\d{1,2})(?:[/.](\d{2,4}))?\b')
+RELATIVE_DAY_PATTERN = re.compile(
+    r'\b(day after tomorrow|tomorrow|tonight|today|mañana|hoy|demain|aujourd\'hui|morgen|heute)\b', re.IGNORECASE)
+IN_DAYS_PATTERN = re.compile(r'\bin\s+(\d{1,2})\s+(days?|weeks?)\b', re.IGNORECASE)
+WEEKDAY_PATTERN = re.compile(rf'\b(?:(next|this|coming)\s+)?({WEEKDAY_ALTERNATION})\b\.?', re.IGNORECASE)
+
+# Hour, then minutes after ":", "h" or "." or a bare "h" ("15h"), then am/pm.
+# Digits never run into minutes without a separator, so "1234" or the "555"
+# of a phone number can't be read as a time.
+TIME_TOKEN = r'(?:(?<!\d)(\d{1,2})(?:[:h.](\d{2})|(h))?(?!\d)\s*([ap]\.?m\.?)?|(noon|midday|midnight))'
+TIME_RANGE_PATTERN = re.compile(
+    rf'(?:\bfrom\s+)?(?<![\d-])\b{TIME_TOKEN}\s*(?:-|–|—|to|until|till|bis|à|a)\s*{TIME_TOKEN}(?![\d/-])',
+    re.IGNORECASE)
+TIME_PATTERN = re.compile(rf'(?:\bat\s+|@\s*)?(?<![\d-])\b{TIME_TOKEN}(?![\d/-])', re.IGNORECASE)
+TIME_GROUPS = 5
+# "Dec 31 - Jan 2", "March 3-5", "12 au 14 juin": the separator and end of a date range
+RANGE_SEPARATOR = r'\s*(?:-|–|—|to|until|till|through|thru|au|al|bis)\s*'
+RANGE_END_PATTERN = re.compile(rf'\.?{RANGE_SEPARATOR}(?=\S)', re.IGNORECASE)
+RANGE_END_DAY_PATTERN = re.compile(r'(\d{1,2})(?:st|nd|rd|th)?\b(?!\s*(?:[ap]\.?m\b|[:h.]\d|h\b))', re.IGNORECASE)
+RANGE_START_DAY_PATTERN = re.compile(rf'\b(\d{{1,2}})(?:st|nd|rd|th|er|\.)?{RANGE_SEPARATOR}$', re.IGNORECASE)
+MAX_RANGE_DAYS = 366
+
+# Words left dangling next to a removed date or time ("Dinner on", "Dîner le à")
+DANGLING_WORDS = {
+    'on', 'at', 'from', 'to', 'until', 'till', 'through', 'by', 'for', 'in', 'and', 'the', 'of',
+    'le', 'la', 'les', 'à', 'a', 'au', 'de', 'du', 'des', 'el', 'en', 'al', 'am', 'um', 'bis', 'vom', 'ab',
+}
+
+LOCATION_PATTERN = re.compile(r'(?:\bat|@|\bin)\s+((?:the\s+)?[A-Z][\w\'&.-]*(?:\s+(?:[A-Z][\w\'&.-]*|of|de|on))*)')
+
+RELATIVE_OFFSETS = {
+    'today': 0, 'tonight': 0, 'hoy': 0, "aujourd'hui": 0, 'heute': 0,
+    'tomorrow': 1, 'mañana': 1, 'demain': 1, 'morgen': 1,
+    'day after tomorrow': 2,
+}
+
+
+def _day_first(user_timezone):
+    # Outside the Americas numeric dates are usually day/month
+    return not (user_timezone or '').startswith(('America/', 'US/', 'Canada/'))
+
+
+def _safe_date(year, month, day):
+    try:
+        return date(year, month, day)
+    except ValueError:
+        return None
+
+
+def _upcoming(today, month, day, year=None):
+    """Resolve a day/month, rolling into next year if it has already passed"""
+    if year:
+        return _safe_date(year if year > 99 else 2000 + year, month, day)
+    candidate = _safe_date(today.year, month, day)
+    if candidate and candidate < today - timedelta(days=1):
+        candidate = _safe_date(today.year + 1, month, day)
+    return candidate
+
+
+def _find_date(line, today, day_first):
+    """
+    Find the first date expression in a line.
+
+    Returns:
+        tuple: (date, matched span) or (None, None)
+    """
+    match = ISO_DATE_PATTERN.search(line)
+    if match:
+        found = _safe_date(int(match.group(1)), int(match.group(2)), int(match.group(3)))
+        if found:
+            return found, match.span()
+
+    for pattern, month_group, day_group in ((MONTH_FIRST_PATTERN, 1, 2), (DAY_FIRST_PATTERN, 2, 1)):
+        match = pattern.search(line)
+        if match:
+            month = MONTH_LOOKUP.get(match.group(month_group).lower().rstrip('.'))
+            found = month and _upcoming(today, month, int(match.group(day_group)),
+                                        int(match.group(3)) if match.group(3) else None)
+            if found:
+                return found, match.span()
+
+    match = NUMERIC_DATE_PATTERN.search(line)
+    # "19.30" is a time, but "12.07." and "12.07.2027" are dates
+    if match and ('/' in match.group(0) or match.group(3) or line[match.end():match.end() + 1] == '.'):
+        first, second = int(match.group(1)), int(match.group(2))
+        day, month = (first, second) if day_first else (second, first)
+        found = _upcoming(today, month, day, int(match.group(3)) if match.group(3) else None)
+        if found:
+            return found, match.span()
+
+    match = RELATIVE_DAY_PATTERN.search(line)
+    if match:
+        return today + timedelta(days=RELATIVE_OFFSETS[match.group(1).lower()]), match.span()
+
+    match = IN_DAYS_PATTERN.search(line)
+    if match:
+        count = int(match.group(1))
+        return today + timedelta(days=count * 7 if match.group(2).lower().startswith('week') else count), match.span()
+
+    match = WEEKDAY_PATTERN.search(line)
+    if match:
+        weekday = WEEKDAY_LOOKUP[match.group(2).lower()]
+        days_ahead = (weekday - today.weekday()) % 7
+        if match.group(1) and match.group(1).lower() == 'next' and days_ahead == 0:
+            days_ahead = 7
+        return today + timedelta(days=days_ahead), match.span()
+
+    return None, None
+
+
+def _find_date_range(line, today, day_first):
+    """
+    Find the first date expression in a line, extended to a date range when
+    one follows ("Dec 31 - Jan 2", "March 3-5") or precedes it ("3-5 March").
+
+    Returns:
+        tuple: (start date, end date or None, matched span) or (None, None, None)
+    """
+    start, span = _find_date(line, today, day_first)
+    if not start:
+        return None, None, None
+
+    end = None
+    separator = RANGE_END_PATTERN.match(line, span[1])
+    if separator:
+        rest = line[separator.end():]
+        for pattern, month_group, day_group, year_group in ((ISO_DATE_PATTERN, 2, 3, 1), (MONTH_FIRST_PATTERN, 1, 2, 3),
+                                                            (DAY_FIRST_PATTERN, 2, 1, 3), (RANGE_END_DAY_PATTERN, None, 1, None)):
+            match = pattern.match(rest)
+            if not match:
+                continue
+            if pattern is ISO_DATE_PATTERN:
+                month = int(match.group(month_group))
+            elif month_group:
+                month = MONTH_LOOKUP.get(match.group(month_group).lower().rstrip('.'))
+            else:
+                month = start.month  # "March 3-5"
+            year = int(match.group(year_group)) if year_group and match.group(year_group) else None
+            end = month and _safe_date((year if year > 99 else 2000 + year) if year else start.year,
+                                       month, int(match.group(day_group)))
+            if end and end < start:
+                if year:
+                    # "Dec 31 - Jan 2, 2027": the explicit year belongs to the end
+                    start = _safe_date(end.year - 1, start.month, start.day) or start
+                else:
+                    end = _safe_date(start.year + 1, end.month, end.day)
+            if end:
+                span = (span[0], separator.end() + match.end())
+            break
+    else:
+        match = RANGE_START_DAY_PATTERN.search(line, 0, span[0])
+        if match:
+            first = _safe_date(start.year, start.month, int(match.group(1)))
+            if first and first < start:
+                start, end, span = first, start, (match.start(), span[1])
+
+    if end and not timedelta(0) < end - start <= timedelta(days=MAX_RANGE_DAYS):
+        end = None
+    return start, end, span
+
+
+def _to_time(hour, minute, hour_suffix, meridiem, word, default_meridiem=None):
+    if word:
+        return time(0, 0) if word.lower() == 'midnight' else time(12, 0)
+    if hour is None:
+        return None
+    hour, minute = int(hour), int(minute or 0)
+    meridiem = (meridiem or default_meridiem or '').lower().replace('.', '')
+    if meridiem == 'pm' and hour < 12:
+        hour += 12
+    elif meridiem == 'am' and hour == 12:
+        hour = 0
+    if hour > 23 or minute > 59:
+        return None
+    return time(hour, minute)
+
+
+def _is_plausible_time(hour, minute, hour_suffix, meridiem, word):
+    # A bare number ("Gate 12", "2 guests", "10-12") is not a time
+    return bool(word or meridiem or hour_suffix or minute is not None)
+
+
+def _find_times(line):
+    """
+    Find a start and optional end time in a line.
+
+    Returns:
+        tuple: (start time, end time, list of matched spans)
+    """
+    match = TIME_RANGE_PATTERN.search(line)
+    if match:
+        start_parts, end_parts = match.groups()[:TIME_GROUPS], match.groups()[TIME_GROUPS:]
+        if _is_plausible_time(*start_parts) or _is_plausible_time(*end_parts):
+            # "3-5pm": the start borrows the end's am/pm
+            end = _to_time(*end_parts)
+            start = _to_time(*start_parts, default_meridiem=end_parts[3])
+            if start and end and start > end and not start_parts[3]:
+                start = _to_time(*start_parts)
+            if start:
+                return start, end, [match.span()]
+
+    for match in TIME_PATTERN.finditer(line):
+        if _is_plausible_time(*match.groups()):
+            start = _to_time(*match.groups())
+            if start:
+                return start, None, [match.span()]
+    return None, None, []
+
+
+def _is_dangling(token):
+    core = token.strip(',.;:()').lower()
+    return core in DANGLING_WORDS or not re.search(r'\w', token)
+
+
+def _event_name(line, spans):
+    """The line minus its date/time expressions, as a short title"""
+    for start, end in sorted(spans, reverse=True):
+        line = line[:start] + '\x00' + line[end:]
+    line = LOCATION_PATTERN.sub('\x00', line)
+
+    # Drop connecting words and stray punctuation on either side of each gap,
+    # and at the end of the line, but keep a leading "The"
+    segments = [segment.split() for segment in line.split('\x00')]
+    for number, tokens in enumerate(segments):
+        while tokens and _is_dangling(tokens[-1]):
+            tokens.pop()
+        while number and tokens and _is_dangling(tokens[0]):
+            tokens.pop(0)
+    line = ' '.join(' '.join(tokens) for tokens in segments if tokens)
+    line = line.strip(' ,.;:-–—()')
+    return line[:80] if len(line) >= 3 else None
+
+
+def extract_events_offline(text, current_date=None, user_timezone="UTC", require_date_and_time=False):
+    """
+    Heuristic, local event extraction used when the LLM is unavailable or the
+    input is too short to be worth an API call. Finds absolute, numeric and
+    relative dates ("next Monday", "tomorrow 3pm"), times and time ranges.
+
+    Args:
+        text (str): The input text
+        current_date (str): Current date in YYYY-MM-DD format for resolving relative dates
+        user_timezone (str): User's timezone
+        require_date_and_time (bool): Only return events whose line has both a
+            date and a time, for when the result replaces the LLM rather than
+            standing in for it
+
+    Returns:
+        list: Events in the same dict shape as extract_events_from_text; one
+            per line that mentions a date, or a single event for a time with no date
+    """
+    try:
+        tz = ZoneInfo(user_timezone or "UTC")
+    except (ZoneInfoNotFoundError, ValueError):
+        tz = ZoneInfo("UTC")
+    today = datetime.strptime(current_date, '%Y-%m-%d').date() if current_date else datetime.now(tz).date()
+    day_first = _day_first(user_timezone)
+
+    lines = [line.strip() for line in re.split(r'[\r\n]+|(?<=[.!?])\s+(?=[A-Z])', text) if line.strip()]
+    title_fallback = next((line for line in lines if not line.lower().startswith(('from:', 'subject:', 'to:'))), '')
+
+    events = []
+    seen = set()
+    for line in lines:
+        if line.lower().startswith(('from:', 'to:', 'sent:', 'date:')):
+            continue
+        found_date, range_end, date_span = _find_date_range(line, today, day_first)
+        # Blank out the date so its digits aren't read as a time
+        time_line = line[:date_span[0]] + ' ' * (date_span[1] - date_span[0]) + line[date_span[1]:] if date_span else line
+        start_time, end_time, time_spans = _find_times(time_line)
+        if require_date_and_time and not (found_date and start_time):
+            continue
+        if not found_date and not (start_time and len(lines) == 1):
+            continue
+        found_date = found_date or today
+
+        key = (found_date, start_time)
+        if key in seen:
+            continue
+        seen.add(key)
+
+        location_match = LOCATION_PATTERN.search(line)
+        spans = time_spans + ([date_span] if date_span else [])
+        name = _event_name(line, spans) or _event_name(title_fallback, []) or "Event"
+        if name.lower().startswith('subject:'):
+            name = name[len('subject:'):].strip() or "Event"
+
+        event = {
+            'event_name': name,
+            'event_description': line[:500],
+            'location': location_match.group(1).strip() if location_match else None,
+            'emoji': None,
+            'start_date': found_date.strftime('%Y-%m-%d'),
+            'start_time': start_time.strftime('%H:%M') if start_time else None,
+            'start_datetime': None,
+            'end_date': (range_end or found_date).strftime('%Y-%m-%d'),
+            'end_time': end_time.strftime('%H:%M') if end_time else None,
+            'end_datetime': None,
+        }
+        if start_time:
+            event['start_datetime'] = datetime.combine(found_date, start_time, tz).isoformat()
+            if end_time:
+                end_date = range_end or (found_date + timedelta(days=1) if end_time <= start_time else found_date)
+                event['end_date'] = end_date.strftime('%Y-%m-%d')
+                event['end_datetime'] = datetime.combine(end_date, end_time, tz).isoformat()
+        events.append(event)
+
+    logger.info(f"Offline extraction found {len(events)} events in text of length {len(text)}")
+    return events
@@ -0,0 +1,302 @@
+import logging
+import os
+import socket
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from openai import APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+
+from app import app, db
+from models import OpenAIConcurrencyLease
+
+logger = logging.getLogger(__name__)
+
+# Circuit breaker: trips when too many recent calls failed or timed out, then
+# fails fast for OPENAI_BREAKER_OPEN_SECONDS before letting a probe through
+OPENAI_BREAKER_WINDOW_SECONDS = int(os.environ.get("OPENAI_BREAKER_WINDOW_SECONDS", 60))
+OPENAI_BREAKER_MIN_CALLS = int(os.environ.get("OPENAI_BREAKER_MIN_CALLS", 5))
+OPENAI_BREAKER_FAILURE_RATE = float(os.environ.get("OPENAI_BREAKER_FAILURE_RATE", 0.5))
+OPENAI_BREAKER_OPEN_SECONDS = int(os.environ.get("OPENAI_BREAKER_OPEN_SECONDS", 30))
+
+# Adaptive limiter: caps in-flight completions across all worker processes.
+# The cap halves on 429s or when rate-limit headers run low, and creeps back
+# up by one after every OPENAI_LIMIT_INCREASE_AFTER clean successes.
+OPENAI_MAX_CONCURRENCY = int(os.environ.get("OPENAI_MAX_CONCURRENCY", 16))
+OPENAI_MIN_CONCURRENCY = int(os.environ.get("OPENAI_MIN_CONCURRENCY", 1))
+OPENAI_LIMIT_INCREASE_AFTER = int(os.environ.get("OPENAI_LIMIT_INCREASE_AFTER", 10))
+OPENAI_QUEUE_WAIT_SECONDS = float(os.environ.get("OPENAI_QUEUE_WAIT_SECONDS", 2))
+OPENAI_LEASE_SECONDS = int(os.environ.get("OPENAI_LEASE_SECONDS", 90))  # Longer than any request timeout
+OPENAI_RATE_LIMIT_LOW_WATERMARK = float(os.environ.get("OPENAI_RATE_LIMIT_LOW_WATERMARK", 0.1))
+
+# Failures that say the service is unhealthy; 4xx request errors don't count
+BREAKER_FAILURES = (APITimeoutError, APIConnectionError, InternalServerError, RateLimitError)
+
+
+class OpenAIUnavailable(Exception):
+    """Raised instead of calling OpenAI when the breaker is open or load is shed"""
+
+    def __init__(self, message, reason):
+        super().__init__(message)
+        self.reason = reason
+
+
+_lock = threading.Lock()
+_outcomes = deque()  # (monotonic time, failed) within the breaker window
+_state = {
+    'breaker': 'closed',  # closed, open, half_open
+    'opened_at': None,
+    'probe_in_flight': False,
+    'trips': 0,
+    'limit': OPENAI_MAX_CONCURRENCY,
+    'successes_since_change': 0,
+    'in_flight': 0,  # This process
+    'shed': 0,
+    'fast_failures': 0,
+    'rate_limited': 0,
+    'last_rate_limit_headers': None,
+    'lease_errors': 0,
+}
+
+
+def _record_outcome(failed):
+    now = time.monotonic()
+    _outcomes.append((now, failed))
+    while _outcomes and _outcomes[0][0] < now - OPENAI_BREAKER_WINDOW_SECONDS:
+        _outcomes.popleft()
+
+    if _state['breaker'] == 'half_open':
+        _state['probe_in_flight'] = False
+        if failed:
+            _open_breaker()
+        else:
+            _state['breaker'] = 'closed'
+            _outcomes.clear()
+            logger.info("OpenAI circuit breaker closed after successful probe")
+        return
+
+    failures = sum(1 for _, outcome in _outcomes if outcome)
+    if (_state['breaker'] == 'closed' and len(_outcomes) >= OPENAI_BREAKER_MIN_CALLS
+            and failures / len(_outcomes) >= OPENAI_BREAKER_FAILURE_RATE):
+        _open_breaker()
+
+
+def _open_breaker():
+    _state['breaker'] = 'open'
+    _state['opened_at'] = time.monotonic()
+    _state['trips'] += 1
+    logger.warning(f"OpenAI circuit breaker opened for {OPENAI_BREAKER_OPEN_SECONDS}s")
+
+
+def _check_breaker():
+    """Raise OpenAIUnavailable if calls shouldn't go out right now"""
+    with _lock:
+        if _state['breaker'] == 'open':
+            if time.monotonic() - _state['opened_at'] < OPENAI_BREAKER_OPEN_SECONDS:
+                _state['fast_failures'] += 1
+                raise OpenAIUnavailable("AI service is temporarily unavailable", 'circuit_open')
+            _state['breaker'] = 'half_open'
+            logger.info("OpenAI circuit breaker half-open, sending a probe request")
+
+        if _state['breaker'] == 'half_open':
+            if _state['probe_in_flight']:
+                _state['fast_failures'] += 1
+                raise OpenAIUnavailable("AI service is temporarily unavailable", 'circuit_open')
+            _state['probe_in_flight'] = True
+
+
+def _decrease_limit(reason):
+    new_limit = max(OPENAI_MIN_CONCURRENCY, _state['limit'] // 2)
+    if new_limit != _state['limit']:
+        logger.warning(f"Lowering OpenAI concurrency limit from {_state['limit']} to {new_limit}: {reason}")
+    _state['limit'] = new_limit
+    _state['successes_since_change'] = 0
+
+
+def _header_fraction(headers, kind):
+    try:
+        remaining = float(headers.get(f'x-ratelimit-remaining-{kind}'))
+        limit = float(headers.get(f'x-ratelimit-limit-{kind}'))
+    except (TypeError, ValueError):
+        return None
+    return remaining / limit if limit else None
+
+
+def record_rate_limit_headers(headers):
+    """
+    Adapt the concurrency limit to OpenAI's x-ratelimit-* response headers.
+
+    Args:
+        headers: Response headers of a successful completion
+    """
+    if headers is None:
+        return
+    fractions = [fraction for fraction in (_header_fraction(headers, 'requests'), _header_fraction(headers, 'tokens'))
+                 if fraction is not None]
+    with _lock:
+        if fractions:
+            _state['last_rate_limit_headers'] = {
+                key: headers.get(key) for key in ('x-ratelimit-remaining-requests', 'x-ratelimit-remaining-tokens',
+                                                  'x-ratelimit-reset-requests', 'x-ratelimit-reset-tokens')
+            }
+        if fractions and min(fractions) < OPENAI_RATE_LIMIT_LOW_WATERMARK:
+            _decrease_limit(f"rate limit headroom down to {min(fractions):.0%}")
+            return
+        _state['successes_since_change'] += 1
+        if _state['successes_since_change'] >= OPENAI_LIMIT_INCREASE_AFTER and _state['limit'] < OPENAI_MAX_CONCURRENCY:
+            _state['limit'] += 1
+            _state['successes_since_change'] = 0
+
+
+def _engine():
+    with app.app_context():
+        return db.engine
+
+
+def _try_acquire_lease(holder, limit):
+    """
+    Insert a lease row if fewer than limit unexpired leases exist.
+
+    Returns:
+        int: Lease id, or None if the global limit is reached
+    """
+    table = OpenAIConcurrencyLease.__table__
+    now = datetime.utcnow()
+    engine = _engine()
+    with engine.begin() as conn:
+        if engine.dialect.name == 'postgresql':
+            # Serialize the count-then-insert across processes
+            conn.execute(db.text("SELECT pg_advisory_xact_lock(hashtext('openai_concurrency_lease'))"))
+        conn.execute(db.delete(table).where(table.c.expires_at <= now))
+        in_flight = conn.execute(db.select(db.func.count()).select_from(table)).scalar()
+        if in_flight >= limit:
+            return None
+        result = conn.execute(db.insert(table).values(
+            holder=holder, acquired_at=now, expires_at=now + timedelta(seconds=OPENAI_LEASE_SECONDS)))
+        return result.inserted_primary_key[0]
+
+
+def _release_lease(lease_id):
+    table = OpenAIConcurrencyLease.__table__
+    with _engine().begin() as conn:
+        conn.execute(db.delete(table).where(table.c.id == lease_id))
+
+
+def _acquire_slot():
+    """
+    Wait up to OPENAI_QUEUE_WAIT_SECONDS for a global concurrency slot.
+
+    Returns:
+        int: Lease id, or None if the lease table couldn't be reached (fail open)
+
+    Raises:
+        OpenAIUnavailable: If no slot freed up in time
+    """
+    holder = f"{socket.gethostname()}-{os.getpid()}-{threading.get_ident()}"[:100]
+    deadline = time.monotonic() + OPENAI_QUEUE_WAIT_SECONDS
+    delay = 0.05
+    while True:
+        try:
+            lease_id = _try_acquire_lease(holder, _state['limit'])
+        except Exception as e:
+            logger.warning(f"OpenAI concurrency lease unavailable, continuing without it: {str(e)}")
+            with _lock:
+                _state['lease_errors'] += 1
+            return None
+        if lease_id is not None:
+            return lease_id
+        if time.monotonic() >= deadline:
+            with _lock:
+                _state['shed'] += 1
+            raise OpenAIUnavailable("AI service is at capacity", 'shed')
+        time.sleep(delay)
+        delay = min(delay * 2, 0.5)
+
+
+@contextmanager
+def guard_openai_call():
+    """
+    Wrap one OpenAI completion with the circuit breaker and the global
+    concurrency limiter. Fails fast with OpenAIUnavailable when the breaker
+    is open or no slot frees up within OPENAI_QUEUE_WAIT_SECONDS.
+
+    Yields:
+        None
+    """
+    _check_breaker()
+    try:
+        lease_id = _acquire_slot()
+    except OpenAIUnavailable:
+        with _lock:
+            if _state['breaker'] == 'half_open':
+                _state['probe_in_flight'] = False
+        raise
+
+    with _lock:
+        _state['in_flight'] += 1
+    try:
+        yield
+    except Exception as e:
+        with _lock:
+            if isinstance(e, RateLimitError):
+                _state['rate_limited'] += 1
+                _decrease_limit("429 from OpenAI")
+            if isinstance(e, BREAKER_FAILURES):
+                _record_outcome(True)
+            elif _state['breaker'] == 'half_open':
+                _record_outcome(False)
+        raise
+    else:
+        with _lock:
+            _record_outcome(False)
+    finally:
+        with _lock:
+            _state['in_flight'] -= 1
+        if lease_id is not None:
+            try:
+                _release_lease(lease_id)
+            except Exception as e:
+                # The lease lapses on its own after OPENAI_LEASE_SECONDS
+                logger.warning(f"Failed to release OpenAI concurrency lease {lease_id}: {str(e)}")
+
+
+def get_openai_guard_status():
+    """
+    Get circuit breaker and limiter state for this process.
+
+    Returns:
+        dict: Breaker state, recent failure rate, concurrency limit, in-flight
+            counts (this process and all workers) and shed/fast-fail counters
+    """
+    with _lock:
+        now = time.monotonic()
+        recent = [failed for at, failed in _outcomes if at >= now - OPENAI_BREAKER_WINDOW_SECONDS]
+        status = {
+            'breaker': _state['breaker'],
+            'open_for_seconds': (round(max(OPENAI_BREAKER_OPEN_SECONDS - (now - _state['opened_at']), 0), 1)
+                                 if _state['breaker'] == 'open' else None),
+            'trips': _state['trips'],
+            'window_calls': len(recent),
+            'window_failure_rate': round(sum(recent) / len(recent), 3) if recent else 0.0,
+            'concurrency_limit': _state['limit'],
+            'in_flight_process': _state['in_flight'],
+            'shed': _state['shed'],
+            'fast_failures': _state['fast_failures'],
+            'rate_limited': _state['rate_limited'],
+            'lease_errors': _state['lease_errors'],
+            'rate_limit_headers': _state['last_rate_limit_headers'],
+        }
+
+    try:
+        table = OpenAIConcurrencyLease.__table__
+        with _engine().begin() as conn:
+            status['in_flight_global'] = conn.execute(
+                db.select(db.func.count()).select_from(table).where(table.c.expires_at > datetime.utcnow())
+            ).scalar()
+    except Exception as e:
+        logger.warning(f"Failed to count OpenAI concurrency leases: {str(e)}")
+        status['in_flight_global'] = None
+
+    return status
@@ -0,0 +1,187 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+logger = logging.getLogger(__name__)
+
+# Hedged requests: when the first completion hasn't returned by the
+# OPENAI_HEDGE_PERCENTILE of recent latencies, an identical second request is
+# sent and whichever answers first wins. The loser can't be aborted mid-flight
+# with the synchronous client, so it is abandoned and its tokens are counted
+# as hedging cost.
+OPENAI_HEDGE_ENABLED = os.environ.get("OPENAI_HEDGE_ENABLED", "false").lower() == "true"
+OPENAI_HEDGE_PERCENTILE = float(os.environ.get("OPENAI_HEDGE_PERCENTILE", 0.9))
+OPENAI_HEDGE_MAX_RATE = float(os.environ.get("OPENAI_HEDGE_MAX_RATE", 0.1))  # Share of requests allowed to hedge
+OPENAI_HEDGE_MIN_SAMPLES = int(os.environ.get("OPENAI_HEDGE_MIN_SAMPLES", 20))
+OPENAI_HEDGE_MIN_DELAY_SECONDS = float(os.environ.get("OPENAI_HEDGE_MIN_DELAY_SECONDS", 2))
+OPENAI_HEDGE_WORKERS = int(os.environ.get("OPENAI_HEDGE_WORKERS", 16))
+LATENCY_SAMPLES = 500  # Recent latencies kept for the trigger and the metrics
+
+_executor = ThreadPoolExecutor(max_workers=OPENAI_HEDGE_WORKERS, thread_name_prefix="openai-hedge")
+_lock = threading.Lock()
+_primary_latencies = deque(maxlen=LATENCY_SAMPLES)  # Un-hedged latency of every first attempt
+_effective_latencies = deque(maxlen=LATENCY_SAMPLES)  # Latency the caller actually saw
+_budget_window = deque(maxlen=LATENCY_SAMPLES)  # True for each recent request that was hedged
+_stats = {
+    'requests': 0,
+    'hedged': 0,
+    'hedge_wins': 0,
+    'budget_skips': 0,
+    'hedge_errors': 0,
+    'extra_prompt_tokens': 0,
+    'extra_completion_tokens': 0,
+}
+
+
+def _percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def get_hedge_delay():
+    """
+    Seconds to wait for the first attempt before hedging.
+
+    Returns:
+        float: Delay, or None while there are too few latency samples
+    """
+    with _lock:
+        if len(_primary_latencies) < OPENAI_HEDGE_MIN_SAMPLES:
+            return None
+        return max(_percentile(_primary_latencies, OPENAI_HEDGE_PERCENTILE), OPENAI_HEDGE_MIN_DELAY_SECONDS)
+
+
+def _within_budget():
+    with _lock:
+        hedged = sum(_budget_window)
+        return (hedged + 1) / (len(_budget_window) + 1) <= OPENAI_HEDGE_MAX_RATE
+
+
+def _timed(call):
+    started = time.monotonic()
+    return call(), time.monotonic() - started
+
+
+def _record_loser_cost(future):
+    """Count an abandoned attempt's tokens once it finishes in the background"""
+    try:
+        response, _ = future.result()
+    except Exception:
+        return
+    usage = getattr(response, 'usage', None)
+    with _lock:
+        _stats['extra_prompt_tokens'] += getattr(usage, 'prompt_tokens', 0) or 0
+        _stats['extra_completion_tokens'] += getattr(usage, 'completion_tokens', 0) or 0
+
+
+def _record_primary_latency(future):
+    try:
+        _, latency = future.result()
+    except Exception:
+        return
+    with _lock:
+        _primary_latencies.append(latency)
+
+
+def run_hedged(call):
+    """
+    Run call, sending an identical hedge if it is slower than recent latency
+    suggests, and return whichever result arrives first.
+
+    Args:
+        call (callable): Makes one OpenAI request and returns the response
+
+    Returns:
+        The winning response
+
+    Raises:
+        Exception: The primary's error if every attempt failed
+    """
+    started = time.monotonic()
+    primary = _executor.submit(_timed, call)
+    primary.add_done_callback(_record_primary_latency)
+
+    hedged = False
+    delay = get_hedge_delay()
+    if delay is not None:
+        try:
+            primary.result(timeout=delay)
+        except Exception:
+            pass
+
+        if not primary.done():
+            if _within_budget():
+                hedged = True
+            else:
+                with _lock:
+                    _stats['budget_skips'] += 1
+
+    with _lock:
+        _stats['requests'] += 1
+        _budget_window.append(hedged)
+        if hedged:
+            _stats['hedged'] += 1
+
+    if not hedged:
+        response, _ = primary.result()
+        with _lock:
+            _effective_latencies.append(time.monotonic() - started)
+        return response
+
+    logger.info(f"OpenAI call still running after {delay:.1f}s, sending a hedged request")
+    hedge = _executor.submit(_timed, call)
+    pending = {primary, hedge}
+    winner = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        successful = [future for future in done if future.exception() is None]
+        if successful:
+            winner = primary if primary in successful else hedge
+            break
+        if hedge in done and hedge.exception() is not None:
+            with _lock:
+                _stats['hedge_errors'] += 1
+
+    if winner is None:
+        return primary.result()  # Both failed: surface the original error
+
+    loser = hedge if winner is primary else primary
+    loser.add_done_callback(_record_loser_cost)
+    with _lock:
+        _effective_latencies.append(time.monotonic() - started)
+        if winner is hedge:
+            _stats['hedge_wins'] += 1
+
+    return winner.result()[0]
+
+
+def get_hedging_stats():
+    """
+    Get hedging counters and the tail latency with and without hedging.
+
+    Returns:
+        dict: Counters, hedge rate, current trigger delay, p50/p99 of the
+            un-hedged first attempts vs what callers saw, and extra tokens spent
+    """
+    with _lock:
+        stats = dict(_stats)
+        primary_p99 = _percentile(_primary_latencies, 0.99)
+        effective_p99 = _percentile(_effective_latencies, 0.99)
+        stats.update({
+            'enabled': OPENAI_HEDGE_ENABLED,
+            'hedge_rate': round(stats['hedged'] / stats['requests'], 4) if stats['requests'] else 0.0,
+            'primary_p50_ms': round(_percentile(_primary_latencies, 0.5) * 1000) if _primary_latencies else None,
+            'primary_p99_ms': round(primary_p99 * 1000) if primary_p99 is not None else None,
+            'effective_p50_ms': round(_percentile(_effective_latencies, 0.5) * 1000) if _effective_latencies else None,
+            'effective_p99_ms': round(effective_p99 * 1000) if effective_p99 is not None else None,
+        })
+    delay = get_hedge_delay()
+    stats['hedge_delay_ms'] = round(delay * 1000) if delay is not None else None
+    stats['p99_saved_ms'] = (stats['primary_p99_ms'] - stats['effective_p99_ms']
+                             if stats['primary_p99_ms'] is not None and stats['effective_p99_ms'] is not None else None)
+    return stats
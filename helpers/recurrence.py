@@ -0,0 +1,380 @@
+import calendar
+import logging
+import re
+from datetime import datetime, date, time, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+logger = logging.getLogger(__name__)
+
+# Recurrence is stored on Event.recurrence as RFC 5545 lines, one per line, in
+# the form Google Calendar's "recurrence" field takes: a single "RRULE:..."
+# optionally followed by "EXDATE;VALUE=DATE:..." for skipped occurrences.
+# Exception dates are kept as plain local dates and only turned into
+# date-times (which must match the event's start time) when the Google
+# request body is built.
+RRULE_PARTS = ('FREQ', 'INTERVAL', 'COUNT', 'UNTIL', 'BYDAY', 'BYMONTHDAY', 'BYMONTH', 'BYYEARDAY',
+               'BYWEEKNO', 'BYSETPOS', 'WKST')
+FREQUENCIES = ('DAILY', 'WEEKLY', 'MONTHLY', 'YEARLY')
+RRULE_VALUE_PATTERN = re.compile(r'^[A-Z0-9,+\-]+$')
+MAX_EXCEPTION_DATES = 100
+WEEKDAYS = ('MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU')
+BYDAY_PATTERN = re.compile(r'^([+-]?\d{1,2})?(MO|TU|WE|TH|FR|SA|SU)$')
+# Parts expand_recurrence can't evaluate; such series show their first occurrence only
+UNSUPPORTED_EXPANSION_PARTS = ('BYSETPOS', 'BYYEARDAY', 'BYWEEKNO')
+MAX_EXPANSION_PERIODS = 10000  # Days, weeks, months or years walked from the series start
+# Slack added to a stored series end, so a later change of the owner's
+# timezone (which shifts every occurrence) can't hide the last one
+SERIES_END_MARGIN = timedelta(days=1)
+
+
+def parse_rrule(rrule_value):
+    """
+    Split an RRULE value into its parts.
+
+    Args:
+        rrule_value (str): RRULE value, with or without the "RRULE:" prefix
+
+    Returns:
+        dict: Upper-cased part name -> value
+    """
+    value = (rrule_value or '').strip().upper()
+    if value.startswith('RRULE:'):
+        value = value[len('RRULE:'):]
+    return dict(part.split('=', 1) for part in value.split(';') if '=' in part)
+
+
+def normalize_rrule(rrule_value):
+    """
+    Validate an RRULE and rebuild it from known parts only.
+
+    Args:
+        rrule_value (str): RRULE value from the model or an .ics file
+
+    Returns:
+        str: RRULE value without the "RRULE:" prefix, or None if it isn't usable
+    """
+    rule = parse_rrule(rrule_value)
+    if rule.get('FREQ') not in FREQUENCIES:
+        if rrule_value:
+            logger.warning(f"Ignoring unsupported recurrence rule: '{rrule_value}'")
+        return None
+
+    parts = []
+    for name in RRULE_PARTS:
+        part_value = rule.get(name, '').strip()
+        if not part_value:
+            continue
+        if not RRULE_VALUE_PATTERN.match(part_value):
+            logger.warning(f"Dropping malformed {name} from recurrence rule: '{part_value}'")
+            continue
+        parts.append(f"{name}={part_value}")
+    return ';'.join(parts)
+
+
+def _parse_exception_date(value):
+    value = str(value).strip()
+    for fmt in ('%Y-%m-%d', '%Y%m%d'):
+        try:
+            return datetime.strptime(value[:10] if fmt == '%Y-%m-%d' else value[:8], fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def build_recurrence(rrule_value, exception_dates=None):
+    """
+    Build the stored recurrence text for an event.
+
+    Args:
+        rrule_value (str): RRULE value, with or without the "RRULE:" prefix
+        exception_dates (list): Dates (YYYY-MM-DD strings or date objects) of
+            occurrences that are skipped or were moved to a separate event
+
+    Returns:
+        str: Newline-separated RRULE/EXDATE lines, or None if not recurring
+    """
+    rrule = normalize_rrule(rrule_value)
+    if not rrule:
+        return None
+
+    lines = [f"RRULE:{rrule}"]
+    dates = set()
+    for value in exception_dates or []:
+        parsed = value if hasattr(value, 'strftime') else _parse_exception_date(value)
+        if parsed is None:
+            logger.warning(f"Ignoring unparseable exception date: '{value}'")
+            continue
+        dates.add(parsed.strftime('%Y%m%d'))
+    if dates:
+        lines.append("EXDATE;VALUE=DATE:" + ','.join(sorted(dates)[:MAX_EXCEPTION_DATES]))
+    return '\n'.join(lines)
+
+
+def recurrence_for_calendar(recurrence, start_time=None, timezone_name="UTC"):
+    """
+    Turn stored recurrence text into Google Calendar "recurrence" entries.
+
+    Google expands the series in the event's timeZone and needs EXDATEs and
+    UNTIL to be date-times when the event has a start time, so plain dates
+    are combined with the series' local start time here.
+
+    Args:
+        recurrence (str): Stored recurrence text (see build_recurrence)
+        start_time (str): Series start time as HH:MM in timezone_name; the
+            09:00 default used for untimed events when None
+        timezone_name (str): IANA timezone the event body uses
+
+    Returns:
+        list: RRULE/EXDATE strings, or None if there is no recurrence
+    """
+    if not recurrence:
+        return None
+
+    try:
+        tz = ZoneInfo(timezone_name or "UTC")
+    except (ZoneInfoNotFoundError, ValueError):
+        tz = ZoneInfo("UTC")
+        timezone_name = "UTC"
+    local_start = datetime.strptime(start_time, '%H:%M').time() if start_time else time(9, 0)
+
+    entries = []
+    for line in recurrence.splitlines():
+        line = line.strip()
+        if line.startswith('RRULE:'):
+            rule = parse_rrule(line)
+            until = rule.get('UNTIL', '')
+            if re.match(r'^\d{8}$', until):
+                # UNTIL must be a UTC date-time when DTSTART is one; keep the last day inclusive
+                last_day = datetime.strptime(until, '%Y%m%d').date()
+                end_of_day = datetime.combine(last_day, time(23, 59, 59), tzinfo=tz).astimezone(timezone.utc)
+                line = line.replace(f"UNTIL={until}", f"UNTIL={end_of_day.strftime('%Y%m%dT%H%M%SZ')}")
+            entries.append(line)
+        elif line.startswith('EXDATE;VALUE=DATE:'):
+            dates = [value for value in line.split(':', 1)[1].split(',') if value]
+            if dates:
+                times = ','.join(f"{value}T{local_start.strftime('%H%M%S')}" for value in dates)
+                entries.append(f"EXDATE;TZID={timezone_name}:{times}")
+        elif line:
+            entries.append(line)
+    return entries or None
+
+
+def _parse_byday(value):
+    """'2TU,-1FR,MO' -> [(2, 1), (-1, 4), (None, 0)]"""
+    entries = []
+    for part in value.split(','):
+        match = BYDAY_PATTERN.match(part.strip())
+        if match:
+            entries.append((int(match.group(1)) if match.group(1) else None, WEEKDAYS.index(match.group(2))))
+    return entries
+
+
+def _month_days(year, month, rule, default_day):
+    """Days of one month matched by BYMONTHDAY/BYDAY, or default_day without them"""
+    days_in_month = calendar.monthrange(year, month)[1]
+    if not rule.get('BYMONTHDAY') and not rule.get('BYDAY'):
+        return [default_day] if default_day <= days_in_month else []
+
+    days = set(range(1, days_in_month + 1))
+    if rule.get('BYMONTHDAY'):
+        month_days = set()
+        for value in rule['BYMONTHDAY'].split(','):
+            day = int(value)
+            month_days.add(day if day > 0 else days_in_month + day + 1)
+        days &= month_days
+    if rule.get('BYDAY'):
+        weekday_days = set()
+        for ordinal, weekday in _parse_byday(rule['BYDAY']):
+            matching = [day for day in range(1, days_in_month + 1) if date(year, month, day).weekday() == weekday]
+            if ordinal is None:
+                weekday_days.update(matching)
+            elif -len(matching) <= ordinal <= len(matching) and ordinal != 0:
+                weekday_days.add(matching[ordinal - 1 if ordinal > 0 else ordinal])
+        days &= weekday_days
+    return sorted(days)
+
+
+def _candidate_dates(rule, first_day):
+    """Yield the local dates an RRULE produces, in order, from its first period on"""
+    frequency = rule['FREQ']
+    interval = max(int(rule.get('INTERVAL') or 1), 1)
+    months = [int(value) for value in rule['BYMONTH'].split(',')] if rule.get('BYMONTH') else None
+    weekdays = [weekday for _, weekday in _parse_byday(rule.get('BYDAY', ''))]
+
+    for period in range(MAX_EXPANSION_PERIODS):
+        if frequency == 'DAILY':
+            day = first_day + timedelta(days=period * interval)
+            dates = [day] if not weekdays or day.weekday() in weekdays else []
+        elif frequency == 'WEEKLY':
+            week_start = WEEKDAYS.index(rule.get('WKST', 'MO')) if rule.get('WKST') in WEEKDAYS else 0
+            base = first_day - timedelta(days=(first_day.weekday() - week_start) % 7) + timedelta(weeks=period * interval)
+            dates = sorted(base + timedelta(days=(weekday - week_start) % 7)
+                           for weekday in (weekdays or [first_day.weekday()]))
+        elif frequency == 'MONTHLY':
+            year, month = divmod(first_day.year * 12 + first_day.month - 1 + period * interval, 12)
+            dates = [date(year, month + 1, day) for day in _month_days(year, month + 1, rule, first_day.day)]
+        else:
+            year = first_day.year + period * interval
+            dates = [date(year, month, day) for month in (months or [first_day.month])
+                     for day in _month_days(year, month, rule, first_day.day)]
+
+        for day in dates:
+            if day >= first_day and (months is None or day.month in months):
+                yield day
+
+
+def expand_recurrence(recurrence, starts_at, ends_at, window_start, window_end, timezone_name="UTC"):
+    """
+    List the occurrences of a stored series that overlap a window.
+
+    The series is expanded in timezone_name, as Google Calendar expands it:
+    every occurrence starts at the first one's local time and lasts as long
+    on the wall clock.
+
+    Args:
+        recurrence (str): Stored recurrence text (see build_recurrence)
+        starts_at (datetime): Aware start of the first occurrence
+        ends_at (datetime): Aware end of the first occurrence (exclusive)
+        window_start (datetime): Aware window start
+        window_end (datetime): Aware window end (exclusive)
+        timezone_name (str): IANA timezone of the series
+
+    Returns:
+        list: (starts_at, ends_at) pairs as aware UTC datetimes, in order
+    """
+    try:
+        tz = ZoneInfo(timezone_name or "UTC")
+    except (ZoneInfoNotFoundError, ValueError):
+        tz = ZoneInfo("UTC")
+
+    rule = {}
+    exception_dates = set()
+    for line in (recurrence or '').splitlines():
+        line = line.strip()
+        if line.startswith('RRULE:'):
+            rule = parse_rrule(line)
+        elif line.startswith('EXDATE'):
+            exception_dates.update(value[:8] for value in line.split(':', 1)[-1].split(',') if value)
+
+    local_start = starts_at.astimezone(tz)
+    wall_duration = ends_at.astimezone(tz).replace(tzinfo=None) - local_start.replace(tzinfo=None)
+
+    def occurrence(day):
+        naive_start = datetime.combine(day, local_start.time())
+        return (naive_start.replace(tzinfo=tz).astimezone(timezone.utc),
+                (naive_start + wall_duration).replace(tzinfo=tz).astimezone(timezone.utc))
+
+    def first_only():
+        first = occurrence(local_start.date())
+        return [first] if first[0] < window_end and first[1] > window_start else []
+
+    if rule.get('FREQ') not in FREQUENCIES or any(rule.get(part) for part in UNSUPPORTED_EXPANSION_PARTS):
+        return first_only()
+    try:
+        return _expand_rule(rule, exception_dates, local_start, occurrence, window_start, window_end, tz)
+    except (ValueError, OverflowError) as e:
+        logger.warning(f"Can't expand recurrence '{recurrence}', showing its first occurrence: {str(e)}")
+        return first_only()
+
+
+def series_end(recurrence, starts_at, ends_at, timezone_name="UTC"):
+    """
+    Find when a stored series is over, so ended series can be skipped in SQL.
+
+    Args:
+        recurrence (str): Stored recurrence text (see build_recurrence)
+        starts_at (datetime): Aware start of the first occurrence
+        ends_at (datetime): Aware end of the first occurrence (exclusive)
+        timezone_name (str): IANA timezone of the series
+
+    Returns:
+        datetime: Aware UTC end of the last occurrence plus SERIES_END_MARGIN,
+            or None if the series repeats without end
+    """
+    if not recurrence or starts_at is None or ends_at is None:
+        return None
+    rrule_line = next((line.strip() for line in recurrence.splitlines() if line.strip().startswith('RRULE:')), '')
+    rule = parse_rrule(rrule_line)
+    expandable = rule.get('FREQ') in FREQUENCIES and not any(rule.get(part) for part in UNSUPPORTED_EXPANSION_PARTS)
+    if expandable and not rule.get('COUNT') and not rule.get('UNTIL'):
+        return None
+
+    # Bounded by COUNT, UNTIL or MAX_EXPANSION_PERIODS, so this always stops
+    occurrences = expand_recurrence(recurrence, starts_at, ends_at, starts_at,
+                                    datetime.max.replace(tzinfo=timezone.utc) - SERIES_END_MARGIN, timezone_name)
+    last_end = max([end for _, end in occurrences] + [ends_at.astimezone(timezone.utc)])
+    return last_end + SERIES_END_MARGIN
+
+
+def _expand_rule(rule, exception_dates, local_start, occurrence, window_start, window_end, tz):
+    count = int(rule['COUNT']) if rule.get('COUNT', '').isdigit() else None
+    until = rule.get('UNTIL', '')
+    if re.match(r'^\d{8}T\d{6}Z$', until):
+        until_utc = datetime.strptime(until, '%Y%m%dT%H%M%SZ').replace(tzinfo=timezone.utc)
+    elif re.match(r'^\d{8}', until):
+        # A date or floating local date-time: the last day is inclusive
+        until_utc = datetime.combine(datetime.strptime(until[:8], '%Y%m%d').date() + timedelta(days=1), time(0),
+                                     tzinfo=tz).astimezone(timezone.utc) - timedelta(microseconds=1)
+    else:
+        until_utc = None
+
+    occurrences = []
+    for number, day in enumerate(_candidate_dates(rule, local_start.date()), 1):
+        if count is not None and number > count:
+            break
+        occurrence_start, occurrence_end = occurrence(day)
+        if (until_utc is not None and occurrence_start > until_utc) or occurrence_start >= window_end:
+            break
+        if day.strftime('%Y%m%d') in exception_dates:
+            continue
+        if occurrence_end > window_start or (occurrence_end == occurrence_start >= window_start):
+            occurrences.append((occurrence_start, occurrence_end))
+    return occurrences
+
+
+def describe_rrule(rrule_value):
+    """
+    Summarize an RRULE for humans, e.g. 'Repeats weekly on MO, WE'.
+
+    Args:
+        rrule_value (str): RRULE value, with or without the "RRULE:" prefix
+
+    Returns:
+        str: Short description
+    """
+    rule = parse_rrule(rrule_value)
+    frequency = {'DAILY': 'daily', 'WEEKLY': 'weekly', 'MONTHLY': 'monthly', 'YEARLY': 'yearly'}.get(
+        rule.get('FREQ'), rule.get('FREQ', '').lower())
+    interval = rule.get('INTERVAL', '1')
+    description = f"Repeats {frequency}" if interval == '1' else f"Repeats every {interval} ({frequency})"
+    if rule.get('BYDAY'):
+        description += f" on {rule['BYDAY'].replace(',', ', ')}"
+    if rule.get('COUNT'):
+        description += f", {rule['COUNT']} times"
+    elif rule.get('UNTIL'):
+        description += f" until {rule['UNTIL'][:4]}-{rule['UNTIL'][4:6]}-{rule['UNTIL'][6:8]}"
+    return description
+
+
+def describe_recurrence(recurrence):
+    """
+    Summarize stored recurrence text for display.
+
+    Args:
+        recurrence (str): Stored recurrence text
+
+    Returns:
+        str: e.g. 'Repeats weekly on TU, TH (2 skipped)', or '' if not recurring
+    """
+    if not recurrence:
+        return ''
+    description = ''
+    skipped = 0
+    for line in recurrence.splitlines():
+        if line.startswith('RRULE:'):
+            description = describe_rrule(line)
+        elif line.startswith('EXDATE'):
+            skipped += len([value for value in line.split(':', 1)[-1].split(',') if value])
+    if description and skipped:
+        description += f" ({skipped} skipped)"
+    return description
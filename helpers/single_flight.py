@@ -0,0 +1,233 @@
+import copy
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from app import app, db
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; cross-process coalescing is skipped there
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Single-flight coalescing for identical extractions. Within a process,
+# concurrent callers with the same key wait on one leader and share its
+# result. Across gunicorn workers the leader holds a Postgres advisory lock
+# (a file lock on other databases); callers elsewhere wait for it to be
+# released and then read the leader's result from the extraction cache.
+# A follower that gives up waiting runs the extraction itself, so the wait
+# plus one extraction (bounded by the 30s OpenAI timeout) has to fit inside
+# gunicorn's worker timeout with room to spare
+WORKER_TIMEOUT_SECONDS = float(os.environ.get("WORKER_TIMEOUT_SECONDS", 60))
+EXTRACTION_TIMEOUT_SECONDS = 30
+SINGLE_FLIGHT_WAIT_SECONDS = max(0.0, min(float(os.environ.get("SINGLE_FLIGHT_WAIT_SECONDS", 20)),
+                                          WORKER_TIMEOUT_SECONDS - EXTRACTION_TIMEOUT_SECONDS - 10))
+SINGLE_FLIGHT_POLL_SECONDS = float(os.environ.get("SINGLE_FLIGHT_POLL_SECONDS", 0.25))
+SINGLE_FLIGHT_LOCK_DIR = os.environ.get("SINGLE_FLIGHT_LOCK_DIR", os.path.join(tempfile.gettempdir(), "textbot-single-flight"))
+
+_lock = threading.Lock()
+_in_flight = {}  # key -> _Flight
+_stats = {
+    'leader_runs': 0,
+    'local_coalesced': 0,
+    'remote_coalesced': 0,
+    'remote_waits': 0,
+    'remote_wait_timeouts': 0,
+    'lock_errors': 0,
+}
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def _increment(counter):
+    with _lock:
+        _stats[counter] += 1
+
+
+class _AdvisoryLock:
+    """Session-level Postgres advisory lock held on a dedicated connection"""
+
+    def __init__(self, key):
+        self.lock_id = int(key[:15], 16)  # 60 bits of the hex cache key fit a signed bigint
+        self.conn = None
+
+    def try_acquire(self):
+        with app.app_context():
+            conn = db.engine.connect()
+        try:
+            acquired = conn.execute(db.text("SELECT pg_try_advisory_lock(:id)"), {'id': self.lock_id}).scalar()
+            conn.commit()
+        except Exception:
+            conn.close()
+            raise
+        if acquired:
+            self.conn = conn
+        else:
+            conn.close()
+        return bool(acquired)
+
+    def release(self):
+        try:
+            self.conn.execute(db.text("SELECT pg_advisory_unlock(:id)"), {'id': self.lock_id})
+            self.conn.commit()
+        except Exception:
+            # close() would return the connection to the pool with the lock
+            # still held; discarding it ends the session, which drops the lock
+            self.conn.invalidate()
+            raise
+        finally:
+            self.conn.close()
+            self.conn = None
+
+
+class _FileLock:
+    """Local stand-in for the advisory lock: an flock'd file per key"""
+
+    def __init__(self, key):
+        self.path = os.path.join(SINGLE_FLIGHT_LOCK_DIR, f"{key}.lock")
+        self.handle = None
+
+    def try_acquire(self):
+        os.makedirs(SINGLE_FLIGHT_LOCK_DIR, exist_ok=True)
+        handle = open(self.path, 'a')
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            handle.close()
+            return False
+        self.handle = handle
+        return True
+
+    def release(self):
+        try:
+            # Unlinking first can only cost a missed coalesce, never a deadlock
+            os.remove(self.path)
+        except OSError:
+            pass
+        try:
+            fcntl.flock(self.handle, fcntl.LOCK_UN)
+        finally:
+            self.handle.close()
+            self.handle = None
+
+
+def _make_process_lock(key):
+    with app.app_context():
+        dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        return _AdvisoryLock(key)
+    if fcntl is not None:
+        return _FileLock(key)
+    return None
+
+
+def _run_as_process_leader(key, compute, lookup):
+    """Hold the cross-process lock while computing, or reuse another worker's result"""
+    try:
+        process_lock = _make_process_lock(key)
+        acquired = process_lock.try_acquire() if process_lock else True
+    except Exception as e:
+        logger.warning(f"Single-flight lock unavailable for {key[:12]}, extracting without it: {str(e)}")
+        _increment('lock_errors')
+        process_lock, acquired = None, True
+
+    if not acquired:
+        # Another worker is extracting the same text; wait for it to finish
+        _increment('remote_waits')
+        deadline = time.monotonic() + SINGLE_FLIGHT_WAIT_SECONDS
+        while not acquired and time.monotonic() < deadline:
+            time.sleep(SINGLE_FLIGHT_POLL_SECONDS)
+            try:
+                acquired = process_lock.try_acquire()
+            except Exception as e:
+                logger.warning(f"Single-flight lock check failed for {key[:12]}: {str(e)}")
+                _increment('lock_errors')
+                break
+
+        if not acquired:
+            _increment('remote_wait_timeouts')
+            process_lock = None
+
+        shared = lookup()
+        if shared is not None:
+            _increment('remote_coalesced')
+            logger.info(f"Reused extraction {key[:12]} finished by another worker")
+            if process_lock:
+                process_lock.release()
+            return shared, True
+
+    _increment('leader_runs')
+    try:
+        return compute(), False
+    finally:
+        if process_lock and acquired:
+            try:
+                process_lock.release()
+            except Exception as e:
+                logger.warning(f"Failed to release single-flight lock for {key[:12]}: {str(e)}")
+
+
+def single_flight(key, compute, lookup):
+    """
+    Run compute once for concurrent callers with the same key.
+
+    Args:
+        key (str): Hex digest identifying the work (the extraction cache key)
+        compute (callable): Does the work and returns its result
+        lookup (callable): Returns a result another process already stored
+            for this key, or None
+
+    Returns:
+        tuple: (result, coalesced) where coalesced is True if the result came
+            from another caller's flight (a deep copy) or from lookup
+    """
+    with _lock:
+        flight = _in_flight.get(key)
+        leader = flight is None
+        if leader:
+            flight = _in_flight[key] = _Flight()
+        else:
+            _stats['local_coalesced'] += 1
+
+    if not leader:
+        logger.info(f"Joining in-flight extraction {key[:12]}")
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return copy.deepcopy(flight.result), True
+
+    try:
+        result, coalesced = _run_as_process_leader(key, compute, lookup)
+        # Followers get their own copy; callers mutate the returned events
+        flight.result = copy.deepcopy(result)
+        return result, coalesced
+    except Exception as e:
+        flight.error = e
+        raise
+    finally:
+        with _lock:
+            _in_flight.pop(key, None)
+        flight.done.set()
+
+
+def get_single_flight_stats():
+    """
+    Get coalescing counters for this process.
+
+    Returns:
+        dict: Leader runs, requests coalesced locally and across workers,
+            waits and lock errors
+    """
+    with _lock:
+        stats = dict(_stats)
+        stats['in_flight'] = len(_in_flight)
+    return stats
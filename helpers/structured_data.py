@@ -0,0 +1,331 @@
+import json
+import logging
+import re
+from datetime import datetime
+from html.parser import HTMLParser
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+logger = logging.getLogger(__name__)
+
+JSON_LD_PATTERN = re.compile(
+    r'<script[^>]*type=["\']?application/ld\+json["\']?[^>]*>(.*?)</script>', re.IGNORECASE | re.DOTALL)
+
+# schema.org types mapped to calendar events, with the emoji used for the event name
+RESERVATION_EMOJI = {
+    'FlightReservation': '✈️',
+    'LodgingReservation': '🏨',
+    'EventReservation': '🎟️',
+    'FoodEstablishmentReservation': '🍽️',
+    'RentalCarReservation': '🚗',
+    'TrainReservation': '🚆',
+    'BusReservation': '🚌',
+    'BoatReservation': '⛴️',
+    'TaxiReservation': '🚕',
+}
+CANCELLED_STATUSES = ('ReservationCancelled', 'Cancelled')
+
+
+class _MicrodataParser(HTMLParser):
+    """Collects itemscope/itemprop microdata into nested dicts"""
+
+    VOID_TAGS = {'meta', 'link', 'img', 'br', 'hr', 'input', 'source', 'area', 'base', 'col', 'embed', 'wbr'}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.items = []
+        self.stack = []
+
+    def _current_item(self):
+        for frame in reversed(self.stack):
+            if frame['item'] is not None:
+                return frame['item']
+        return None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        itemprop = (attrs.get('itemprop') or '').split()
+        parent = self._current_item()
+        frame = {'tag': tag, 'item': None, 'capture': None}
+
+        if 'itemscope' in attrs:
+            item = {'@type': (attrs.get('itemtype') or '').rstrip('/').split('/')[-1]}
+            if itemprop and parent is not None:
+                for name in itemprop:
+                    parent.setdefault(name, item)
+            else:
+                self.items.append(item)
+            frame['item'] = item
+        elif itemprop and parent is not None:
+            value = next((attrs[key] for key in ('content', 'datetime', 'href', 'src') if attrs.get(key)), None)
+            if value is not None or tag in self.VOID_TAGS:
+                for name in itemprop:
+                    parent.setdefault(name, value or '')
+            else:
+                frame['capture'] = (parent, itemprop, [])
+
+        if tag not in self.VOID_TAGS:
+            self.stack.append(frame)
+
+    def handle_endtag(self, tag):
+        if not any(frame['tag'] == tag for frame in self.stack):
+            return
+        while self.stack:
+            frame = self.stack.pop()
+            if frame['capture']:
+                parent, names, parts = frame['capture']
+                text = ' '.join(''.join(parts).split())
+                for name in names:
+                    parent.setdefault(name, text)
+            if frame['tag'] == tag:
+                break
+
+    def handle_data(self, data):
+        for frame in self.stack:
+            if frame['capture']:
+                frame['capture'][2].append(data)
+
+
+def _flatten_json_ld(node):
+    if isinstance(node, list):
+        for child in node:
+            yield from _flatten_json_ld(child)
+    elif isinstance(node, dict):
+        if '@graph' in node:
+            yield from _flatten_json_ld(node['@graph'])
+        else:
+            yield node
+
+
+def find_structured_items(html_body):
+    """
+    Pull schema.org items out of an HTML email body.
+
+    Args:
+        html_body (str): HTML source
+
+    Returns:
+        list: JSON-LD objects and microdata items (as JSON-LD style dicts)
+    """
+    items = []
+    for match in JSON_LD_PATTERN.finditer(html_body):
+        raw = match.group(1).strip()
+        raw = re.sub(r'^\s*(?:<!--|<!\[CDATA\[)|(?:-->|\]\]>)\s*$', '', raw)
+        try:
+            items.extend(_flatten_json_ld(json.loads(raw)))
+        except ValueError as e:
+            logger.warning(f"Skipping invalid JSON-LD block: {str(e)}")
+
+    if 'itemscope' in html_body:
+        parser = _MicrodataParser()
+        try:
+            parser.feed(html_body)
+            parser.close()
+            items.extend(parser.items)
+        except Exception as e:
+            logger.warning(f"Microdata parsing failed: {str(e)}")
+
+    return items
+
+
+def _type_of(node):
+    node_type = node.get('@type') if isinstance(node, dict) else None
+    if isinstance(node_type, list):
+        node_type = node_type[0] if node_type else None
+    return str(node_type).rstrip('/').split('/')[-1] if node_type else None
+
+
+def _name(value):
+    if isinstance(value, dict):
+        return _name(value.get('name'))
+    if isinstance(value, list):
+        return _name(value[0]) if value else None
+    return str(value).strip() if value else None
+
+
+def _person_names(value):
+    """List the names in an underName Person/Organization, or a list of them"""
+    names = []
+    for person in value if isinstance(value, list) else [value]:
+        if isinstance(person, dict) and not person.get('name'):
+            name = ' '.join(str(person[key]).strip() for key in ('givenName', 'familyName') if person.get(key))
+        else:
+            name = _name(person)
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def _place(value):
+    """Format a Place/Airport/LodgingBusiness as 'Name, address'"""
+    if not isinstance(value, dict):
+        return _name(value)
+    parts = [_name(value.get('name'))]
+    address = value.get('address')
+    if isinstance(address, dict):
+        parts.extend(str(address.get(key)).strip() for key in
+                     ('streetAddress', 'addressLocality', 'addressRegion', 'postalCode', 'addressCountry')
+                     if address.get(key) and not isinstance(address.get(key), dict))
+    elif address:
+        parts.append(str(address).strip())
+    return ', '.join(part for part in parts if part) or None
+
+
+def _airport(value):
+    if not isinstance(value, dict):
+        return _name(value)
+    return value.get('iataCode') or _name(value)
+
+
+def _parse_time(value, user_tz):
+    """
+    Parse an ISO 8601 schema.org date/time.
+
+    Returns:
+        tuple: (date, time, datetime) strings, plus whether the value is
+            unambiguous (a plain date, or a time with a UTC offset)
+    """
+    if not value:
+        return (None, None, None), False
+    value = str(value).strip()
+    if re.match(r'^\d{4}-\d{2}-\d{2}$', value):
+        return (value, None, None), True
+    try:
+        parsed = datetime.fromisoformat(value[:-1] + '+00:00' if value.endswith('Z') else value)
+    except ValueError:
+        return (None, None, None), False
+
+    if parsed.tzinfo is None:
+        # Local to the venue, which we can't resolve without a timezone database for places
+        return (parsed.strftime('%Y-%m-%d'), parsed.strftime('%H:%M'), None), False
+
+    local = parsed.astimezone(user_tz)
+    return (local.strftime('%Y-%m-%d'), local.strftime('%H:%M'), local.isoformat()), True
+
+
+def _reservation_to_event(node, user_tz):
+    """
+    Map one schema.org reservation (or bare Event) to an event dict.
+
+    Returns:
+        tuple: (event dict or None, complete) where complete means every time was unambiguous
+    """
+    node_type = _type_of(node)
+    target = node.get('reservationFor') if isinstance(node.get('reservationFor'), dict) else {}
+    confirmation = node.get('reservationNumber') or node.get('confirmationNumber')
+
+    if node_type == 'FlightReservation':
+        airline = target.get('airline') if isinstance(target.get('airline'), dict) else {}
+        flight_number = str(target.get('flightNumber') or '').strip()
+        if flight_number and airline.get('iataCode') and not flight_number.startswith(airline['iataCode']):
+            flight_number = f"{airline['iataCode']}{flight_number}"
+        origin = _airport(target.get('departureAirport'))
+        destination = _airport(target.get('arrivalAirport'))
+        name = f"Flight {flight_number}".strip() + (f" {origin} → {destination}" if origin and destination else "")
+        start, end = target.get('departureTime'), target.get('arrivalTime')
+        location = _place(target.get('departureAirport'))
+        details = [_name(airline), f"Terminal {target['departureTerminal']}" if target.get('departureTerminal') else None,
+                   f"Gate {target['departureGate']}" if target.get('departureGate') else None]
+    elif node_type == 'LodgingReservation':
+        name = f"Stay at {_name(target) or 'hotel'}"
+        start, end = node.get('checkinTime') or node.get('checkinDate'), node.get('checkoutTime') or node.get('checkoutDate')
+        location = _place(target)
+        details = []
+    elif node_type in ('FoodEstablishmentReservation', 'TaxiReservation'):
+        name = f"Reservation at {_name(target)}" if _name(target) else "Reservation"
+        start, end = node.get('startTime') or node.get('pickupTime'), node.get('endTime')
+        location = _place(target) or _place(node.get('pickupLocation'))
+        details = [f"Party of {node['partySize']}" if node.get('partySize') else None]
+    elif node_type == 'RentalCarReservation':
+        name = f"Car rental: {_name(target.get('rentalCompany')) or _name(target) or 'pickup'}"
+        start, end = node.get('pickupTime'), node.get('dropoffTime')
+        location = _place(node.get('pickupLocation'))
+        details = [f"Drop-off: {_place(node.get('dropoffLocation'))}" if node.get('dropoffLocation') else None]
+    elif node_type in ('TrainReservation', 'BusReservation', 'BoatReservation'):
+        origin = _name(target.get('departureStation') or target.get('departureBusStop') or target.get('departureBoatTerminal'))
+        destination = _name(target.get('arrivalStation') or target.get('arrivalBusStop') or target.get('arrivalBoatTerminal'))
+        number = target.get('trainNumber') or target.get('busNumber') or ''
+        kind = {'TrainReservation': 'Train', 'BusReservation': 'Bus', 'BoatReservation': 'Ferry'}[node_type]
+        name = f"{kind} {number}".strip() + (f" {origin} → {destination}" if origin and destination else "")
+        start, end = target.get('departureTime'), target.get('arrivalTime')
+        location = origin
+        details = [f"Platform {target['departurePlatform']}" if target.get('departurePlatform') else None]
+    elif node_type == 'EventReservation' or (node_type or '').endswith('Event'):
+        event_node = target if node_type == 'EventReservation' else node
+        name = _name(event_node) or "Event"
+        start, end = event_node.get('startDate'), event_node.get('endDate')
+        location = _place(event_node.get('location'))
+        details = [event_node.get('description') if isinstance(event_node.get('description'), str) else None]
+        node_type = 'EventReservation'
+    else:
+        # A reservation type we can't map; let the LLM read the email
+        return None, False
+
+    (start_date, start_time, start_datetime), start_complete = _parse_time(start, user_tz)
+    (end_date, end_time, end_datetime), end_complete = _parse_time(end, user_tz) if end else ((None, None, None), True)
+    if not start_date:
+        return None, False
+
+    details.append(f"Confirmation: {confirmation}" if confirmation else None)
+    return {
+        'event_name': name,
+        'event_description': '\n'.join(str(detail) for detail in details if detail),
+        'start_date': start_date,
+        'start_time': start_time,
+        'start_datetime': start_datetime,
+        'end_date': end_date,
+        'end_time': end_time,
+        'end_datetime': end_datetime,
+        'location': location,
+        'emoji': RESERVATION_EMOJI.get(node_type),
+    }, start_complete and end_complete
+
+
+def extract_structured_events(html_body, user_timezone="UTC"):
+    """
+    Map schema.org reservation markup (JSON-LD or microdata) in an HTML email
+    onto event dicts shaped like extract_events_from_text output.
+
+    Args:
+        html_body (str): HTML email body
+        user_timezone (str): User's timezone
+
+    Returns:
+        tuple: (list of events, complete) where complete is True only if
+            reservations were found and every one mapped with unambiguous times,
+            in which case the LLM can be skipped
+    """
+    if not html_body:
+        return [], False
+
+    try:
+        user_tz = ZoneInfo(user_timezone or "UTC")
+    except (ZoneInfoNotFoundError, ValueError):
+        user_tz = ZoneInfo("UTC")
+
+    events = {}
+    travelers = {}
+    found = False
+    complete = True
+    for item in find_structured_items(html_body):
+        node_type = _type_of(item)
+        if not node_type or not (node_type.endswith('Reservation') or node_type.endswith('Event')):
+            continue
+        found = True
+        if str(item.get('reservationStatus') or '').rstrip('/').split('/')[-1] in CANCELLED_STATUSES:
+            continue
+
+        event, event_complete = _reservation_to_event(item, user_tz)
+        complete = complete and event_complete
+        if event:
+            # One reservation per passenger, and JSON-LD plus microdata, describe the same event
+            key = (event['event_name'], event['start_date'], event['start_time'])
+            events.setdefault(key, event)
+            names = travelers.setdefault(key, [])
+            names.extend(name for name in _person_names(item.get('underName')) if name not in names)
+
+    for key, event in events.items():
+        if travelers[key]:
+            reserved_for = f"Reserved for: {', '.join(travelers[key])}"
+            event['event_description'] = '\n'.join(line for line in (reserved_for, event['event_description']) if line)
+
+    return list(events.values()), found and complete
@@ -0,0 +1,76 @@
+import logging
+import os
+import zlib
+
+try:
+    import zstandard
+except ImportError:  # Optional; zlib is used when zstandard isn't installed
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# Codec for newly stored text. Every row records its own codec, so switching
+# codecs (or losing zstandard) never makes older rows unreadable with zlib.
+TEXT_COMPRESSION = os.environ.get("TEXT_COMPRESSION", "zstd" if zstandard else "zlib")
+TEXT_COMPRESSION_LEVEL = int(os.environ.get("TEXT_COMPRESSION_LEVEL", 6))
+MIN_COMPRESS_BYTES = 256  # Shorter texts are stored as-is; headers would eat the savings
+
+
+def compress_text(text):
+    """
+    Compress text for storage.
+
+    Args:
+        text (str): Text to store
+
+    Returns:
+        tuple: (codec, compressed bytes) where codec is 'zstd', 'zlib' or 'none'
+    """
+    raw = (text or '').encode('utf-8')
+    if len(raw) < MIN_COMPRESS_BYTES:
+        return 'none', raw
+
+    codec = TEXT_COMPRESSION
+    if codec == 'zstd' and zstandard is None:
+        logger.warning("TEXT_COMPRESSION is zstd but zstandard isn't installed, using zlib")
+        codec = 'zlib'
+
+    if codec == 'zstd':
+        data = zstandard.ZstdCompressor(level=TEXT_COMPRESSION_LEVEL).compress(raw)
+    elif codec == 'zlib':
+        data = zlib.compress(raw, TEXT_COMPRESSION_LEVEL)
+    else:
+        return 'none', raw
+
+    if len(data) >= len(raw):
+        return 'none', raw
+    return codec, data
+
+
+def decompress_text(codec, data):
+    """
+    Reverse compress_text.
+
+    Args:
+        codec (str): Codec recorded with the data
+        data (bytes): Stored bytes
+
+    Returns:
+        str: Original text
+
+    Raises:
+        ValueError: If the codec is unknown or zstandard is needed but missing
+    """
+    if data is None:
+        return None
+    if codec == 'none':
+        raw = bytes(data)
+    elif codec == 'zlib':
+        raw = zlib.decompress(data)
+    elif codec == 'zstd':
+        if zstandard is None:
+            raise ValueError("Text is zstd-compressed but zstandard isn't installed")
+        raw = zstandard.ZstdDecompressor().decompress(data)
+    else:
+        raise ValueError(f"Unknown text codec: {codec}")
+    return raw.decode('utf-8')
@@ -38,3 +38,123 @@ def sanitize_text_for_db(text):
         sanitized = sanitized[:max_length] + "... [truncated]"
 
     return sanitized
+
+
+# Lines that start a new logical section: forwarded/quoted email parts,
+# markdown-style headings and itinerary segment headers
+SECTION_BOUNDARY_PATTERN = re.compile(
+    r'^(?:-{2,}\s*(?:Forwarded message|Original Message)\s*-{2,}'
+    r'|Begin forwarded message:'
+    r'|From:\s'
+    r'|#{1,6}\s'
+    r'|(?:Flight|Segment|Leg|Day|Trip|Reservation|Booking|Hotel|Check-in)\b[^\n]{0,60}$)',
+    re.IGNORECASE | re.MULTILINE)
+
+
+# Lines every chunk needs to be read correctly: the email header (the sent
+# date resolves "tomorrow", the sender and subject give context) and the
+# traveler names that go into event names
+CONTEXT_HEADER_PATTERN = re.compile(r'^\s*(?:From|To|Cc|Date|Sent|Subject):[^\n]*$', re.IGNORECASE | re.MULTILINE)
+CONTEXT_TRAVELER_PATTERN = re.compile(
+    r'^\s*(?:Passengers?|Travell?ers?|Guests?)\b[^\n:]{0,20}:[^\n]*$',
+    re.IGNORECASE | re.MULTILINE)
+
+
+def extract_shared_context(text, max_chars=1000):
+    """
+    Collect the header and traveler lines of a long text, to be repeated
+    with every chunk of it.
+
+    Args:
+        text (str): Full text
+        max_chars (int): Maximum length of the context
+
+    Returns:
+        str: Context lines in text order, or '' if there are none
+    """
+    matches = sorted(list(CONTEXT_HEADER_PATTERN.finditer(text)) + list(CONTEXT_TRAVELER_PATTERN.finditer(text)),
+                     key=lambda match: match.start())
+    lines = []
+    length = 0
+    for match in matches:
+        line = match.group(0).strip()
+        if line in lines:
+            continue
+        if length + len(line) + 1 > max_chars:
+            break
+        lines.append(line)
+        length += len(line) + 1
+    return "\n".join(lines)
+
+
+def _split_long_line(line, target_chars):
+    """Cut a line longer than target_chars, preferring whitespace near the end of each piece"""
+    pieces = []
+    while len(line) > target_chars:
+        cut = line.rfind(' ', target_chars // 2, target_chars)
+        cut = cut + 1 if cut != -1 else target_chars
+        pieces.append(line[:cut])
+        line = line[cut:]
+    if line:
+        pieces.append(line)
+    return pieces
+
+
+def split_text_into_chunks(text, target_chars):
+    """
+    Split long text into chunks of roughly target_chars, cutting on natural
+    boundaries (email parts, headings, itinerary segments, then blank lines)
+    so a single event is unlikely to straddle two chunks.
+
+    Args:
+        text (str): Text to split
+        target_chars (int): Preferred maximum chunk length
+
+    Returns:
+        list: Non-empty chunks in original order
+    """
+    if len(text) <= target_chars:
+        return [text]
+
+    # Break into sections at boundary lines, then into paragraphs if still too large
+    starts = sorted({0} | {match.start() for match in SECTION_BOUNDARY_PATTERN.finditer(text)})
+    sections = [text[start:end] for start, end in zip(starts, starts[1:] + [len(text)])]
+
+    pieces = []
+    for section in sections:
+        if len(section) <= target_chars:
+            pieces.append(section)
+            continue
+        for paragraph in re.split(r'(?<=\n)\s*\n', section):
+            if len(paragraph) <= target_chars:
+                pieces.append(paragraph)
+                continue
+            # Last resort: hard split on line boundaries
+            current = ""
+            for line in paragraph.splitlines(keepends=True):
+                if len(line) > target_chars:
+                    # Not even a line fits (e.g. HTML flattened to one line)
+                    if current:
+                        pieces.append(current)
+                        current = ""
+                    pieces.extend(_split_long_line(line, target_chars))
+                    continue
+                if current and len(current) + len(line) > target_chars:
+                    pieces.append(current)
+                    current = ""
+                current += line
+            if current:
+                pieces.append(current)
+
+    # Greedily pack adjacent pieces back together up to the target size
+    chunks = []
+    current = ""
+    for piece in pieces:
+        if current and len(current) + len(piece) > target_chars:
+            chunks.append(current)
+            current = ""
+        current += piece if not current or current.endswith("\n") else "\n" + piece
+    if current:
+        chunks.append(current)
+
+    return [chunk.strip() for chunk in chunks if chunk.strip()]
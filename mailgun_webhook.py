@@ -7,11 +7,13 @@ from datetime import datetime
 from flask import Blueprint, request, jsonify
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-import requests
-from models import User, Event
+from helpers import http_client
+from sqlalchemy.exc import IntegrityError
+from models import User, Event, MailgunInbox
 from helpers.event_processing import process_text_to_events
 from helpers.event_utils import format_event_for_api
 from helpers.domain_utils import get_base_url
+from helpers.ics_import import is_calendar_attachment, ICS_MAX_BYTES
 from app import db
 import sentry_sdk
 
@@ -45,7 +47,7 @@ def send_signup_email_with_events(recipient_email, events_data, original_subject
         # Create HTML email with events
         html_content = generate_signup_email_html(events_data, recipient_email, original_subject)
 
-        response = requests.post(
+        response = http_client.post(
             f"{MAILGUN_API_URL}/messages",
             auth=("api", MAILGUN_API_KEY),
             data={
@@ -192,7 +194,7 @@ def send_confirmation_email(recipient_email, events_count, synced_count):
         </html>
         """
 
-        response = requests.post(
+        response = http_client.post(
             f"{MAILGUN_API_URL}/messages",
             auth=("api", MAILGUN_API_KEY),
             data={
@@ -218,7 +220,13 @@ def send_confirmation_email(recipient_email, events_count, synced_count):
 
 @mailgun_webhook.route("/webhook/mailgun", methods=["POST"])
 def handle_mailgun_webhook():
-    """Handle incoming emails from Mailgun"""
+    """
+    Accept incoming emails from Mailgun.
+
+    Only verifies the signature and persists the payload to the inbox table;
+    mailgun_worker.py does the extraction, sync and reply emails. Returning
+    quickly keeps Mailgun from timing out and retrying the delivery.
+    """
     try:
         # Verify webhook signature
         token = request.form.get('token', '')
@@ -229,171 +237,236 @@ def handle_mailgun_webhook():
             logger.warning("Invalid webhook signature")
             return jsonify({"error": "Invalid signature"}), 401
 
-        # Extract email data
-        sender_email = request.form.get('sender', '').lower().strip()
-        recipient = request.form.get('recipient', '')
-        subject = request.form.get('subject', '')
-        body_plain = request.form.get('body-plain', '')
-        body_html = request.form.get('body-html', '')
+        payload = request.form.to_dict()
+        sender_email = payload.get('sender', '').lower().strip()
+        subject = payload.get('subject', '')
+        email_text = payload.get('body-plain', '') or payload.get('body-html', '')
 
-        # Use plain text, fallback to HTML if available
-        email_text = body_plain or body_html or ""
+        calendar_parts = read_calendar_attachments(request.files)
+        if calendar_parts:
+            payload['calendar-parts'] = calendar_parts
 
-        if not sender_email or not email_text.strip():
+        if not sender_email or not (email_text.strip() or calendar_parts):
             logger.warning(f"Missing sender or email content: sender={sender_email}")
             return jsonify({"error": "Missing required email data"}), 400
 
-        logger.info(f"Processing email from {sender_email}, subject: {subject}")
-
-        # Process text to events using helper function
-        formatted_text = f"From: {sender_email}\nSubject: {subject}\n\n{email_text}"
-
-        # Check if sender is an existing user (including temp users)
-        user = User.query.filter_by(email=sender_email).first()
-
-        if user:
-            # Check if this is a temp user (no google_id) or real user
-            if user.google_id is None:
-                # This is a temp user - add events and send signup email
-                try:
-                    result = process_text_to_events(
-                        formatted_text, 
-                        user, 
-                        source_type="email", 
-                        auto_sync=False  # Don't auto-sync for temp users
-                    )
-
-                    events_count = len(result['events'])
-
-                    logger.info(f"Added {events_count} events to existing temp user {user.id}")
-
-                    # Format events data for email
-                    events_data = []
-                    for event in result['events']:
-                        events_data.append({
-                            'event_name': event.event_name,
-                            'event_description': event.event_description,
-                            'start_date': event.start_date.strftime('%Y-%m-%d') if event.start_date else None,
-                            'start_time': event.start_time.strftime('%H:%M') if event.start_time else None,
-                            'end_date': event.end_date.strftime('%Y-%m-%d') if event.end_date else None,
-                            'end_time': event.end_time.strftime('%H:%M') if event.end_time else None,
-                            'location': event.location
-                        })
-
-                    # Send signup email with all events (new + existing)
-                    send_signup_email_with_events(sender_email, events_data, subject)
-
-                    return jsonify({
-                        "status": "signup_sent",
-                        "email": sender_email,
-                        "temp_user_id": user.id,
-                        "text_input_id": result['text_input'].id,
-                        "events_extracted": events_count,
-                        "events_saved": events_count
-                    }), 200
-
-                except Exception as e:
-                    logger.error(f"Error processing email for temp user {sender_email}: {str(e)}")
-                    sentry_sdk.capture_exception(e)
-                    return jsonify({"error": "Failed to process email"}), 500
-            else:
-                # This is a real user with google_id - process and send confirmation
-                try:
-                    result = process_text_to_events(
-                        formatted_text, 
-                        user, 
-                        source_type="email", 
-                        auto_sync=True
-                    )
-
-                    events_count = len(result['events'])
-                    synced_count = result['synced_count']
-
-                    logger.info(f"Processed {events_count} events for existing user {user.id}, synced {synced_count}")
-
-                    # Send confirmation email
-                    send_confirmation_email(sender_email, events_count, synced_count)
-
-                    return jsonify({
-                        "status": "success",
-                        "user_id": user.id,
-                        "events_extracted": events_count,
-                        "events_synced": synced_count
-                    }), 200
-
-                except Exception as e:
-                    logger.error(f"Error processing email for existing user {sender_email}: {str(e)}")
-                    sentry_sdk.capture_exception(e)
-                    return jsonify({"error": "Failed to process email"}), 500
-
-        else:
-            # Handle new user - extract events, save to database, and send signup email
-            try:
-                # Create a temporary user record for data storage
-                temp_user = User()
-                temp_user.email = sender_email
-                temp_user.username = f"temp_{sender_email.replace('@', '_').replace('.', '_')}"
-                temp_user.timezone = "UTC"
-                temp_user.google_id = None
-                temp_user.google_token = None
-
-                # Add temp user to session but don't commit yet
-                db.session.add(temp_user)
-                db.session.flush()  # Get the user ID without committing
-
-                result = process_text_to_events(
-                    formatted_text, 
-                    temp_user, 
-                    source_type="email", 
-                    auto_sync=False  # Don't auto-sync for temp users
-                )
-
-                events_count = len(result['events'])
-
-                # Commit the database changes
-                db.session.commit()
-
-                logger.info(f"Extracted and saved {events_count} events for new user {sender_email}")
-
-                # Format events data for email
-                events_data = []
-                for event in result['events']:
-                    events_data.append({
-                        'event_name': event.event_name,
-                        'event_description': event.event_description,
-                        'start_date': event.start_date.strftime('%Y-%m-%d') if event.start_date else None,
-                        'start_time': event.start_time.strftime('%H:%M') if event.start_time else None,
-                        'end_date': event.end_date.strftime('%Y-%m-%d') if event.end_date else None,
-                        'end_time': event.end_time.strftime('%H:%M') if event.end_time else None,
-                        'location': event.location
-                    })
-
-                # Send signup email with extracted events
-                send_signup_email_with_events(sender_email, events_data, subject)
-
-                return jsonify({
-                    "status": "signup_sent",
-                    "email": sender_email,
-                    "temp_user_id": temp_user.id,
-                    "text_input_id": result['text_input'].id,
-                    "events_extracted": events_count,
-                    "events_saved": events_count
-                }), 200
-
-            except Exception as e:
-                logger.error(f"Error processing email for new user {sender_email}: {str(e)}")
-                sentry_sdk.capture_exception(e)
-                db.session.rollback()
-
-                # Send basic signup email even if extraction fails
-                send_signup_email_with_events(sender_email, [], subject)
-                return jsonify({"status": "signup_sent_with_error"}), 200
+        # Mailgun retries reuse the original Message-Id, so it doubles as an idempotency key
+        message_id = (payload.get('Message-Id') or '').strip() or None
+        if message_id:
+            existing = MailgunInbox.query.filter_by(message_id=message_id).first()
+            if existing:
+                logger.info(f"Duplicate delivery of {message_id}, already queued as inbox {existing.id}")
+                return jsonify({"status": "duplicate", "inbox_id": existing.id}), 200
+
+        inbox = MailgunInbox()
+        inbox.message_id = message_id
+        inbox.sender = sender_email
+        inbox.subject = subject
+        inbox.payload_json = json.dumps(payload)
+        inbox.status = 'pending'
+
+        try:
+            db.session.add(inbox)
+            db.session.commit()
+        except IntegrityError:
+            # A concurrent retry of the same message won the insert
+            db.session.rollback()
+            existing = MailgunInbox.query.filter_by(message_id=message_id).first()
+            return jsonify({"status": "duplicate", "inbox_id": existing.id if existing else None}), 200
+
+        logger.info(f"Queued email from {sender_email} as inbox {inbox.id}, subject: {subject}")
+        return jsonify({"status": "queued", "inbox_id": inbox.id}), 200
 
     except Exception as e:
         logger.error(f"Webhook processing error: {str(e)}")
         sentry_sdk.capture_exception(e)
+        db.session.rollback()
         return jsonify({"error": "Internal server error"}), 500
 
+def read_calendar_attachments(files):
+    """
+    Read iCalendar attachments from the webhook upload so they can be stored
+    with the payload; other attachments are ignored.
+
+    Args:
+        files: request.files from the Mailgun webhook
+
+    Returns:
+        list: Decoded iCalendar documents
+    """
+    calendar_parts = []
+    for attachment in files.values():
+        if not is_calendar_attachment(attachment.filename, attachment.content_type):
+            continue
+        content = attachment.read(ICS_MAX_BYTES + 1)
+        if len(content) > ICS_MAX_BYTES:
+            logger.warning(f"Ignoring oversized calendar attachment {attachment.filename}")
+            continue
+        calendar_parts.append(content.decode('utf-8', errors='replace'))
+
+    if calendar_parts:
+        logger.info(f"Found {len(calendar_parts)} calendar attachment(s)")
+    return calendar_parts
+
+def format_events_for_email(events):
+    """Format Event objects for the signup email template"""
+    events_data = []
+    for event in events:
+        events_data.append({
+            'event_name': event.event_name,
+            'event_description': event.event_description,
+            'start_date': event.start_date.strftime('%Y-%m-%d') if event.start_date else None,
+            'start_time': event.start_time.strftime('%H:%M') if event.start_time else None,
+            'end_date': event.end_date.strftime('%Y-%m-%d') if event.end_date else None,
+            'end_time': event.end_time.strftime('%H:%M') if event.end_time else None,
+            'location': event.location
+        })
+    return events_data
+
+def process_inbound_email(payload):
+    """
+    Extract events from a queued Mailgun payload and notify the sender.
+    Called by mailgun_worker.py for each claimed inbox row.
+
+    Args:
+        payload (dict): Webhook form fields as stored in MailgunInbox.payload_json
+
+    Returns:
+        dict: Processing summary stored on the inbox row
+
+    Raises:
+        Exception: If processing failed and the message should be retried
+    """
+    sender_email = payload.get('sender', '').lower().strip()
+    subject = payload.get('subject', '')
+    body_plain = payload.get('body-plain', '')
+    body_html = payload.get('body-html', '')
+
+    # Use plain text, fallback to HTML if available (converted to text during normalization)
+    email_text = body_plain or body_html or ""
+    # Calendar attachments are imported directly instead of going through the LLM
+    calendar_parts = payload.get('calendar-parts') or []
+
+    if not sender_email or not (email_text.strip() or calendar_parts):
+        raise ValueError("Missing required email data")
+
+    logger.info(f"Processing email from {sender_email}, subject: {subject}")
+
+    # Process text to events using helper function
+    formatted_text = f"From: {sender_email}\nSubject: {subject}\n\n{email_text}"
+
+    # Check if sender is an existing user (including temp users)
+    user = User.query.filter_by(email=sender_email).first()
+
+    if user:
+        # Check if this is a temp user (no google_id) or real user
+        if user.google_id is None:
+            # This is a temp user - add events and send signup email
+            result = process_text_to_events(
+                formatted_text,
+                user,
+                source_type="email",
+                calendar_parts=calendar_parts,
+                html_body=body_html,
+                auto_sync=False  # Don't auto-sync for temp users
+            )
+
+            events_count = len(result['events'])
+
+            logger.info(f"Added {events_count} events to existing temp user {user.id}")
+
+            # Send signup email with all events (new + existing)
+            send_signup_email_with_events(sender_email, format_events_for_email(result['events']), subject)
+
+            return {
+                "status": "signup_sent",
+                "email": sender_email,
+                "temp_user_id": user.id,
+                "text_input_id": result['text_input'].id,
+                "events_extracted": events_count,
+                "events_saved": events_count,
+                "normalization": result.get('normalization')
+            }
+
+        # This is a real user with google_id - process and send confirmation
+        result = process_text_to_events(
+            formatted_text,
+            user,
+            source_type="email",
+            calendar_parts=calendar_parts,
+            html_body=body_html,
+            auto_sync=True,
+            defer_sync=False  # Already in the background worker; sync now so the email reports it
+        )
+
+        events_count = len(result['events'])
+        synced_count = result['synced_count']
+
+        logger.info(f"Processed {events_count} events for existing user {user.id}, synced {synced_count}")
+
+        # Send confirmation email
+        send_confirmation_email(sender_email, events_count, synced_count)
+
+        return {
+            "status": "success",
+            "user_id": user.id,
+            "events_extracted": events_count,
+            "events_synced": synced_count,
+            "normalization": result.get('normalization')
+        }
+
+    # Handle new user - extract events, save to database, and send signup email
+    try:
+        # Create a temporary user record for data storage
+        temp_user = User()
+        temp_user.email = sender_email
+        temp_user.username = f"temp_{sender_email.replace('@', '_').replace('.', '_')}"
+        temp_user.timezone = "UTC"
+        temp_user.google_id = None
+        temp_user.google_token = None
+
+        # Add temp user to session but don't commit yet
+        db.session.add(temp_user)
+        db.session.flush()  # Get the user ID without committing
+
+        result = process_text_to_events(
+            formatted_text,
+            temp_user,
+            source_type="email",
+            calendar_parts=calendar_parts,
+            html_body=body_html,
+            auto_sync=False  # Don't auto-sync for temp users
+        )
+
+        events_count = len(result['events'])
+
+        # Commit the database changes
+        db.session.commit()
+
+        logger.info(f"Extracted and saved {events_count} events for new user {sender_email}")
+
+        # Send signup email with extracted events
+        send_signup_email_with_events(sender_email, format_events_for_email(result['events']), subject)
+
+        return {
+            "status": "signup_sent",
+            "email": sender_email,
+            "temp_user_id": temp_user.id,
+            "text_input_id": result['text_input'].id,
+            "events_extracted": events_count,
+            "events_saved": events_count,
+            "normalization": result.get('normalization')
+        }
+
+    except Exception as e:
+        logger.error(f"Error processing email for new user {sender_email}: {str(e)}")
+        sentry_sdk.capture_exception(e)
+        db.session.rollback()
+
+        # Send basic signup email even if extraction fails
+        send_signup_email_with_events(sender_email, [], subject)
+        return {"status": "signup_sent_with_error", "email": sender_email}
+
 @mailgun_webhook.route("/webhook/mailgun/test", methods=["GET", "POST"])
 def test_mailgun_webhook():
     """Test endpoint for Mailgun webhook configuration"""
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Background worker that drains the Mailgun inbox table.
+Run alongside gunicorn: python mailgun_worker.py
+
+Rows are claimed with SELECT ... FOR UPDATE SKIP LOCKED, so any number of
+worker processes (one per autoscaled instance) can run against the same table.
+"""
+
+import json
+import logging
+import os
+import signal
+import threading
+import time
+from datetime import datetime, timedelta
+
+import sentry_sdk
+
+from app import app, db
+from models import MailgunInbox
+from mailgun_webhook import process_inbound_email
+
+logger = logging.getLogger(__name__)
+
+MAILGUN_WORKER_CONCURRENCY = int(os.environ.get("MAILGUN_WORKER_CONCURRENCY", 2))
+MAILGUN_WORKER_POLL_SECONDS = float(os.environ.get("MAILGUN_WORKER_POLL_SECONDS", 2))
+MAILGUN_INBOX_MAX_ATTEMPTS = int(os.environ.get("MAILGUN_INBOX_MAX_ATTEMPTS", 3))
+# Rows left in 'processing' longer than this belong to a crashed worker and are reclaimed
+MAILGUN_INBOX_VISIBILITY_TIMEOUT = int(os.environ.get("MAILGUN_INBOX_VISIBILITY_TIMEOUT", 300))
+
+
+def claim_next_message():
+    """
+    Claim the oldest pending inbox row for this worker.
+
+    Returns:
+        MailgunInbox: The claimed row, now marked 'processing', or None if the inbox is empty
+    """
+    while True:
+        stale_before = datetime.utcnow() - timedelta(seconds=MAILGUN_INBOX_VISIBILITY_TIMEOUT)
+
+        inbox = (MailgunInbox.query
+                 .filter(db.or_(
+                     MailgunInbox.status == 'pending',
+                     db.and_(MailgunInbox.status == 'processing',
+                             MailgunInbox.started_at < stale_before)
+                 ))
+                 .order_by(MailgunInbox.received_at)
+                 .with_for_update(skip_locked=True)
+                 .first())
+
+        if inbox is None:
+            db.session.commit()  # Release the transaction
+            return None
+
+        if inbox.attempts >= MAILGUN_INBOX_MAX_ATTEMPTS:
+            # A worker died mid-processing on the final attempt
+            inbox.status = 'failed'
+            inbox.last_error = inbox.last_error or "Worker stopped while processing"
+            inbox.completed_at = datetime.utcnow()
+            db.session.commit()
+            continue
+
+        inbox.status = 'processing'
+        inbox.attempts = (inbox.attempts or 0) + 1
+        inbox.started_at = datetime.utcnow()
+        db.session.commit()
+        return inbox
+
+
+def process_message(inbox):
+    """
+    Run the extraction pipeline for a claimed inbox row and record the outcome.
+
+    Args:
+        inbox (MailgunInbox): Row returned by claim_next_message
+    """
+    inbox_id = inbox.id
+    started = time.monotonic()
+
+    try:
+        payload = json.loads(inbox.payload_json)
+        result = process_inbound_email(payload)
+
+        inbox = db.session.get(MailgunInbox, inbox_id)
+        inbox.status = 'completed'
+        inbox.result_json = json.dumps(result)
+        inbox.last_error = None
+        logger.info(f"Inbox {inbox_id} completed: {result.get('status')}")
+
+    except Exception as e:
+        # Roll back before touching the row: after a failed flush or the
+        # pipeline's own commits, reading its expired attributes would raise
+        db.session.rollback()
+        sentry_sdk.capture_exception(e)
+
+        inbox = db.session.get(MailgunInbox, inbox_id)
+        logger.error(f"Inbox {inbox_id} failed on attempt {inbox.attempts}: {str(e)}")
+        inbox.last_error = str(e)
+        inbox.status = 'failed' if inbox.attempts >= MAILGUN_INBOX_MAX_ATTEMPTS else 'pending'
+
+    inbox.completed_at = datetime.utcnow()
+    inbox.processing_ms = int((time.monotonic() - started) * 1000)
+
+    try:
+        db.session.commit()
+    except Exception as commit_error:
+        logger.error(f"Failed to record outcome for inbox {inbox_id}: {str(commit_error)}")
+        db.session.rollback()
+
+
+def worker_loop(worker_number, stop_event):
+    """Claim and process inbox rows until stop_event is set"""
+    with app.app_context():
+        logger.info(f"Mailgun worker thread {worker_number} started")
+        while not stop_event.is_set():
+            try:
+                inbox = claim_next_message()
+            except Exception as e:
+                logger.error(f"Mailgun worker {worker_number} failed to claim a message: {str(e)}")
+                sentry_sdk.capture_exception(e)
+                db.session.rollback()
+                stop_event.wait(MAILGUN_WORKER_POLL_SECONDS)
+                continue
+
+            if inbox is None:
+                stop_event.wait(MAILGUN_WORKER_POLL_SECONDS)
+                continue
+
+            try:
+                process_message(inbox)
+            except Exception as e:
+                # The row stays 'processing' and is reclaimed after the visibility timeout
+                logger.error(f"Mailgun worker {worker_number} failed to process a message: {str(e)}")
+                sentry_sdk.capture_exception(e)
+                db.session.rollback()
+        logger.info(f"Mailgun worker thread {worker_number} stopped")
+
+
+def run_worker(concurrency=MAILGUN_WORKER_CONCURRENCY):
+    """Start worker threads and block until SIGINT/SIGTERM"""
+    stop_event = threading.Event()
+
+    def handle_signal(signum, frame):
+        logger.info(f"Received signal {signum}, finishing in-flight messages")
+        stop_event.set()
+
+    signal.signal(signal.SIGINT, handle_signal)
+    signal.signal(signal.SIGTERM, handle_signal)
+
+    threads = []
+    for worker_number in range(concurrency):
+        thread = threading.Thread(target=worker_loop, args=(worker_number, stop_event), daemon=True)
+        thread.start()
+        threads.append(thread)
+
+    logger.info(f"Mailgun worker running with concurrency {concurrency}")
+    while any(thread.is_alive() for thread in threads):
+        for thread in threads:
+            thread.join(timeout=1)
+
+
+if __name__ == "__main__":
+    run_worker()
@@ -1,5 +1,9 @@
 import os
 from app import app  # noqa: F401
+from helpers.extraction_jobs import start_stale_job_sweeper
+
+# Each web worker also picks up extraction jobs orphaned by recycled workers
+start_stale_job_sweeper()
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
@@ -0,0 +1,495 @@
+#!/usr/bin/env python3
+"""
+Versioned schema migrations.
+Runs at app import (see app.py) and can be run by hand: python migrations.py
+
+Applied versions are recorded in the schema_migrations table. Runners are
+serialized with a Postgres advisory lock (a file lock on SQLite), so every
+gunicorn and background worker can start at once and only the first one
+applies pending migrations; the rest wait and then find nothing to do.
+Each migration is idempotent on its own as well, so databases that were
+patched with the old one-off migrate_*.py scripts converge to the same state.
+
+To change the schema, update models.py and append a migration to MIGRATIONS
+that spells out its own DDL; migrations never read the models, so a shipped
+migration keeps doing what it did. Never edit or reorder one that has shipped.
+"""
+
+import logging
+import os
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime
+
+import sentry_sdk
+from sqlalchemy import inspect
+
+from app import app, db
+from helpers.text_compression import compress_text
+from helpers.event_utils import compute_event_bounds, as_utc
+from helpers.recurrence import series_end
+from helpers.json_codec import loads as json_loads, dumps as json_dumps
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; SQLite runners are not serialized there
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+MIGRATION_LOCK_PATH = os.path.join(tempfile.gettempdir(), "textbot-migrations.lock")
+BACKFILL_BATCH_SIZE = 500
+
+SCHEMA_MIGRATIONS_DDL = """CREATE TABLE IF NOT EXISTS schema_migrations (
+    version INTEGER PRIMARY KEY,
+    name VARCHAR(200) NOT NULL,
+    applied_at TIMESTAMP NOT NULL
+)"""
+
+
+def _add_column(conn, table, column, column_type):
+    """Add a column unless it already exists"""
+    if column in [existing['name'] for existing in inspect(conn).get_columns(table)]:
+        logger.info(f"Column {table}.{column} already exists")
+        return
+    quoted_table = conn.dialect.identifier_preparer.quote(table)
+    conn.execute(db.text(f"ALTER TABLE {quoted_table} ADD COLUMN {column} {column_type}"))
+
+
+def _execute_ddl(conn, statements):
+    """Run DDL written with {id} and {binary} placeholders for the dialect-specific types"""
+    if conn.dialect.name == 'postgresql':
+        types = {'id': 'SERIAL PRIMARY KEY', 'binary': 'BYTEA'}
+    else:
+        types = {'id': 'INTEGER PRIMARY KEY', 'binary': 'BLOB'}
+    for statement in statements:
+        conn.execute(db.text(statement.format(**types)))
+
+
+# The schema as it was when the migration runner shipped. Frozen here rather
+# than read from models.py, so later model changes can't alter what this
+# migration creates; they get their own migration instead.
+BASELINE_DDL = [
+    """CREATE TABLE IF NOT EXISTS "user" (
+        id {id},
+        username VARCHAR(64) NOT NULL UNIQUE,
+        email VARCHAR(120) NOT NULL UNIQUE,
+        google_id VARCHAR(100) UNIQUE,
+        google_token TEXT,
+        google_refresh_token TEXT,
+        textbot_calendar_id VARCHAR(100),
+        textbot_calendar_validated_at TIMESTAMP,
+        timezone VARCHAR(50),
+        created_at TIMESTAMP
+    )""",
+    """CREATE TABLE IF NOT EXISTS text_input (
+        id {id},
+        user_id INTEGER NOT NULL REFERENCES "user" (id),
+        original_text TEXT NOT NULL,
+        source_type VARCHAR(50),
+        from_email VARCHAR(120),
+        extracted_events_json TEXT,
+        processing_status VARCHAR(50),
+        error_message TEXT,
+        openai_status VARCHAR(50),
+        openai_error_message TEXT,
+        prompt_tokens INTEGER,
+        cached_prompt_tokens INTEGER,
+        completion_tokens INTEGER,
+        openai_latency_ms INTEGER,
+        created_at TIMESTAMP
+    )""",
+    """CREATE TABLE IF NOT EXISTS event (
+        id {id},
+        user_id INTEGER NOT NULL REFERENCES "user" (id),
+        event_name VARCHAR(200) NOT NULL,
+        event_description TEXT,
+        start_date DATE NOT NULL,
+        start_time TIME,
+        start_datetime VARCHAR(100),
+        end_date DATE,
+        end_time TIME,
+        end_datetime VARCHAR(100),
+        location VARCHAR(500),
+        recurrence TEXT,
+        google_event_id VARCHAR(100),
+        is_synced BOOLEAN,
+        created_at TIMESTAMP,
+        updated_at TIMESTAMP,
+        extracted_at TIMESTAMP,
+        text_input_id INTEGER REFERENCES text_input (id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS extraction_cache (
+        id {id},
+        cache_key VARCHAR(64) NOT NULL UNIQUE,
+        result_json TEXT NOT NULL,
+        hit_count INTEGER,
+        created_at TIMESTAMP,
+        expires_at TIMESTAMP NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_extraction_cache_expires_at ON extraction_cache (expires_at)",
+    """CREATE TABLE IF NOT EXISTS mailgun_inbox (
+        id {id},
+        message_id VARCHAR(255) UNIQUE,
+        sender VARCHAR(120),
+        subject TEXT,
+        payload_json TEXT NOT NULL,
+        status VARCHAR(50),
+        attempts INTEGER,
+        last_error TEXT,
+        result_json TEXT,
+        received_at TIMESTAMP,
+        started_at TIMESTAMP,
+        completed_at TIMESTAMP,
+        processing_ms INTEGER
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_mailgun_inbox_status ON mailgun_inbox (status)",
+    """CREATE TABLE IF NOT EXISTS extraction_job (
+        id {id},
+        user_id INTEGER NOT NULL REFERENCES "user" (id),
+        texts_json TEXT NOT NULL,
+        source_type VARCHAR(50),
+        auto_sync BOOLEAN,
+        use_cache BOOLEAN,
+        status VARCHAR(50),
+        result_json TEXT,
+        error_message TEXT,
+        created_at TIMESTAMP,
+        started_at TIMESTAMP,
+        completed_at TIMESTAMP,
+        duration_ms INTEGER
+    )""",
+    """CREATE TABLE IF NOT EXISTS calendar_sync_outbox (
+        id {id},
+        user_id INTEGER NOT NULL REFERENCES "user" (id),
+        event_id INTEGER,
+        google_event_id VARCHAR(100),
+        operation VARCHAR(20) NOT NULL,
+        status VARCHAR(50),
+        attempts INTEGER,
+        next_attempt_at TIMESTAMP,
+        claimed_by VARCHAR(64),
+        last_error TEXT,
+        created_at TIMESTAMP,
+        updated_at TIMESTAMP,
+        completed_at TIMESTAMP
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_calendar_sync_outbox_status ON calendar_sync_outbox (status)",
+    "CREATE INDEX IF NOT EXISTS ix_calendar_sync_outbox_next_attempt_at ON calendar_sync_outbox (next_attempt_at)",
+    """CREATE TABLE IF NOT EXISTS open_ai_concurrency_lease (
+        id {id},
+        holder VARCHAR(100) NOT NULL,
+        acquired_at TIMESTAMP,
+        expires_at TIMESTAMP NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_open_ai_concurrency_lease_expires_at ON open_ai_concurrency_lease (expires_at)",
+]
+
+
+def baseline(conn):
+    # Tables that don't exist yet are created; existing tables are left alone
+    # and brought up to date by the migrations below
+    _execute_ddl(conn, BASELINE_DDL)
+
+
+def add_user_google_refresh_token(conn):
+    _add_column(conn, 'user', 'google_refresh_token', 'TEXT')
+
+
+def add_user_textbot_calendar_validated_at(conn):
+    _add_column(conn, 'user', 'textbot_calendar_validated_at', 'TIMESTAMP')
+
+
+def add_text_input_openai_usage_columns(conn):
+    for column in ('prompt_tokens', 'cached_prompt_tokens', 'completion_tokens', 'openai_latency_ms'):
+        _add_column(conn, 'text_input', column, 'INTEGER')
+
+
+def add_event_recurrence(conn):
+    _add_column(conn, 'event', 'recurrence', 'TEXT')
+
+
+def add_dashboard_and_sync_indexes(conn):
+    # Dashboard listing (user_id, created_at), the post-login backfill of
+    # unsynced events (user_id, is_synced) and lookups by Google event id.
+    # User.email is already covered by its unique constraint.
+    _execute_ddl(conn, [
+        "CREATE INDEX IF NOT EXISTS ix_event_user_id_created_at ON event (user_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_event_user_id_is_synced ON event (user_id, is_synced)",
+        "CREATE INDEX IF NOT EXISTS ix_event_google_event_id ON event (google_event_id)",
+        "CREATE INDEX IF NOT EXISTS ix_text_input_user_id_created_at ON text_input (user_id, created_at)",
+    ])
+
+
+def extend_event_created_at_index_with_id(conn):
+    # Keyset pagination orders by (created_at, id); with id in the index the
+    # order comes straight from the scan instead of an extra sort of ties
+    _execute_ddl(conn, [
+        "DROP INDEX IF EXISTS ix_event_user_id_created_at",
+        "CREATE INDEX ix_event_user_id_created_at ON event (user_id, created_at, id)",
+    ])
+
+
+def move_original_text_to_compressed_content(conn):
+    # Raw input text moves out of the text_input heap into text_input_content,
+    # compressed. Rows already copied are skipped, so a rerun picks up where
+    # an interrupted one stopped.
+    _execute_ddl(conn, ["""CREATE TABLE IF NOT EXISTS text_input_content (
+        id {id},
+        text_input_id INTEGER NOT NULL UNIQUE REFERENCES text_input (id) ON DELETE CASCADE,
+        codec VARCHAR(10) NOT NULL,
+        data {binary} NOT NULL,
+        original_bytes INTEGER
+    )"""])
+    if 'original_text' not in [column['name'] for column in inspect(conn).get_columns('text_input')]:
+        return
+
+    last_id = 0
+    copied = 0
+    while True:
+        rows = conn.execute(db.text(
+            "SELECT t.id, t.original_text FROM text_input t "
+            "WHERE t.id > :last_id AND NOT EXISTS (SELECT 1 FROM text_input_content c WHERE c.text_input_id = t.id) "
+            "ORDER BY t.id LIMIT :batch_size"), {'last_id': last_id, 'batch_size': BACKFILL_BATCH_SIZE}).fetchall()
+        if not rows:
+            break
+        values = []
+        for text_input_id, original_text in rows:
+            codec, data = compress_text(original_text)
+            values.append({'text_input_id': text_input_id, 'codec': codec, 'data': data,
+                           'original_bytes': len((original_text or '').encode('utf-8'))})
+        conn.execute(db.text("INSERT INTO text_input_content (text_input_id, codec, data, original_bytes) "
+                             "VALUES (:text_input_id, :codec, :data, :original_bytes)")
+                     .bindparams(db.bindparam('data', type_=db.LargeBinary)), values)
+        copied += len(values)
+        last_id = rows[-1][0]
+        logger.info(f"Compressed original_text of {copied} text inputs")
+
+    # Postgres reclaims the dropped column's space as rows are rewritten (or on VACUUM FULL)
+    conn.execute(db.text("ALTER TABLE text_input DROP COLUMN original_text"))
+
+
+def add_event_starts_at_ends_at(conn):
+    # UTC bounds derived from the date/time/RFC3339 fields, backfilled in
+    # batches; events that already have them are skipped on a rerun
+    column_type = db.DateTime(timezone=True).compile(dialect=conn.dialect)
+    _add_column(conn, 'event', 'starts_at', column_type)
+    _add_column(conn, 'event', 'ends_at', column_type)
+
+    update = (db.text("UPDATE event SET starts_at = :new_starts_at, ends_at = :new_ends_at WHERE id = :row_id")
+              .bindparams(db.bindparam('new_starts_at', type_=db.DateTime(timezone=True)),
+                          db.bindparam('new_ends_at', type_=db.DateTime(timezone=True))))
+    last_id = 0
+    filled = 0
+    while True:
+        rows = conn.execute(db.text(
+            'SELECT e.id, e.start_date, e.start_time, e.start_datetime, e.end_date, e.end_time, e.end_datetime, '
+            'u.timezone FROM event e JOIN "user" u ON u.id = e.user_id '
+            'WHERE e.id > :last_id AND e.starts_at IS NULL ORDER BY e.id LIMIT :batch_size'
+        ).columns(start_date=db.Date, start_time=db.Time, end_date=db.Date, end_time=db.Time),
+            {'last_id': last_id, 'batch_size': BACKFILL_BATCH_SIZE}).fetchall()
+        if not rows:
+            break
+        values = []
+        for row in rows:
+            starts_at, ends_at = compute_event_bounds(row.start_date, row.start_time, row.start_datetime,
+                                                      row.end_date, row.end_time, row.end_datetime, row.timezone)
+            values.append({'row_id': row.id, 'new_starts_at': starts_at, 'new_ends_at': ends_at})
+        conn.execute(update, values)
+        filled += len(values)
+        last_id = rows[-1].id
+        logger.info(f"Backfilled starts_at/ends_at of {filled} events")
+
+    _execute_ddl(conn, ["CREATE INDEX IF NOT EXISTS ix_event_user_id_starts_at ON event (user_id, starts_at)"])
+
+
+def convert_extracted_events_to_jsonb(conn):
+    # Rows that aren't a valid JSON list (the old property read them as []) are
+    # cleared first so the cast can't fail and array functions work on every row.
+    # Python accepts \u0000 escapes but jsonb rejects them, so those are
+    # stripped from valid rows. On SQLite the JSON type is stored as text, so
+    # this cleanup is all that's needed.
+    columns = {column['name']: column['type'] for column in inspect(conn).get_columns('text_input')}
+    if type(columns['extracted_events_json']).__name__ == 'JSONB':
+        return
+
+    last_id = 0
+    cleared = 0
+    cleaned = 0
+    while True:
+        rows = conn.execute(db.text(
+            "SELECT id, extracted_events_json FROM text_input "
+            "WHERE id > :last_id AND extracted_events_json IS NOT NULL ORDER BY id LIMIT :batch_size"
+        ).columns(extracted_events_json=db.Text), {'last_id': last_id, 'batch_size': BACKFILL_BATCH_SIZE}).fetchall()
+        if not rows:
+            break
+        invalid = []
+        stripped = []
+        for row in rows:
+            try:
+                events = json_loads(row.extracted_events_json)
+            except ValueError:
+                invalid.append(row.id)
+                continue
+            if not isinstance(events, list):
+                invalid.append(row.id)
+            elif '\\u0000' in row.extracted_events_json.lower():
+                stripped.append({'row_id': row.id, 'events_json': json_dumps(events)})
+        if invalid:
+            conn.execute(db.text("UPDATE text_input SET extracted_events_json = NULL WHERE id IN :ids")
+                         .bindparams(db.bindparam('ids', expanding=True)), {'ids': invalid})
+            cleared += len(invalid)
+        if stripped:
+            conn.execute(db.text("UPDATE text_input SET extracted_events_json = :events_json WHERE id = :row_id"),
+                         stripped)
+            cleaned += len(stripped)
+        last_id = rows[-1].id
+    if cleared:
+        logger.warning(f"Cleared {cleared} text inputs whose extracted_events_json wasn't valid JSON")
+    if cleaned:
+        logger.warning(f"Stripped NUL characters from the extracted_events_json of {cleaned} text inputs")
+
+    if conn.dialect.name == 'postgresql':
+        conn.execute(db.text("ALTER TABLE text_input ALTER COLUMN extracted_events_json TYPE JSONB "
+                             "USING extracted_events_json::jsonb"))
+
+
+def add_event_series_ends_at(conn):
+    # End of a recurring series' last occurrence (NULL when it repeats without
+    # end), so range queries skip series that are over. Recomputed for every
+    # series on a rerun, which is cheap since only recurring rows are read.
+    _add_column(conn, 'event', 'series_ends_at', db.DateTime(timezone=True).compile(dialect=conn.dialect))
+
+    update = (db.text("UPDATE event SET series_ends_at = :new_series_ends_at WHERE id = :row_id")
+              .bindparams(db.bindparam('new_series_ends_at', type_=db.DateTime(timezone=True))))
+    last_id = 0
+    filled = 0
+    while True:
+        rows = conn.execute(db.text(
+            'SELECT e.id, e.recurrence, e.starts_at, e.ends_at, u.timezone FROM event e JOIN "user" u ON u.id = e.user_id '
+            'WHERE e.id > :last_id AND e.recurrence IS NOT NULL AND e.starts_at IS NOT NULL '
+            'ORDER BY e.id LIMIT :batch_size'
+        ).columns(starts_at=db.DateTime(timezone=True), ends_at=db.DateTime(timezone=True)),
+            {'last_id': last_id, 'batch_size': BACKFILL_BATCH_SIZE}).fetchall()
+        if not rows:
+            break
+        values = [{'row_id': row.id,
+                   'new_series_ends_at': series_end(row.recurrence, as_utc(row.starts_at),
+                                                    as_utc(row.ends_at or row.starts_at), row.timezone)}
+                  for row in rows]
+        conn.execute(update, values)
+        filled += len(values)
+        last_id = rows[-1].id
+        logger.info(f"Backfilled series_ends_at of {filled} recurring events")
+
+    _execute_ddl(conn, ["CREATE INDEX IF NOT EXISTS ix_event_user_id_series_ends_at ON event (user_id, series_ends_at) "
+                        "WHERE recurrence IS NOT NULL"])
+
+
+# (version, function) in the order they must run; the function name is recorded
+MIGRATIONS = [
+    (1, baseline),
+    (2, add_user_google_refresh_token),
+    (3, add_user_textbot_calendar_validated_at),
+    (4, add_text_input_openai_usage_columns),
+    (5, add_event_recurrence),
+    (6, add_dashboard_and_sync_indexes),
+    (7, extend_event_created_at_index_with_id),
+    (8, move_original_text_to_compressed_content),
+    (9, add_event_starts_at_ends_at),
+    (10, convert_extracted_events_to_jsonb),
+    (11, add_event_series_ends_at),
+]
+
+
+@contextmanager
+def _migration_lock(conn):
+    """Hold a lock that serializes migration runners across processes"""
+    if conn.dialect.name == 'postgresql':
+        conn.execute(db.text("SELECT pg_advisory_lock(hashtext('schema_migrations'))"))
+        conn.commit()
+        try:
+            yield
+        finally:
+            conn.execute(db.text("SELECT pg_advisory_unlock(hashtext('schema_migrations'))"))
+            conn.commit()
+    elif fcntl is not None:
+        with open(MIGRATION_LOCK_PATH, 'a') as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+    else:
+        yield
+
+
+def _applied_versions(conn):
+    return {row[0] for row in conn.execute(db.text("SELECT version FROM schema_migrations"))}
+
+
+def run_migrations():
+    """
+    Apply every migration that hasn't been applied yet, in order.
+
+    Returns:
+        list: Versions applied by this call (empty if the schema was current)
+    """
+    applied = []
+    with app.app_context():
+        engine = db.engine
+    with engine.connect() as conn:
+        with _migration_lock(conn):
+            with conn.begin():
+                conn.execute(db.text(SCHEMA_MIGRATIONS_DDL))
+            with conn.begin():
+                done = _applied_versions(conn)
+
+            for version, migration in MIGRATIONS:
+                if version in done:
+                    continue
+                logger.info(f"Applying migration {version}: {migration.__name__}")
+                try:
+                    # DDL and the version row commit together (Postgres DDL is transactional)
+                    with conn.begin():
+                        if conn.dialect.name == 'postgresql':
+                            # Backfills and table rewrites can outlast the 30s statement_timeout set for the app
+                            conn.execute(db.text("SET LOCAL statement_timeout = 0"))
+                        migration(conn)
+                        conn.execute(
+                            db.text("INSERT INTO schema_migrations (version, name, applied_at) "
+                                    "VALUES (:version, :name, :applied_at)"),
+                            {'version': version, 'name': migration.__name__, 'applied_at': datetime.utcnow()})
+                except Exception as e:
+                    logger.error(f"Migration {version} ({migration.__name__}) failed: {str(e)}")
+                    sentry_sdk.capture_exception(e)
+                    raise
+                applied.append(version)
+
+    if applied:
+        logger.info(f"Applied migrations {applied}")
+    return applied
+
+
+def get_migration_status():
+    """
+    Get applied and pending migration versions.
+
+    Returns:
+        dict: Current version, applied versions and pending versions
+    """
+    with app.app_context():
+        engine = db.engine
+    with engine.connect() as conn:
+        done = _applied_versions(conn) if inspect(conn).has_table('schema_migrations') else set()
+    return {
+        'current_version': max(done) if done else None,
+        'applied': sorted(done),
+        'pending': [version for version, _ in MIGRATIONS if version not in done],
+    }
+
+
+if __name__ == "__main__":
+    applied_versions = run_migrations()
+    print(f"Applied migrations: {applied_versions}" if applied_versions else "Schema is up to date.")
+    print(get_migration_status())
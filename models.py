@@ -1,7 +1,9 @@
 from app import db
 from flask_login import UserMixin
 from datetime import datetime
-import json
+from sqlalchemy.dialects.postgresql import JSONB
+
+from helpers.text_compression import compress_text, decompress_text
 
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -11,6 +13,7 @@ class User(UserMixin, db.Model):
     google_token = db.Column(db.Text, nullable=True)
     google_refresh_token = db.Column(db.Text, nullable=True)  # Store refresh token separately
     textbot_calendar_id = db.Column(db.String(100), nullable=True)  # Store Cal Pilot calendar ID
+    textbot_calendar_validated_at = db.Column(db.DateTime, nullable=True)  # When textbot_calendar_id was last confirmed with Google
     timezone = db.Column(db.String(50), default='UTC')  # User's timezone
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
@@ -19,6 +22,15 @@ class User(UserMixin, db.Model):
     text_inputs = db.relationship('TextInput', backref='user', lazy=True, cascade='all, delete-orphan')
 
 class Event(db.Model):
+    __table_args__ = (
+        db.Index('ix_event_user_id_created_at', 'user_id', 'created_at', 'id'),  # Keyset-paginated dashboard listing
+        db.Index('ix_event_user_id_is_synced', 'user_id', 'is_synced'),  # Backfill of unsynced events after login
+        db.Index('ix_event_user_id_starts_at', 'user_id', 'starts_at'),  # Date-range queries and the calendar view
+        # Recurring series still running in a date range
+        db.Index('ix_event_user_id_series_ends_at', 'user_id', 'series_ends_at',
+                 postgresql_where=db.text('recurrence IS NOT NULL'), sqlite_where=db.text('recurrence IS NOT NULL')),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     
@@ -31,10 +43,14 @@ class Event(db.Model):
     end_date = db.Column(db.Date)
     end_time = db.Column(db.Time)
     end_datetime = db.Column(db.String(100))  # RFC3339 datetime string
+    starts_at = db.Column(db.DateTime(timezone=True))  # UTC start derived from the fields above, for range queries
+    ends_at = db.Column(db.DateTime(timezone=True))  # UTC end (exclusive); untimed events cover whole local days
+    series_ends_at = db.Column(db.DateTime(timezone=True))  # End of a recurring series' last occurrence; NULL if it never ends
     location = db.Column(db.String(500))
+    recurrence = db.Column(db.Text)  # RRULE/EXDATE lines for recurring events (one row per series)
     
     # Google Calendar integration
-    google_event_id = db.Column(db.String(100))
+    google_event_id = db.Column(db.String(100), index=True)
     is_synced = db.Column(db.Boolean, default=False)
     
     # Metadata
@@ -46,22 +62,31 @@ class Event(db.Model):
     text_input_id = db.Column(db.Integer, db.ForeignKey('text_input.id'))
 
 class TextInput(db.Model):
+    __table_args__ = (
+        db.Index('ix_text_input_user_id_created_at', 'user_id', 'created_at'),  # Recent inputs on the dashboard
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     
-    # Input data
-    original_text = db.Column(db.Text, nullable=False)
+    # Input data (the raw text lives compressed in TextInputContent; see original_text below)
+    content = db.relationship('TextInputContent', uselist=False, lazy='select', cascade='all, delete-orphan')
     source_type = db.Column(db.String(50), default='manual')  # manual, email
     from_email = db.Column(db.String(120))  # if source is email
     
     # Processing results
-    extracted_events_json = db.Column(db.Text)  # JSON string of extracted events
+    # Extracted events as JSONB on Postgres (JSON text elsewhere), loaded on access
+    extracted_events_json = db.deferred(db.Column(db.JSON(none_as_null=True).with_variant(JSONB(none_as_null=True), 'postgresql')))
     processing_status = db.Column(db.String(50), default='pending')  # pending, completed, failed
     error_message = db.Column(db.Text)
     
     # OpenAI API tracking
-    openai_status = db.Column(db.String(50), default='pending')  # pending, success, timeout, error, offline
+    openai_status = db.Column(db.String(50), default='pending')  # pending, success, cached, partial, ics, schema_org, local, coalesced, timeout, circuit_open, shed, error, offline
     openai_error_message = db.Column(db.Text)  # Specific OpenAI error details
+    prompt_tokens = db.Column(db.Integer)
+    cached_prompt_tokens = db.Column(db.Integer)  # Prompt tokens served from the provider's prefix cache
+    completion_tokens = db.Column(db.Integer)
+    openai_latency_ms = db.Column(db.Integer)
     
     # Metadata
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -69,15 +94,115 @@ class TextInput(db.Model):
     # Relationship with events
     events = db.relationship('Event', backref='text_input', lazy=True)
     
+    @property
+    def original_text(self):
+        # Fetched and decompressed only when accessed
+        return self.content.text if self.content else None
+
+    @original_text.setter
+    def original_text(self, text):
+        if self.content is None:
+            self.content = TextInputContent()
+        self.content.text = text
+
     @property
     def extracted_events(self):
-        if self.extracted_events_json:
-            try:
-                return json.loads(self.extracted_events_json)
-            except json.JSONDecodeError:
-                return []
-        return []
+        # Deserialized once per load by the column type; assigning through the
+        # setter replaces the cached value
+        return self.extracted_events_json or []
     
     @extracted_events.setter
     def extracted_events(self, events_list):
-        self.extracted_events_json = json.dumps(events_list)
+        self.extracted_events_json = events_list
+
+class TextInputContent(db.Model):
+    # Raw input text, kept out of the text_input heap and stored compressed
+    id = db.Column(db.Integer, primary_key=True)
+    text_input_id = db.Column(db.Integer, db.ForeignKey('text_input.id', ondelete='CASCADE'), unique=True, nullable=False)
+    codec = db.Column(db.String(10), nullable=False)  # zstd, zlib, none
+    data = db.Column(db.LargeBinary, nullable=False)
+    original_bytes = db.Column(db.Integer)  # UTF-8 size before compression
+
+    @property
+    def text(self):
+        return decompress_text(self.codec, self.data)
+
+    @text.setter
+    def text(self, value):
+        self.codec, self.data = compress_text(value)
+        self.original_bytes = len((value or '').encode('utf-8'))
+
+class ExtractionCache(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    cache_key = db.Column(db.String(64), unique=True, nullable=False)  # SHA-256 of normalized text, timezone and date
+    result_json = db.Column(db.Text, nullable=False)  # JSON of extracted events and from_email
+    hit_count = db.Column(db.Integer, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+class MailgunInbox(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    message_id = db.Column(db.String(255), unique=True, nullable=True)  # Mailgun Message-Id, used to drop webhook retries
+    sender = db.Column(db.String(120))
+    subject = db.Column(db.Text)
+    payload_json = db.Column(db.Text, nullable=False)  # Raw webhook form fields
+
+    # Processing state
+    status = db.Column(db.String(50), default='pending', index=True)  # pending, processing, completed, failed
+    attempts = db.Column(db.Integer, default=0)
+    last_error = db.Column(db.Text)
+    result_json = db.Column(db.Text)  # JSON summary of the processing result
+
+    # Timing
+    received_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    completed_at = db.Column(db.DateTime)
+    processing_ms = db.Column(db.Integer)
+
+class ExtractionJob(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+
+    # Submission
+    texts_json = db.Column(db.Text, nullable=False)  # JSON list of texts to extract from
+    source_type = db.Column(db.String(50), default='api')
+    auto_sync = db.Column(db.Boolean, default=True)
+    use_cache = db.Column(db.Boolean, default=True)
+
+    # Processing state
+    status = db.Column(db.String(50), default='queued')  # queued, running, completed, partial, failed
+    result_json = db.Column(db.Text)  # JSON list of per-text results
+    error_message = db.Column(db.Text)
+
+    # Timing
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    completed_at = db.Column(db.DateTime)
+    duration_ms = db.Column(db.Integer)
+
+class CalendarSyncOutbox(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    # No foreign key: delete operations outlive the Event row they refer to
+    event_id = db.Column(db.Integer, nullable=True)
+    google_event_id = db.Column(db.String(100))  # Target of delete operations
+    operation = db.Column(db.String(20), nullable=False)  # insert, update, delete
+
+    # Processing state
+    status = db.Column(db.String(50), default='pending', index=True)  # pending, processing, completed, failed
+    attempts = db.Column(db.Integer, default=0)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    claimed_by = db.Column(db.String(64))  # Worker claim token while processing
+    last_error = db.Column(db.Text)
+
+    # Metadata
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    completed_at = db.Column(db.DateTime)
+
+class OpenAIConcurrencyLease(db.Model):
+    # One row per in-flight OpenAI completion, shared by every worker process
+    id = db.Column(db.Integer, primary_key=True)
+    holder = db.Column(db.String(100), nullable=False)  # hostname-pid-thread of the caller
+    acquired_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)  # Leases of crashed workers lapse
@@ -3,15 +3,25 @@ import os
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from flask_login import login_required, current_user
 from app import db
-from models import User, Event, TextInput
-from google_calendar import create_calendar_event, update_calendar_event, delete_calendar_event, check_user_has_calendar_scope
-from datetime import datetime
+from models import User, Event, TextInput, ExtractionJob
+from google_calendar import create_calendar_event, check_user_has_calendar_scope
+from datetime import datetime, date, time, timedelta
 import sentry_sdk
 
 # Import helper modules
 from helpers.event_processing import process_text_to_events
-from helpers.event_utils import prepare_event_data_for_calendar, update_event_from_form, format_event_for_api
+from helpers.calendar_sync import enqueue_calendar_sync
+from helpers.event_utils import prepare_event_data_for_calendar, update_event_from_form, format_event_for_api, get_timezone
+from helpers.event_queries import (get_events_page, count_user_events, parse_range_bound, get_events_in_range,
+                                   group_events_by_day)
 from helpers.domain_utils import get_base_url, get_mailgun_forward_email, is_production, is_development
+from helpers.extraction_cache import get_extraction_cache_stats
+from helpers.recurrence import describe_recurrence
+from helpers.single_flight import get_single_flight_stats
+from helpers.http_client import get_http_client_stats
+from helpers.openai_guard import get_openai_guard_status
+from helpers.openai_hedging import get_hedging_stats
+from helpers.extraction_jobs import submit_extraction_job, format_job_for_api, EXTRACTION_JOB_MAX_TEXTS
 
 logger = logging.getLogger(__name__)
 
@@ -24,7 +34,8 @@ def inject_domain_utils():
         'get_base_url': get_base_url,
         'get_mailgun_forward_email': get_mailgun_forward_email,
         'is_production': is_production,
-        'is_development': is_development
+        'is_development': is_development,
+        'describe_recurrence': describe_recurrence
     }
 
 @main_routes.route("/health")
@@ -42,6 +53,7 @@ def db_health_check():
         # Get some basic stats
         user_count = db.session.execute(db.text('SELECT COUNT(*) FROM "user"')).scalar()
         event_count = db.session.execute(db.text('SELECT COUNT(*) FROM event')).scalar()
+        schema_version = db.session.execute(db.text('SELECT MAX(version) FROM schema_migrations')).scalar()
 
         return {
             "status": "healthy", 
@@ -49,6 +61,7 @@ def db_health_check():
             "test_query": result[0] if result else None,
             "user_count": user_count,
             "event_count": event_count,
+            "schema_version": schema_version,
             "timestamp": datetime.utcnow().isoformat()
         }, 200
     except Exception as e:
@@ -60,6 +73,72 @@ def db_health_check():
             "timestamp": datetime.utcnow().isoformat()
         }, 500
 
+@main_routes.route("/health/extraction_cache")
+def extraction_cache_health_check():
+    """Extraction cache hit/miss and request coalescing counters for this worker process"""
+    return {
+        "status": "healthy",
+        "extraction_cache": get_extraction_cache_stats(),
+        "coalescing": get_single_flight_stats(),
+        "timestamp": datetime.utcnow().isoformat()
+    }, 200
+
+@main_routes.route("/health/http")
+def http_client_health_check():
+    """Outbound HTTP latency and error counters per host for this worker process"""
+    return {
+        "status": "healthy",
+        "hosts": get_http_client_stats(),
+        "timestamp": datetime.utcnow().isoformat()
+    }, 200
+
+@main_routes.route("/health/openai")
+def openai_guard_health_check():
+    """OpenAI circuit breaker, concurrency limiter and hedging state for this worker process"""
+    guard = get_openai_guard_status()
+    return {
+        "status": "degraded" if guard['breaker'] != 'closed' else "healthy",
+        "openai": guard,
+        "hedging": get_hedging_stats(),
+        "timestamp": datetime.utcnow().isoformat()
+    }, 200
+
+@main_routes.route("/health/openai_usage")
+def openai_usage_health_check():
+    """OpenAI token usage, prompt-cache hit rate and extraction yield over the last 24 hours"""
+    since = datetime.utcnow() - timedelta(hours=24)
+    totals = db.session.query(
+        db.func.count(TextInput.id),
+        db.func.sum(TextInput.prompt_tokens),
+        db.func.sum(TextInput.cached_prompt_tokens),
+        db.func.sum(TextInput.completion_tokens),
+        db.func.avg(TextInput.openai_latency_ms)
+    ).filter(TextInput.created_at >= since, TextInput.prompt_tokens.isnot(None)).one()
+
+    requests_count, prompt_tokens, cached_tokens, completion_tokens, avg_latency = totals
+
+    # Counted in the database from the JSON(B) column rather than loading every row
+    array_length = db.func.jsonb_array_length if db.engine.dialect.name == 'postgresql' else db.func.json_array_length
+    events_count = array_length(TextInput.extracted_events_json)
+    events_extracted, inputs_without_events = db.session.query(
+        db.func.sum(events_count),
+        db.func.count(TextInput.id).filter(db.func.coalesce(events_count, 0) == 0)
+    ).filter(TextInput.created_at >= since).one()
+
+    return {
+        "status": "healthy",
+        "window_hours": 24,
+        "requests": requests_count,
+        "prompt_tokens": int(prompt_tokens or 0),
+        "cached_prompt_tokens": int(cached_tokens or 0),
+        "completion_tokens": int(completion_tokens or 0),
+        "prompt_cache_hit_rate": round(cached_tokens / prompt_tokens, 4) if prompt_tokens else 0.0,
+        "avg_latency_ms": round(float(avg_latency), 1) if avg_latency is not None else None,
+        "events_extracted": int(events_extracted or 0),
+        "inputs_without_events": inputs_without_events,
+        "timestamp": datetime.utcnow().isoformat()
+    }, 200
+
 @main_routes.route("/")
 def index():
     if current_user.is_authenticated:
@@ -69,14 +148,17 @@ def index():
 @main_routes.route("/dashboard")
 @login_required
 def dashboard():
-    # Get user's events ordered by extraction datetime (oldest first)
-    events = Event.query.filter_by(user_id=current_user.id).order_by(Event.created_at.desc()).all()
+    # First page of the user's events, newest first; the rest load on demand from /api/events
+    events, next_cursor = get_events_page(current_user.id)
+    event_count, event_count_capped = count_user_events(current_user.id)
     text_inputs = TextInput.query.filter_by(user_id=current_user.id).order_by(TextInput.created_at.desc()).limit(10).all()
 
     # Check if user has granted calendar scope
     has_calendar_scope = check_user_has_calendar_scope(current_user)
 
-    return render_template("dashboard.html", events=events, text_inputs=text_inputs, has_calendar_scope=has_calendar_scope)
+    return render_template("dashboard.html", events=events, next_cursor=next_cursor, event_count=event_count,
+                           event_count_capped=event_count_capped, text_inputs=text_inputs,
+                           has_calendar_scope=has_calendar_scope)
 
 @main_routes.route("/extract_events", methods=["POST"])
 @login_required
@@ -94,13 +176,18 @@ def extract_events():
 
         events_count = len(result['events'])
         synced_count = result['synced_count']
+        sync_queued_count = result['sync_queued_count']
 
-        if 'offline_extraction' in result and result['offline_extraction']:
+        if result.get('offline_extraction') and result.get('offline_reason') == 'timeout':
             flash("AI service timed out. Extracting events offline. Results may be less accurate.", "warning")
+        elif result.get('offline_extraction') and result.get('offline_reason') != 'local':
+            flash("AI service is unavailable right now. Extracting events offline. Results may be less accurate.", "warning")
 
         if events_count > 0:
             if synced_count > 0:
                 flash(f"Successfully extracted {events_count} event(s) and synced {synced_count} to your Calendar Autobot calendar!", "success")
+            elif sync_queued_count > 0:
+                flash(f"Successfully extracted {events_count} event(s)! They are being synced to your Calendar Autobot calendar.", "success")
             else:
                 flash(f"Successfully extracted {events_count} event(s)! Events are ready for manual sync.", "success")
         else:
@@ -120,6 +207,8 @@ def extract_events():
             flash("AI service is busy. Please wait a moment and try again.", "error")
         elif "authentication" in error_msg or "401" in error_msg:
             flash("AI service authentication issue. Please contact support.", "error")
+        elif "temporarily unavailable" in error_msg or "at capacity" in error_msg:
+            flash("AI service is temporarily unavailable. Please try again in a minute.", "error")
         elif "network" in error_msg or "timeout" in error_msg:
             flash("Network connection issue. Please check your connection and try again.", "error")
         else:
@@ -127,6 +216,45 @@ def extract_events():
 
     return redirect(url_for("main_routes.dashboard"))
 
+@main_routes.route("/calendar")
+@login_required
+def calendar_view():
+    """Week or month grid of the user's events, in their timezone"""
+    view = request.args.get("view", "week")
+    if view not in ("week", "month"):
+        view = "week"
+    tz = get_timezone(current_user.timezone)
+    try:
+        anchor = date.fromisoformat(request.args.get("date", ""))
+    except ValueError:
+        anchor = datetime.now(tz).date()
+
+    if view == "week":
+        period_start = anchor - timedelta(days=anchor.weekday())
+        period_end = period_start + timedelta(days=7)
+        previous_date, next_date = period_start - timedelta(days=7), period_end
+        title = f"Week of {period_start.strftime('%B %d, %Y')}"
+    else:
+        period_start = anchor.replace(day=1)
+        period_end = (period_start + timedelta(days=32)).replace(day=1)
+        previous_date, next_date = (period_start - timedelta(days=1)).replace(day=1), period_end
+        title = period_start.strftime('%B %Y')
+
+    # Whole weeks, Monday first
+    first_day = period_start - timedelta(days=period_start.weekday())
+    last_day = period_end - timedelta(days=1)
+    last_day += timedelta(days=6 - last_day.weekday())
+
+    range_start = datetime.combine(first_day, time(0), tzinfo=tz)
+    range_end = datetime.combine(last_day + timedelta(days=1), time(0), tzinfo=tz)
+    occurrences = get_events_in_range(current_user.id, range_start, range_end, current_user.timezone)
+    days = group_events_by_day(occurrences, first_day, last_day, current_user.timezone)
+    weeks = [sorted(days)[index:index + 7] for index in range(0, len(days), 7)]
+
+    return render_template("calendar.html", view=view, title=title, weeks=weeks, days=days,
+                           period_start=period_start, period_end=period_end, today=datetime.now(tz).date(),
+                           previous_date=previous_date, next_date=next_date)
+
 @main_routes.route("/edit_event/<int:event_id>")
 @login_required
 def edit_event(event_id):
@@ -142,22 +270,17 @@ def update_event(event_id):
         # Update event using helper function
         update_event_from_form(event, request.form)
 
-        # Update in Google Calendar if already synced
+        # Queue the Google Calendar update in the same transaction if already synced
         if event.is_synced and event.google_event_id:
-            try:
-                event_data = prepare_event_data_for_calendar(event)
-
-                if update_calendar_event(current_user, event.google_event_id, event_data):
-                    flash("Event updated successfully in both database and Google Calendar!", "success")
-                else:
-                    flash("Event updated in database, but failed to update in Google Calendar.", "warning")
-            except Exception as e:
-                flash(f"Event updated in database, but Google Calendar update failed: {str(e)}", "warning")
-        else:
-            flash("Event updated successfully!", "success")
+            enqueue_calendar_sync(current_user, 'update', event)
 
         db.session.commit()
 
+        if event.is_synced and event.google_event_id:
+            flash("Event updated successfully! Your Google Calendar will be updated shortly.", "success")
+        else:
+            flash("Event updated successfully!", "success")
+
     except Exception as e:
         logger.error(f"Error updating event {event_id} for user {current_user.id}: {str(e)}", exc_info=True)
         sentry_sdk.capture_exception(e)
@@ -177,7 +300,7 @@ def sync_to_calendar(event_id):
 
     try:
         event_data = prepare_event_data_for_calendar(event)
-        google_event_id = create_calendar_event(current_user, event_data)
+        google_event_id = create_calendar_event(current_user, event_data, event_id=event.id)
 
         event.google_event_id = google_event_id
         event.is_synced = True
@@ -198,12 +321,9 @@ def delete_event(event_id):
     event = Event.query.filter_by(id=event_id, user_id=current_user.id).first_or_404()
 
     try:
-        # Delete from Google Calendar if synced
+        # Queue deletion from Google Calendar in the same transaction if synced
         if event.is_synced and event.google_event_id:
-            try:
-                delete_calendar_event(current_user, event.google_event_id)
-            except Exception as e:
-                flash(f"Warning: Failed to delete from Google Calendar: {str(e)}", "warning")
+            enqueue_calendar_sync(current_user, 'delete', event)
 
         # Delete from database
         db.session.delete(event)
@@ -241,6 +361,10 @@ def api_extract_events():
     """
     API endpoint for extracting events from text.
     Can be used by external services, webhooks, or programmatic access.
+
+    With "async": true, or when a "texts" list is submitted, the extraction
+    runs as a background job: the response is 202 with a job_id to poll at
+    /api/jobs/<job_id>.
     """
     try:
         # Get JSON data from request
@@ -248,15 +372,43 @@ def api_extract_events():
         if not data:
             return jsonify({"error": "No JSON data provided"}), 400
 
+        source_type = data.get("source_type", "api")
+        auto_sync = data.get("auto_sync", True)
+        bypass_cache = bool(data.get("bypass_cache", False))
+
+        if data.get("async") or "texts" in data:
+            texts = data.get("texts")
+            if texts is None:
+                texts = [data.get("text", "")]
+            if not isinstance(texts, list) or not texts:
+                return jsonify({"error": "Texts must be a non-empty list"}), 400
+            if len(texts) > EXTRACTION_JOB_MAX_TEXTS:
+                return jsonify({"error": f"At most {EXTRACTION_JOB_MAX_TEXTS} texts can be submitted at once"}), 400
+
+            texts = [text.strip() if isinstance(text, str) else "" for text in texts]
+            if not all(texts):
+                return jsonify({"error": "Every text must be a non-empty string"}), 400
+
+            job = submit_extraction_job(current_user, texts, source_type=source_type,
+                                        auto_sync=auto_sync, use_cache=not bypass_cache)
+            if job is None:
+                return jsonify({"error": "Too many extraction jobs in progress. Please try again later."}), 503
+
+            return jsonify({
+                'success': True,
+                'job_id': job.id,
+                'status': job.status,
+                'texts_count': len(texts),
+                'status_url': url_for('main_routes.api_get_job', job_id=job.id)
+            }), 202
+
         text = data.get("text", "").strip()
         if not text:
             return jsonify({"error": "Text field is required"}), 400
 
-        source_type = data.get("source_type", "api")
-        auto_sync = data.get("auto_sync", True)
-
         # Process text to events using helper function
-        result = process_text_to_events(text, current_user, source_type=source_type, auto_sync=auto_sync)
+        result = process_text_to_events(text, current_user, source_type=source_type,
+                                        auto_sync=auto_sync, use_cache=not bypass_cache)
 
         # Format response using helper function
         events_data = [format_event_for_api(event) for event in result['events']]
@@ -266,12 +418,17 @@ def api_extract_events():
             'text_input_id': result['text_input'].id,
             'events_count': len(result['events']),
             'synced_count': result['synced_count'],
+            'sync_queued_count': result['sync_queued_count'],
             'from_email': result['from_email'],
             'events': events_data
         }
 
         if 'offline_extraction' in result and result['offline_extraction']:
             response['offline_extraction'] = True
+            response['offline_reason'] = result['offline_reason']
+
+        if result.get('chunks'):
+            response['chunks'] = result['chunks']
 
         return jsonify(response), 200
 
@@ -289,5 +446,66 @@ def api_extract_events():
             return jsonify({"error": "AI service is busy. Please try again later."}), 429
         elif "authentication" in error_msg or "401" in error_msg:
             return jsonify({"error": "AI service authentication failed."}), 503
+        elif "temporarily unavailable" in error_msg or "at capacity" in error_msg:
+            return jsonify({"error": "AI service is temporarily unavailable. Please try again later."}), 503
         else:
-            return jsonify({"error": "Failed to process text. Please try again."}), 500
\ No newline at end of file
+            return jsonify({"error": "Failed to process text. Please try again."}), 500
+
+@main_routes.route("/api/jobs/<int:job_id>", methods=["GET"])
+@login_required
+def api_get_job(job_id):
+    """
+    API endpoint for polling an asynchronous extraction job.
+    """
+    job = ExtractionJob.query.filter_by(id=job_id, user_id=current_user.id).first()
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+
+    return jsonify(format_job_for_api(job)), 200
+
+@main_routes.route("/api/events", methods=["GET"])
+@login_required
+def api_list_events():
+    """
+    API endpoint for listing the user's events, newest first.
+
+    Pass the returned next_cursor as "cursor" to get the following page; it
+    is null on the last page. With "html=1" the response also carries the
+    rendered dashboard cards for the page.
+
+    With "from" and "to" (YYYY-MM-DD in the user's timezone, or ISO 8601
+    datetimes) it instead returns the events overlapping that window, in
+    start order, with recurring series expanded into one entry per
+    occurrence (starts_at/ends_at are the occurrence's).
+    """
+    if request.args.get("from") or request.args.get("to"):
+        try:
+            range_start = parse_range_bound(request.args.get("from"), current_user.timezone)
+            range_end = parse_range_bound(request.args.get("to"), current_user.timezone)
+            occurrences = get_events_in_range(current_user.id, range_start, range_end, current_user.timezone)
+        except ValueError as ve:
+            return jsonify({"error": str(ve)}), 400
+
+        # Each occurrence of a recurring series is listed with its own bounds
+        return jsonify({
+            'events': [dict(format_event_for_api(event), starts_at=starts_at.isoformat(), ends_at=ends_at.isoformat())
+                       for event, starts_at, ends_at in occurrences],
+            'from': range_start.isoformat(),
+            'to': range_end.isoformat()
+        }), 200
+
+    try:
+        limit = request.args.get("limit", type=int)
+        events, next_cursor = get_events_page(current_user.id, limit=limit, cursor=request.args.get("cursor"))
+    except ValueError as ve:
+        return jsonify({"error": str(ve)}), 400
+
+    response = {
+        'events': [format_event_for_api(event) for event in events],
+        'next_cursor': next_cursor
+    }
+    if request.args.get("html") == "1":
+        response['html'] = render_template("_event_cards.html", events=events,
+                                           has_calendar_scope=check_user_has_calendar_scope(current_user))
+
+    return jsonify(response), 200
@@ -39,32 +39,14 @@ document.addEventListener('DOMContentLoaded', function() {
         }, 5000);
     });
     
-    // Confirm delete actions
-    const deleteForms = document.querySelectorAll('.delete-form');
-    deleteForms.forEach(form => {
-        form.addEventListener('submit', function(e) {
-            if (!confirm('Are you sure you want to delete this event?')) {
-                e.preventDefault();
-                return false;
-            }
-        });
-    });
+    // Confirm delete actions and loading states for forms
+    bindFormActions(document);
     
-    // Loading states for forms
-    const submitButtons = document.querySelectorAll('button[type="submit"]');
-    submitButtons.forEach(button => {
-        button.closest('form').addEventListener('submit', function() {
-            button.disabled = true;
-            const originalText = button.innerHTML;
-            button.innerHTML = '<span class="spinner-border spinner-border-sm me-2" role="status"></span>Processing...';
-            
-            // Re-enable after 30 seconds as failsafe
-            setTimeout(() => {
-                button.disabled = false;
-                button.innerHTML = originalText;
-            }, 30000);
-        });
-    });
+    // Load more events on the dashboard
+    const loadMoreButton = document.getElementById('load-more-events');
+    if (loadMoreButton) {
+        loadMoreButton.addEventListener('click', loadMoreEvents);
+    }
     
     // Smooth scrolling for anchor links
     const anchorLinks = document.querySelectorAll('a[href^="#"]');
@@ -112,6 +94,80 @@ document.addEventListener('DOMContentLoaded', function() {
     }
 });
 
+// Confirm deletes and show a spinner on submit for forms under root
+function bindFormActions(root) {
+    const deleteForms = root.querySelectorAll('.delete-form');
+    deleteForms.forEach(form => {
+        form.addEventListener('submit', function(e) {
+            if (!confirm('Are you sure you want to delete this event?')) {
+                e.preventDefault();
+                return false;
+            }
+        });
+    });
+    
+    const submitButtons = root.querySelectorAll('button[type="submit"]');
+    submitButtons.forEach(button => {
+        button.closest('form').addEventListener('submit', function() {
+            button.disabled = true;
+            const originalText = button.innerHTML;
+            button.innerHTML = '<span class="spinner-border spinner-border-sm me-2" role="status"></span>Processing...';
+            
+            // Re-enable after 30 seconds as failsafe
+            setTimeout(() => {
+                button.disabled = false;
+                button.innerHTML = originalText;
+            }, 30000);
+        });
+    });
+}
+
+// Fetch the next page of events and append its cards to the dashboard list
+function loadMoreEvents() {
+    const button = this;
+    const container = document.getElementById('events-container');
+    const url = `${button.dataset.url}?html=1&cursor=${encodeURIComponent(button.dataset.cursor)}`;
+    
+    button.disabled = true;
+    const originalText = button.innerHTML;
+    button.innerHTML = '<span class="spinner-border spinner-border-sm me-2" role="status"></span>Loading...';
+    
+    fetch(url, { headers: { 'Accept': 'application/json' }, credentials: 'same-origin' })
+        .then(response => {
+            if (!response.ok) {
+                throw new Error(`HTTP ${response.status}`);
+            }
+            return response.json();
+        })
+        .then(data => {
+            const page = document.createElement('div');
+            page.innerHTML = data.html;
+            bindFormActions(page);
+            page.querySelectorAll('.event-card').forEach(card => card.classList.add('fade-in'));
+            
+            while (page.firstChild) {
+                container.appendChild(page.firstChild);
+            }
+            if (typeof feather !== 'undefined') {
+                feather.replace();
+            }
+            
+            if (data.next_cursor) {
+                button.dataset.cursor = data.next_cursor;
+                button.disabled = false;
+                button.innerHTML = originalText;
+            } else {
+                button.parentNode.remove();
+            }
+        })
+        .catch(error => {
+            console.error('Error loading events:', error);
+            showToast('Failed to load more events. Please try again.', 'error');
+            button.disabled = false;
+            button.innerHTML = originalText;
+        });
+}
+
 // Helper function to auto-resize textareas
 function autoResize() {
     this.style.height = 'auto';
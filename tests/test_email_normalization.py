@@ -0,0 +1,34 @@
+from helpers.email_normalization import normalize_email_text
+
+
+def test_plain_double_dash_separator_is_kept():
+    normalized, _ = normalize_email_text("Agenda\n--\n9:00 Keynote\n10:00 Panel")
+    assert normalized == "Agenda\n--\n9:00 Keynote\n10:00 Panel"
+
+
+def test_trailing_signature_is_stripped():
+    text = "Lunch on Friday at 12:30 at Nopa?\n\n-- \nJane Doe\nAcme Corp | +1 555 0100"
+    normalized, _ = normalize_email_text(text)
+    assert normalized == "Lunch on Friday at 12:30 at Nopa?"
+
+
+def test_long_block_after_delimiter_is_kept():
+    legs = "\n".join(f"Leg {number}: SFO-JFK 08:{number:02d}" for number in range(12))
+    normalized, _ = normalize_email_text(f"Your trip\n-- \n{legs}")
+    assert "Leg 11: SFO-JFK 08:11" in normalized
+
+
+def test_forwarded_itinerary_keeps_every_leg():
+    text = ("FYI, see below.\n"
+            "-- \nJane\n"
+            "---------- Forwarded message ----------\n"
+            "Outbound: UA 123 SFO-JFK Mar 3 08:00\n"
+            "-- \n"
+            "Return: UA 456 JFK-SFO Mar 7 18:00\n"
+            "--\n"
+            "Hotel: Marriott Mar 3-7\n")
+    normalized, _ = normalize_email_text(text)
+    assert "Jane" not in normalized
+    assert "Outbound: UA 123" in normalized
+    assert "Return: UA 456" in normalized
+    assert "Hotel: Marriott" in normalized
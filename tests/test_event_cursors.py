@@ -0,0 +1,20 @@
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from helpers.event_cursors import encode_event_cursor, decode_event_cursor
+
+
+def test_cursor_round_trip():
+    event = SimpleNamespace(created_at=datetime(2026, 3, 2, 14, 5, 9, 123456), id=4242)
+    assert decode_event_cursor(encode_event_cursor(event)) == (datetime(2026, 3, 2, 14, 5, 9, 123456), 4242)
+
+
+def test_tampered_cursor_is_rejected():
+    event = SimpleNamespace(created_at=datetime(2026, 3, 2, 14, 5, 9), id=4242)
+    payload, signature = encode_event_cursor(event).split('.')
+    forged = encode_event_cursor(SimpleNamespace(created_at=datetime(2030, 1, 1), id=1)).split('.')[0]
+    for cursor in (f"{forged}.{signature}", f"{payload}.{signature[:-2]}AA", payload, "", "not-a-cursor", "a.b.c"):
+        with pytest.raises(ValueError):
+            decode_event_cursor(cursor)
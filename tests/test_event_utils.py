@@ -0,0 +1,31 @@
+from datetime import date, time, datetime, timezone
+
+from helpers.event_utils import compute_event_bounds
+
+
+def _utc(*args):
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+def test_untimed_event_covers_whole_local_days():
+    assert compute_event_bounds(date(2026, 3, 20), user_timezone="America/New_York") == (
+        _utc(2026, 3, 20, 4), _utc(2026, 3, 21, 4))
+    assert compute_event_bounds('2026-03-20', end_date='2026-03-22', user_timezone="America/New_York") == (
+        _utc(2026, 3, 20, 4), _utc(2026, 3, 23, 4))
+
+
+def test_overnight_event_ends_the_next_day():
+    assert compute_event_bounds(date(2026, 3, 10), time(22, 0), end_date=date(2026, 3, 11), end_time=time(6, 30),
+                                user_timezone="Europe/Berlin") == (_utc(2026, 3, 10, 21), _utc(2026, 3, 11, 5, 30))
+
+
+def test_timed_event_without_end_lasts_an_hour():
+    assert compute_event_bounds('2026-07-01', '09:15', user_timezone="Asia/Tokyo") == (
+        _utc(2026, 7, 1, 0, 15), _utc(2026, 7, 1, 1, 15))
+
+
+def test_rfc3339_values_win_and_end_never_precedes_start():
+    assert compute_event_bounds('2026-07-01', '09:15', start_datetime='2026-07-01T09:15:00-07:00',
+                                end_datetime='2026-07-01T08:00:00-07:00') == (
+        _utc(2026, 7, 1, 16, 15), _utc(2026, 7, 1, 16, 15))
+    assert compute_event_bounds(None) == (None, None)
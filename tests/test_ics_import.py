@@ -0,0 +1,46 @@
+from helpers.ics_import import parse_ics_events
+
+
+def _calendar(*vevents):
+    return "BEGIN:VCALENDAR\r\nVERSION:2.0\r\n" + "".join(
+        "BEGIN:VEVENT\r\n" + "\r\n".join(lines) + "\r\nEND:VEVENT\r\n" for lines in vevents) + "END:VCALENDAR\r\n"
+
+
+def test_tzid_times_are_converted_to_the_user_timezone():
+    [event] = parse_ics_events(_calendar([
+        "UID:standup@example.com", "SUMMARY:Standup",
+        "DTSTART;TZID=Europe/London:20260310T090000", "DTEND;TZID=Europe/London:20260310T093000",
+    ]), "America/New_York")
+    assert (event['start_date'], event['start_time'], event['end_time']) == ('2026-03-10', '05:00', '05:30')
+    assert event['start_datetime'] == '2026-03-10T05:00:00-04:00'
+
+
+def test_utc_times_crossing_midnight():
+    [event] = parse_ics_events(_calendar([
+        "UID:flight@example.com", "SUMMARY:Flight", "DTSTART:20260310T230000Z", "DTEND:20260311T070000Z",
+    ]), "America/New_York")
+    assert (event['start_date'], event['start_time']) == ('2026-03-10', '19:00')
+    assert (event['end_date'], event['end_time']) == ('2026-03-11', '03:00')
+
+
+def test_all_day_end_is_inclusive():
+    [event] = parse_ics_events(_calendar([
+        "UID:offsite@example.com", "SUMMARY:Offsite",
+        "DTSTART;VALUE=DATE:20260320", "DTEND;VALUE=DATE:20260322",
+    ]), "UTC")
+    assert (event['start_date'], event['end_date']) == ('2026-03-20', '2026-03-21')
+    assert event['start_time'] is None and event['start_datetime'] is None
+
+
+def test_rrule_exdate_and_moved_occurrence():
+    events = parse_ics_events(_calendar([
+        "UID:class@example.com", "SUMMARY:Class",
+        "DTSTART;TZID=America/New_York:20260310T180000", "DTEND;TZID=America/New_York:20260310T190000",
+        "RRULE:FREQ=WEEKLY;BYDAY=TU;COUNT=5", "EXDATE;TZID=America/New_York:20260317T180000",
+    ], [
+        "UID:class@example.com", "SUMMARY:Class (moved)", "RECURRENCE-ID;TZID=America/New_York:20260324T180000",
+        "DTSTART;TZID=America/New_York:20260326T180000", "DTEND;TZID=America/New_York:20260326T190000",
+    ]), "America/New_York")
+    series, moved = sorted(events, key=lambda event: event['start_date'])
+    assert series['recurrence'] == "RRULE:FREQ=WEEKLY;COUNT=5;BYDAY=TU\nEXDATE;VALUE=DATE:20260317,20260324"
+    assert (moved['start_date'], moved['start_time'], moved['recurrence']) == ('2026-03-26', '18:00', None)
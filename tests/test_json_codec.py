@@ -0,0 +1,12 @@
+from helpers.json_codec import dumps, loads
+
+
+def test_dumps_strips_nul_characters():
+    events = [{'event_name': 'Lunch\x00', 'location': {'room\x00': 'A\x00B'}, 'attendees': 3}]
+    text = dumps(events)
+    assert '\\u0000' not in text
+    assert loads(text) == [{'event_name': 'Lunch', 'location': {'room': 'AB'}, 'attendees': 3}]
+
+
+def test_dumps_keeps_literal_backslash_sequences():
+    assert loads(dumps({'note': 'C:\\u0000dir'})) == {'note': 'C:\\u0000dir'}
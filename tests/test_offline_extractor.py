@@ -0,0 +1,65 @@
+from helpers.offline_extractor import extract_events_offline
+
+TODAY = '2026-03-02'  # A Monday
+
+
+def _times(events):
+    return [(event['start_date'], event['start_time'], event['end_time']) for event in events]
+
+
+def test_phone_number_is_not_a_time():
+    assert extract_events_offline("Call 555-1234", TODAY, "America/New_York") == []
+
+
+def test_bare_numbers_are_not_times():
+    assert extract_events_offline("Room 1234 tomorrow", TODAY, "UTC",
+                                  require_date_and_time=True) == []
+    assert extract_events_offline("Gate 12-14 tomorrow", TODAY, "UTC",
+                                  require_date_and_time=True) == []
+
+
+def test_times_with_separator_or_meridiem():
+    assert _times(extract_events_offline("Lunch tomorrow 1pm", TODAY, "UTC")) == [('2026-03-03', '13:00', None)]
+    assert _times(extract_events_offline("Dinner tomorrow 19h30", TODAY, "Europe/Paris")) == [
+        ('2026-03-03', '19:30', None)]
+    assert _times(extract_events_offline("Workshop tomorrow 3-5pm", TODAY, "UTC")) == [
+        ('2026-03-03', '15:00', '17:00')]
+
+
+def test_time_without_date_needs_llm():
+    assert extract_events_offline("Standup at 9:30", TODAY, "UTC", require_date_and_time=True) == []
+    assert _times(extract_events_offline("Standup at 9:30", TODAY, "UTC")) == [(TODAY, '09:30', None)]
+
+
+def _dates(events):
+    return [(event['event_name'], event['start_date'], event['end_date']) for event in events]
+
+
+def test_names_drop_dangling_words():
+    assert _dates(extract_events_offline("Dinner on March 12 à 19h", TODAY, "Europe/Paris")) == [
+        ('Dinner', '2026-03-12', '2026-03-12')]
+    assert _dates(extract_events_offline("Dîner le 12 mars à 19h", TODAY, "Europe/Paris")) == [
+        ('Dîner', '2026-03-12', '2026-03-12')]
+    # A leading article is part of the name
+    assert _dates(extract_events_offline("The Gala on Friday at 7pm", TODAY, "UTC")) == [
+        ('The Gala', '2026-03-06', '2026-03-06')]
+
+
+def test_date_ranges_within_a_month():
+    assert _dates(extract_events_offline("Conference March 3-5", TODAY, "UTC")) == [
+        ('Conference', '2026-03-03', '2026-03-05')]
+    assert _dates(extract_events_offline("Festival 3-5 April", TODAY, "Europe/London")) == [
+        ('Festival', '2026-04-03', '2026-04-05')]
+    # "5pm" is a time, not the end of a range
+    assert _times(extract_events_offline("Workshop March 3 - 5pm", TODAY, "UTC")) == [('2026-03-03', '17:00', None)]
+
+
+def test_date_ranges_across_months_and_years():
+    assert _dates(extract_events_offline("Ski trip Dec 31 - Jan 2", TODAY, "UTC")) == [
+        ('Ski trip', '2026-12-31', '2027-01-02')]
+    assert _dates(extract_events_offline("Trip 30 déc. au 2 janv.", TODAY, "Europe/Paris")) == [
+        ('Trip', '2026-12-30', '2027-01-02')]
+    assert _dates(extract_events_offline("Retreat Dec 30, 2026 to Jan 3, 2027", TODAY, "UTC")) == [
+        ('Retreat', '2026-12-30', '2027-01-03')]
+    assert _dates(extract_events_offline("Visit Apr 28 - May 2", TODAY, "UTC")) == [
+        ('Visit', '2026-04-28', '2026-05-02')]
@@ -0,0 +1,75 @@
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+
+from helpers.recurrence import (build_recurrence, expand_recurrence, normalize_rrule, recurrence_for_calendar, series_end,
+                                describe_recurrence, SERIES_END_MARGIN)
+
+NEW_YORK = ZoneInfo("America/New_York")
+
+
+def test_build_recurrence_normalizes_rule_and_exdates():
+    recurrence = build_recurrence("rrule:freq=weekly;byday=TU,TH;until=20261215;X-FOO=1",
+                                  ['2026-03-12', '20260305', '2026-03-12', 'not a date'])
+    assert recurrence == "RRULE:FREQ=WEEKLY;UNTIL=20261215;BYDAY=TU,TH\nEXDATE;VALUE=DATE:20260305,20260312"
+    assert build_recurrence(None, ['2026-03-12']) is None
+    assert normalize_rrule("FREQ=HOURLY") is None
+
+
+def test_recurrence_for_calendar_round_trip():
+    recurrence = build_recurrence("FREQ=WEEKLY;BYDAY=TU,TH;UNTIL=20261215", ['2026-03-12'])
+    assert recurrence_for_calendar(recurrence, '18:30', 'America/New_York') == [
+        "RRULE:FREQ=WEEKLY;UNTIL=20261216T045959Z;BYDAY=TU,TH",
+        "EXDATE;TZID=America/New_York:20260312T183000",
+    ]
+    # Untimed series use the 09:00 default and an unknown timezone falls back to UTC
+    assert recurrence_for_calendar(recurrence, None, 'Not/AZone')[1] == "EXDATE;TZID=UTC:20260312T090000"
+    assert recurrence_for_calendar(None) is None
+    assert describe_recurrence(recurrence) == "Repeats weekly on TU, TH until 2026-12-15 (1 skipped)"
+
+
+def _local(occurrences):
+    return [(start.astimezone(NEW_YORK).strftime('%Y-%m-%d %H:%M'), end.astimezone(NEW_YORK).strftime('%H:%M'))
+            for start, end in occurrences]
+
+
+def _expand(recurrence, window_start, window_end):
+    starts_at = datetime(2026, 1, 6, 9, 0, tzinfo=NEW_YORK)  # A Tuesday
+    ends_at = datetime(2026, 1, 6, 10, 30, tzinfo=NEW_YORK)
+    return expand_recurrence(recurrence, starts_at, ends_at, window_start, window_end, "America/New_York")
+
+
+def test_weekly_series_keeps_local_time_across_dst_and_skips_exdates():
+    occurrences = _expand("RRULE:FREQ=WEEKLY;BYDAY=TU,TH\nEXDATE;VALUE=DATE:20260312",
+                          datetime(2026, 3, 2, tzinfo=timezone.utc), datetime(2026, 3, 14, tzinfo=timezone.utc))
+    assert _local(occurrences) == [('2026-03-03 09:00', '10:30'), ('2026-03-05 09:00', '10:30'),
+                                   ('2026-03-10 09:00', '10:30')]
+
+
+def test_series_that_started_before_the_window():
+    occurrences = _expand("RRULE:FREQ=DAILY;INTERVAL=2", datetime(2026, 6, 1, 4, tzinfo=timezone.utc),
+                          datetime(2026, 6, 6, 4, tzinfo=timezone.utc))
+    assert [start for start, _ in _local(occurrences)] == ['2026-06-01 09:00', '2026-06-03 09:00', '2026-06-05 09:00']
+
+
+def test_count_and_until_end_the_series():
+    window = (datetime(2026, 1, 1, tzinfo=timezone.utc), datetime(2026, 4, 1, tzinfo=timezone.utc))
+    assert len(_expand("RRULE:FREQ=MONTHLY;BYDAY=-1FR;COUNT=2", *window)) == 2
+    assert [start for start, _ in _local(_expand("RRULE:FREQ=WEEKLY;UNTIL=20260120", *window))] == [
+        '2026-01-06 09:00', '2026-01-13 09:00', '2026-01-20 09:00']
+
+
+def test_unsupported_rule_shows_first_occurrence_only():
+    window = (datetime(2026, 1, 1, tzinfo=timezone.utc), datetime(2026, 4, 1, tzinfo=timezone.utc))
+    assert len(_expand("RRULE:FREQ=MONTHLY;BYDAY=MO,TU;BYSETPOS=1", *window)) == 1
+
+
+def test_series_end_covers_count_and_until():
+    starts_at = datetime(2026, 6, 1, 22, 0, tzinfo=timezone.utc)
+    ends_at = datetime(2026, 6, 1, 23, 0, tzinfo=timezone.utc)
+    margin = SERIES_END_MARGIN
+    assert series_end("RRULE:FREQ=DAILY;COUNT=3", starts_at, ends_at) == datetime(2026, 6, 3, 23, 0, tzinfo=timezone.utc) + margin
+    assert series_end("RRULE:FREQ=WEEKLY;UNTIL=20260615", starts_at, ends_at) == datetime(2026, 6, 15, 23, 0, tzinfo=timezone.utc) + margin
+    # Unsupported rules only ever show their first occurrence
+    assert series_end("RRULE:FREQ=YEARLY;BYWEEKNO=20", starts_at, ends_at) == ends_at + margin
+    assert series_end("RRULE:FREQ=WEEKLY;BYDAY=MO", starts_at, ends_at) is None
+    assert series_end(None, starts_at, ends_at) is None
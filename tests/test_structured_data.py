@@ -0,0 +1,39 @@
+import json
+
+from helpers.structured_data import extract_structured_events
+
+
+def _json_ld(*nodes):
+    return ''.join(f'<script type="application/ld+json">{json.dumps(node)}</script>' for node in nodes)
+
+
+def _flight(passenger):
+    return {
+        '@context': 'http://schema.org',
+        '@type': 'FlightReservation',
+        'reservationNumber': 'RXJ34P',
+        'underName': passenger,
+        'reservationFor': {
+            '@type': 'Flight',
+            'flightNumber': '110',
+            'airline': {'@type': 'Airline', 'name': 'United', 'iataCode': 'UA'},
+            'departureAirport': {'@type': 'Airport', 'name': 'San Francisco Airport', 'iataCode': 'SFO'},
+            'departureTime': '2027-03-04T20:15:00-08:00',
+            'arrivalAirport': {'@type': 'Airport', 'name': 'John F. Kennedy International Airport', 'iataCode': 'JFK'},
+            'arrivalTime': '2027-03-05T06:30:00-05:00',
+        },
+    }
+
+
+def test_passengers_are_listed_in_the_description():
+    html = _json_ld(_flight({'@type': 'Person', 'name': 'Eva Green'}),
+                    _flight({'@type': 'Person', 'givenName': 'Sam', 'familyName': 'Lee'}))
+    events, complete = extract_structured_events(html, 'America/Los_Angeles')
+    assert complete
+    assert len(events) == 1
+    assert events[0]['event_description'] == "Reserved for: Eva Green, Sam Lee\nUnited\nConfirmation: RXJ34P"
+
+
+def test_reservation_without_under_name_keeps_its_description():
+    events, _ = extract_structured_events(_json_ld(_flight(None)), 'America/Los_Angeles')
+    assert events[0]['event_description'] == "United\nConfirmation: RXJ34P"
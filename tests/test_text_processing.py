@@ -0,0 +1,34 @@
+from helpers.text_processing import split_text_into_chunks, extract_shared_context
+
+
+def test_single_long_line_is_split():
+    chunks = split_text_into_chunks('x' * 20000, 6000)
+    assert len(chunks) == 4
+    assert all(len(chunk) <= 6000 for chunk in chunks)
+    assert ''.join(chunks) == 'x' * 20000
+
+
+def test_long_line_splits_on_whitespace():
+    chunks = split_text_into_chunks('word ' * 5000, 6000)
+    assert all(len(chunk) <= 6000 for chunk in chunks)
+    assert all(chunk.endswith('word') for chunk in chunks)
+
+
+def test_shared_context_has_header_and_travelers():
+    text = ("From: agent@example.com\n"
+            "Sent: Friday, March 6, 2026 9:12 AM\n"
+            "Subject: Your trip to Tokyo\n\n"
+            "Passengers: Jane Doe, John Doe\n\n"
+            + "Flight UA 837 SFO-NRT\n" * 50
+            + "Subject: Hotel\n")
+    assert extract_shared_context(text) == ("From: agent@example.com\n"
+                                            "Sent: Friday, March 6, 2026 9:12 AM\n"
+                                            "Subject: Your trip to Tokyo\n"
+                                            "Passengers: Jane Doe, John Doe\n"
+                                            "Subject: Hotel")
+
+
+def test_shared_context_respects_limit():
+    text = "\n".join(f"Subject: item {number}" for number in range(100))
+    assert len(extract_shared_context(text, 100)) <= 100
+    assert extract_shared_context("No header here") == ''